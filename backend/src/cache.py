@@ -1,13 +1,19 @@
+import datetime as dt
 import json
 import os.path
+import sys
+import uuid
 from abc import ABC, abstractmethod
 from dataclasses import is_dataclass, asdict
 from enum import Enum
 from hashlib import sha256
-from multiprocessing import Lock
 from pathlib import PureWindowsPath
-from typing import Any, Dict, List
+from threading import Lock
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Hashable, Tuple, TypeVar
 
+import numpy as np
+import pandas as pd
 import pm4py
 from fastapi import Depends
 from pydantic import BaseModel
@@ -36,6 +42,31 @@ class ShortTermCache(ABC):
     def clear_cache(self):
         pass
 
+    def get_many(self, keys: List[str], default: Any = None) -> List[Any]:
+        """
+        Gets the values of multiple keys, which caches backed by a server should do in a single round trip.
+        :param keys: Keys to get
+        :param default: Value of missing keys
+        :return: Values in the order of the keys
+        """
+        return [self.get(key, default) for key in keys]
+
+    def set_many(self, values: Dict[str, Any]):
+        """
+        Sets the values of multiple keys, see `get_many`.
+        :param values: Values by key
+        """
+        for (key, value) in values.items():
+            self.set(key, value)
+
+    def delete_many(self, keys: List[str]):
+        """
+        Deletes multiple keys, see `get_many`.
+        :param keys: Keys to delete
+        """
+        for key in keys:
+            self.delete(key)
+
     def __getitem__(self, item: str) -> Any:
         return self.get(item)
 
@@ -102,6 +133,20 @@ class RedisCache(ShortTermCache):
     def delete(self, key: str) -> bool:
         return self.__redis_connection.delete(key) == 1
 
+    def get_many(self, keys: List[str], default: Any = None) -> List[Any]:
+        if not keys:
+            return []
+        return [json.loads(data) if data is not None else default for data in self.__redis_connection.mget(keys)]
+
+    def set_many(self, values: Dict[str, Any]):
+        if values:
+            self.__redis_connection.mset({key: json.dumps(make_json_serilizable(value))
+                                          for (key, value) in values.items()})
+
+    def delete_many(self, keys: List[str]):
+        if keys:
+            self.__redis_connection.delete(*keys)
+
     def clear_cache(self):
         for key in self.__redis_connection.scan_iter("*ocel*"):
             self.__redis_connection.delete(key)
@@ -121,6 +166,8 @@ def get_short_term_cache() -> ShortTermCache:
 class LongTermCacheEntryType(Enum):
     JSONABLE = "json"
     CLASSIC_EVENT_LOG = "xes"
+    # Pandas dataframe stored column by column in a NumPy archive.
+    COLUMNAR_EVENT_LOG = "npz"
     OCEL = "jsonocel"
 
 
@@ -140,6 +187,22 @@ class LongTermCache(ABC):
             value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> Any:
         pass
 
+    @abstractmethod
+    def delete(self, ocel: str, key: str,
+               value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> bool:
+        pass
+
+    def has_many(self, ocel: str, keys: List[str],
+                 value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> List[bool]:
+        """
+        Checks which of multiple entries of the OCEL exist.
+        :param ocel: OCEL the entries belong to
+        :param keys: Keys of the entries
+        :param value_type: Type of the entries
+        :return: Whether each entry exists, in the order of the keys
+        """
+        return [self.has(ocel, key, value_type) for key in keys]
+
     @abstractmethod
     def get_folder(self, ocel: str) -> Any:
         pass
@@ -155,17 +218,36 @@ class FileBasedLongTermCache(LongTermCache):
             value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE):
         filename = self.__get_file_name(ocel, key, value_type)
 
-        if value_type == LongTermCacheEntryType.JSONABLE:
-            with open(self.__get_file_name(ocel, key, value_type), 'w') as f:
-                json.dump(make_json_serilizable(value), f)
-        elif value_type == LongTermCacheEntryType.CLASSIC_EVENT_LOG:
-            pm4py.write_xes(value, filename)
-        else:
-            raise NotImplementedError()
+        # Entries are read by other processes while they are written, e.g. by the server while workers compute them.
+        # Hence, the entry is written to a temporary file first, which then replaces the entry at once.
+        temporary_filename = os.path.join(os.path.dirname(filename), f".tmp-{uuid.uuid4().hex}.{value_type.value}")
+        try:
+            if value_type == LongTermCacheEntryType.JSONABLE:
+                with open(temporary_filename, 'w') as f:
+                    json.dump(make_json_serilizable(value), f)
+            elif value_type == LongTermCacheEntryType.CLASSIC_EVENT_LOG:
+                pm4py.write_xes(value, temporary_filename)
+            elif value_type == LongTermCacheEntryType.COLUMNAR_EVENT_LOG:
+                FileBasedLongTermCache.__write_dataframe(value, temporary_filename)
+            else:
+                raise NotImplementedError()
+            os.replace(temporary_filename, filename)
+        finally:
+            if os.path.exists(temporary_filename):
+                os.remove(temporary_filename)
 
     def has(self, ocel: str, key: str, value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> bool:
         return os.path.isfile(self.__get_file_name(ocel, key, value_type))
 
+    def has_many(self, ocel: str, keys: List[str],
+                 value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> List[bool]:
+        # A single listing of the cache folder of the OCEL instead of one stat per entry.
+        with os.scandir(self.__get_ocel_cache_folder(ocel)) as entries:
+            filenames = {entry.name for entry in entries if entry.is_file()}
+        # Keys containing a separator point into a sub folder, hence they are not part of the listing.
+        return [f"{key}.{value_type.value}" in filenames if os.sep not in key else self.has(ocel, key, value_type)
+                for key in keys]
+
     def get(self, ocel: str, key: str,
             value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> Any:
         filename = self.__get_file_name(ocel, key, value_type)
@@ -177,13 +259,36 @@ class FileBasedLongTermCache(LongTermCache):
                 return json.load(f)
         elif value_type == LongTermCacheEntryType.CLASSIC_EVENT_LOG:
             return pm4py.read_xes(filename)
+        elif value_type == LongTermCacheEntryType.COLUMNAR_EVENT_LOG:
+            return FileBasedLongTermCache.__read_dataframe(filename)
         else:
             raise NotImplementedError()
 
+    def delete(self, ocel: str, key: str,
+               value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> bool:
+        try:
+            os.remove(self.__get_file_name(ocel, key, value_type))
+            return True
+        except FileNotFoundError:
+            return False
 
     def get_folder(self, ocel: str) -> str:
         return self.__get_ocel_cache_folder(ocel)
 
+    def stat(self, ocel: str, key: str,
+             value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> os.stat_result | None:
+        """
+        Returns the status of the file of an entry, e.g. to detect changes of the entry.
+        :param ocel: OCEL the entry belongs to
+        :param key: Key of the entry
+        :param value_type: Type of the entry
+        :return: Status of the file or `None` if the entry doesn't exist
+        """
+        try:
+            return os.stat(self.__get_file_name(ocel, key, value_type))
+        except FileNotFoundError:
+            return None
+
     def __get_file_name(self, ocel: str, key: str, value_type: LongTermCacheEntryType) -> str:
         return os.path.join(self.__get_ocel_cache_folder(ocel), f"{key}.{value_type.value}")
 
@@ -193,6 +298,92 @@ class FileBasedLongTermCache(LongTermCache):
         os.makedirs(folder, exist_ok=True)
         return folder
 
+    @staticmethod
+    def __write_dataframe(df: pd.DataFrame, filename: str):
+        """
+        Stores the dataframe column by column without pickling, see `encode_column`.
+        :param df: Dataframe to store
+        :param filename: Name of the .npz file
+        """
+        names, kinds, arrays = [], [], {}
+        for column in df.columns:
+            kind, column_arrays = encode_column(df[column])
+            index = len(names)
+            names.append(column)
+            kinds.append(kind)
+            arrays[f"column_{index}"] = column_arrays["values"]
+            if "uniques" in column_arrays:
+                arrays[f"uniques_{index}"] = column_arrays["uniques"]
+
+        with open(filename, 'wb') as f:
+            np.savez(f, names=np.array(names, dtype=str), kinds=np.array(kinds, dtype=str), **arrays)
+
+    @staticmethod
+    def __read_dataframe(filename: str) -> pd.DataFrame:
+        """
+        Restores a dataframe stored by `__write_dataframe`.
+        :param filename: Name of the .npz file
+        :return: Restored dataframe
+        """
+        with np.load(filename, allow_pickle=False) as archive:
+            columns = {}
+            for (index, (name, kind)) in enumerate(zip(archive['names'].tolist(), archive['kinds'].tolist())):
+                column_arrays = {"values": archive[f"column_{index}"]}
+                if f"uniques_{index}" in archive.files:
+                    column_arrays["uniques"] = archive[f"uniques_{index}"]
+                columns[name] = decode_column(kind, column_arrays)
+            return pd.DataFrame(columns)
+
+
+def encode_column(values: pd.Series) -> Tuple[str, Dict[str, np.ndarray]]:
+    """
+    Encodes a dataframe column as plain NumPy arrays which can be stored without pickling. String columns are
+    dictionary encoded, timezone aware timestamps are stored as UTC nanoseconds together with their timezone. Columns
+    of other Python objects, e.g. lists or mixed types, are stored as JSON documents.
+    :param values: Column to encode
+    :return: Kind of the encoding and the arrays "values" and (for strings) "uniques"
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        timezone = values.dt.tz
+        if isinstance(timezone, dt.timezone):
+            kind = f"offset:{int(timezone.utcoffset(None).total_seconds())}"
+        else:
+            kind = f"timezone:{timezone}"
+        return kind, {"values": values.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()}
+    elif values.dtype == object:
+        try:
+            codes, uniques = pd.factorize(values)
+        except TypeError:
+            codes, uniques = None, []  # Unhashable values, e.g. lists
+        if codes is not None and all(isinstance(unique, str) for unique in uniques):
+            return "strings", {"values": codes.astype(np.int32), "uniques": np.array(uniques, dtype=str)}
+        # Raises a TypeError for values that are not JSON serializable, instead of silently dropping the column.
+        return "json", {"values": np.array([json.dumps(make_json_serilizable(value)) for value in values.tolist()],
+                                           dtype=str)}
+    else:
+        return "plain", {"values": values.to_numpy()}
+
+
+def decode_column(kind: str, arrays: Dict[str, np.ndarray]) -> pd.Series | np.ndarray:
+    """
+    Restores a column encoded by `encode_column`.
+    :param kind: Kind of the encoding
+    :param arrays: Encoded arrays
+    :return: Restored column
+    """
+    values = arrays["values"]
+    if kind == "strings":
+        return pd.Series(pd.Categorical.from_codes(values, arrays["uniques"].astype(object)).astype(object))
+    elif kind == "json":
+        return pd.Series([json.loads(value) for value in values.tolist()], dtype=object)
+    elif kind.startswith("offset:"):
+        timezone = dt.timezone(dt.timedelta(seconds=int(kind[len("offset:"):])))
+        return pd.Series(values).dt.tz_localize("UTC").dt.tz_convert(timezone)
+    elif kind.startswith("timezone:"):
+        return pd.Series(values).dt.tz_localize("UTC").dt.tz_convert(kind[len("timezone:"):])
+    else:
+        return values
+
 
 __LONG_TERM_CACHE = FileBasedLongTermCache("cache")
 
@@ -201,6 +392,227 @@ def get_long_term_cache() -> LongTermCache:
     return __LONG_TERM_CACHE
 
 
+class SizeBoundedLRUCache:
+    """
+    In-memory least recently used cache of a single process. The cache evicts the least recently used entries once the
+    total size of all entries exceeds the budget. The sizes are provided by the caller and may be estimates.
+    """
+    __entries: OrderedDict[Hashable, Tuple[Any, int]]
+    __budget_bytes: int
+    __used_bytes: int
+    __lock: Lock
+
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, budget_bytes: int):
+        self.__entries = OrderedDict()
+        self.__budget_bytes = budget_bytes
+        self.__used_bytes = 0
+        self.__lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.__lock:
+            if key not in self.__entries:
+                self.misses += 1
+                return default
+
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return self.__entries[key][0]
+
+    def set(self, key: Hashable, value: Any, size_bytes: int):
+        with self.__lock:
+            if key in self.__entries:
+                self.__used_bytes -= self.__entries.pop(key)[1]
+
+            # Entries that would evict everything else are not cached at all.
+            if size_bytes > self.__budget_bytes:
+                return
+
+            self.__entries[key] = (value, size_bytes)
+            self.__used_bytes += size_bytes
+            while self.__used_bytes > self.__budget_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__used_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        with self.__lock:
+            if key not in self.__entries:
+                return False
+            self.__used_bytes -= self.__entries.pop(key)[1]
+            return True
+
+    @property
+    def used_bytes(self) -> int:
+        return self.__used_bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.__entries),
+            "used_bytes": self.__used_bytes
+        }
+
+
+T = TypeVar("T")
+
+
+class MemoizedLongTermCache(LongTermCache):
+    """
+    Read-through cache of a single process, which keeps the parsed JSON entries of a `FileBasedLongTermCache` (and
+    values derived from them, see `get_parsed`) in a `SizeBoundedLRUCache`. Entries are identified by the modification
+    time and size of their file, hence entries written by other processes, e.g. the workers, are read again.
+    The returned values are shared and must not be modified.
+    """
+    __cache: FileBasedLongTermCache
+    __memory: SizeBoundedLRUCache
+
+    def __init__(self, cache: FileBasedLongTermCache, budget_bytes: int):
+        self.__cache = cache
+        self.__memory = SizeBoundedLRUCache(budget_bytes)
+
+    def set(self, ocel: str, key: str, value: Any,
+            value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE):
+        self.__cache.set(ocel, key, value, value_type)
+
+    def has(self, ocel: str, key: str, value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> bool:
+        return self.__cache.has(ocel, key, value_type)
+
+    def has_many(self, ocel: str, keys: List[str],
+                 value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> List[bool]:
+        return self.__cache.has_many(ocel, keys, value_type)
+
+    def get(self, ocel: str, key: str,
+            value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> Any:
+        if value_type != LongTermCacheEntryType.JSONABLE:
+            return self.__cache.get(ocel, key, value_type)
+        return self.get_parsed(ocel, key, None)
+
+    def delete(self, ocel: str, key: str,
+               value_type: LongTermCacheEntryType = LongTermCacheEntryType.JSONABLE) -> bool:
+        # Memoized values of the entry are identified by the status of the deleted file, hence they are never read again.
+        return self.__cache.delete(ocel, key, value_type)
+
+    def get_parsed(self, ocel: str, key: str, parse: Callable[[Any], T] | None) -> T | None:
+        """
+        Reads a JSON entry and parses it, e.g. into a pydantic model. The parsed value is memoized as long as the entry
+        doesn't change.
+        :param ocel: OCEL the entry belongs to
+        :param key: Key of the entry
+        :param parse: Module level function parsing the entry, or `None` for the entry itself
+        :return: Parsed entry or `None` if the entry doesn't exist
+        """
+        file_stat = self.__cache.stat(ocel, key)
+        if file_stat is None:
+            return None
+
+        parser = f"{parse.__module__}.{parse.__qualname__}" if parse is not None else None
+        memory_key = (ocel, key, file_stat.st_mtime_ns, file_stat.st_size, parser)
+        value = self.__memory.get(memory_key, MISSING)
+        if value is not MISSING:
+            return value
+
+        if parse is None:
+            entry = value = self.__cache.get(ocel, key)
+        else:
+            entry = self.get_parsed(ocel, key, None)
+            value = parse(entry) if entry is not None else None
+        # Parsed values, e.g. pydantic models, are budgeted like the entry they are parsed from.
+        self.__memory.set(memory_key, value, estimate_json_size(entry))
+        return value
+
+    def get_folder(self, ocel: str) -> str:
+        return self.__cache.get_folder(ocel)
+
+    def stats(self) -> Dict[str, int]:
+        return self.__memory.stats()
+
+
+MISSING = object()
+LONG_TERM_MEMORY_CACHE_BYTES = int(os.environ.get('EXPLORI_LONG_TERM_MEMORY_CACHE_BYTES',
+                                                  default=str(512 * 1024 ** 2)))
+__MEMOIZED_LONG_TERM_CACHE = MemoizedLongTermCache(__LONG_TERM_CACHE, LONG_TERM_MEMORY_CACHE_BYTES)
+
+
+def estimate_json_size(value: Any) -> int:
+    """
+    Estimates the memory used by a parsed JSON value, including all nested values. Parsed JSON takes up several times
+    the size of its file, e.g. 3 to 8 times for alignments and aligned times.
+    :param value: Parsed JSON value
+    :return: Estimated size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_json_size(key) + estimate_json_size(item) for (key, item) in value.items())
+    elif isinstance(value, list):
+        size += sum(estimate_json_size(item) for item in value)
+    return size
+
+
+def get_memoized_long_term_cache() -> MemoizedLongTermCache:
+    """
+    Returns the long term cache of the current process, which memoizes entries read repeatedly, e.g. by the polled
+    endpoints of the server or by the chunks of a task on a worker.
+    :return: Memoized long term cache
+    """
+    return __MEMOIZED_LONG_TERM_CACHE
+
+
+# region Claim checks
+# Large task arguments and results are not sent through the message broker. Instead, they are stored in the long term
+# cache and tasks receive a reference to the cache entry, which they resolve on the worker.
+REFERENCE = "long-term-cache-reference"
+
+
+def reference(ocel: str, key: str) -> Dict[str, Dict[str, str]]:
+    """
+    Creates a reference to a long term cache entry that can be passed to tasks instead of the entry itself.
+    :param ocel: Ocel the entry belongs to
+    :param key: Long term cache key of the entry
+    :return: JSON serializable reference
+    """
+    return {REFERENCE: {"ocel": ocel, "key": key}}
+
+
+def is_reference(value: Any) -> bool:
+    """
+    :param value: Task argument
+    :return: Whether the argument has been created by `reference`
+    """
+    return isinstance(value, dict) and REFERENCE in value
+
+
+def resolve_reference(value: Any, long_term_cache: LongTermCache | None = None) -> Any:
+    """
+    Reads the long term cache entry a task argument refers to. Arguments that are not references are passed inline
+    and returned unchanged.
+    :param value: Task argument, possibly created by `reference`
+    :param long_term_cache: Cache to read the entry from, e.g. the memoized long term cache, defaults to the long term
+    cache
+    :return: Content of the referenced entry (without its version) or the argument itself
+    """
+    if not is_reference(value):
+        return value
+
+    if long_term_cache is None:
+        long_term_cache = get_long_term_cache()
+    entry = long_term_cache.get(value[REFERENCE]["ocel"], value[REFERENCE]["key"])
+    if entry is None:
+        raise ValueError(f"The referenced cache entry {value[REFERENCE]['key']} does not exist.")
+    if isinstance(entry, dict) and "version" in entry and "result" in entry:
+        return entry["result"]
+    return entry
+# endregion
+
+
 # region Cache keys
 # The following methods describe the cache keys for both the short term and the long term cache. You may notice
 # that there is quite a lot of hashing going it. It is to ensure that all filenames are valid and prevent weird behavior
@@ -219,6 +631,10 @@ def task(ocel: str, task_identifier: str):
     return f"[ocel={ocel}].task{__extra_attribute('id', task_identifier)}"
 
 
+def task_event_metadata(task_id: str):
+    return f"task-event-metadata-{task_id}"
+
+
 def preliminary_result(ocel: str, task_identifier: str):
     return f"[ocel={ocel}].task{__extra_attribute('id', task_identifier)}.preliminary"
 
@@ -227,6 +643,10 @@ def metadata() -> str:
     return f"objectTypes"
 
 
+def ocel_snapshot() -> str:
+    return "ocel-snapshot"
+
+
 def projected_log(object_type: str) -> str:
     return f"projection-{hash(object_type)}"
 
@@ -239,18 +659,51 @@ def dfm(ignored_object_types: List[str] | None = None) -> str:
     return f"dfm{__extra_attribute('ignored', ignored_object_types)}"
 
 
+def filtered_dfm(base_threshold: float, object_types: List[str]) -> str:
+    # Object types are hashed twice because apparently, there is a maximal file name length.
+    return f"filtered-dfm-{base_threshold}-{hash('_'.join([hash(object_type) for object_type in object_types]))}"
+
+
 def alignments(base_threshold: float, conformance_ocel: str, object_type: str | None, trace_id: int) -> str:
     return f"alignments-{hash_path(conformance_ocel)}-{hash(object_type)}-{base_threshold}-{trace_id}"
 
 
+def filtered_dfg(base_threshold: float, object_type: str) -> str:
+    return f"filtered-dfg-{hash(object_type)}-{base_threshold}"
+
+
+# Pseudo OCEL whose cache folder contains the alignments shared between all OCELs, see `alignment_by_content`.
+SHARED_ALIGNMENTS_OCEL = "shared-alignments"
+
+
+def alignment_by_content(dfg_hash: str, trace: List[str]) -> str:
+    return f"alignment-{dfg_hash}-{hash(json.dumps(trace))}"
+
+
+def alignments_batch(base_threshold: float, conformance_ocel: str, object_type: str, trace_ids: List[int]) -> str:
+    return f"alignments-batch-{hash_path(conformance_ocel)}-{hash(object_type)}-{base_threshold}-" \
+           f"{hash(','.join(str(trace_id) for trace_id in trace_ids))}"
+
+
 def aligned_times(process_ocel: str, base_threshold: float, object_type: str) -> str:
     return f"aligned-times-{hash_path(process_ocel)}-{hash(object_type)}-{base_threshold}"
 
 
+def projected_alignments(process_ocel: str, base_threshold: float, object_type: str) -> str:
+    return f"projected-alignments-{hash_path(process_ocel)}-{hash(object_type)}-{base_threshold}"
+
+
 def ocel_performance_metrics(process_ocel: str, base_threshold: float, object_types: List[str]) -> str:
     # Object types are hashed twice because apparently, there is a maximal file name length.
     return f"ocel-performance-{hash_path(process_ocel)}-{base_threshold}-{hash('_'.join([hash(object_type) for object_type in object_types]))}"
 
+
+def chunked_aligned_times(task_id: str, object_type: str) -> str:
+    # Aligned times passed inline to a chunked performance metrics task, see `ocel_performance_metrics_task`. The entries
+    # are deleted once the chunks have been merged.
+    return f"chunked-aligned-times-{hash(task_id)}-{hash(object_type)}"
+
+
 def performance_metrics(process_ocel: str, base_threshold: float, object_type: str) -> str:
     return f"performance-{hash_path(process_ocel)}-{hash(object_type)}-{base_threshold}"
 
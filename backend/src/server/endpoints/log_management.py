@@ -6,18 +6,18 @@ from pathlib import PureWindowsPath, Path
 import pandas as pd
 from typing import List
 
-import json
-import copy
 from lxml import etree, objectify
 from pandas.api.types import is_integer_dtype
 
 from fastapi import APIRouter, File, UploadFile, HTTPException
 from pydantic import BaseModel
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from server.task_manager import TaskStatus
-from cache import get_long_term_cache, get_short_term_cache
+from cache import get_long_term_cache, get_short_term_cache, get_memoized_long_term_cache
 from server.endpoints.session import SESSIONS_FOLDER, get_session_file, Session
+from worker.jsonocel import has_integer_event_ids, rewrite_event_ids
 
 router = APIRouter(prefix='/logs',
                    tags=['Log management'])
@@ -25,6 +25,8 @@ router = APIRouter(prefix='/logs',
 CSV_FOLDER = os.path.join("cache", "csv_columns")
 os.makedirs(CSV_FOLDER, exist_ok=True)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 class CSV(BaseModel):
     objects: List[str]
     activity: str
@@ -121,31 +123,38 @@ async def upload_event_logs(file: UploadFile):
     Path(upload_folder_location).mkdir(parents=True, exist_ok=True)
 
     file_location = upload_folder_location + os.sep + file.filename
-    file_content = await file.read()
+    # Copy the upload in chunks instead of reading the whole file into memory.
     with open(file_location, "wb") as f:
-        f.write(file_content)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            f.write(chunk)
 
-    if file.filename.split(".")[-1] == "jsonocel":
+    # Rewriting large OCELs takes a while, hence it must not block the event loop of the server.
+    await run_in_threadpool(ensure_integer_event_ids, file_location)
 
-        with open(file_location) as f:
-            data = json.load(f)
-            new_data = copy.deepcopy(data)
-            has_string_value = False
-            for item in data['ocel:events']:
-                try:
-                    int(item)
-                except ValueError:
-                    has_string_value = True
-                    break
+    # Since we do not know which column is used as id in csv files and we do not want to assume that,
+    # changing type of the id column is done when we select the csv file and chose the id column
 
-            if has_string_value:
-                for i, item in enumerate(data['ocel:events']):
-                    new_data['ocel:events'][i] = new_data['ocel:events'].pop(item)
+    return {
+        "status": "successful",
+        "data": [
+            "uploaded/" + file.filename,
+            round(os.stat(file_location).st_size / 1024, 0)
+        ]
+
+    }
 
-                with open(file_location, "w") as new_f:
-                    json.dump(new_data, new_f, indent=4)
 
-    elif file.filename.split(".")[-1] == "xmlocel":
+def ensure_integer_event_ids(file_location: str):
+    """
+    Rewrites the event ids of an uploaded .jsonocel or .xmlocel OCEL to integers if necessary.
+    :param file_location: Path of the uploaded OCEL
+    """
+    if file_location.split(".")[-1] == "jsonocel":
+        # Both the check and the rewrite stream the events, so the OCEL is never loaded as a whole.
+        if not has_integer_event_ids(file_location):
+            rewrite_event_ids(file_location)
+
+    elif file_location.split(".")[-1] == "xmlocel":
         parser = etree.XMLParser(remove_comments=True)
         tree = objectify.parse(file_location, parser=parser)
         root = tree.getroot()
@@ -164,18 +173,6 @@ async def upload_event_logs(file: UploadFile):
         et = etree.ElementTree(root)
         et.write(file_location, pretty_print=True)
 
-    # Since we do not know which column is used as id in csv files and we do not want to assume that,
-    # changing type of the id column is done when we select the csv file and chose the id column
-
-    return {
-        "status": "successful",
-        "data": [
-            "uploaded/" + file.filename,
-            round(os.stat(file_location).st_size / 1024, 0)
-        ]
-
-    }
-
 def delete(file_path: str, uuid: str, delete_log: bool):
     """
     This function handles deletion of uploaded OCELs. It does so by removing the OCEL, cache folder,
@@ -382,6 +379,15 @@ def delete_cache():
         "status": "successful"
     }
 
+@router.get('/cache_stats')
+def get_cache_stats():
+    """
+    This function is used to trouble-shoot Explori and reports how well the in-memory cache of the long term cache
+    entries read by the server works.
+    :return: Hits, misses, evictions, number of entries and estimated memory usage
+    """
+    return get_memoized_long_term_cache().stats()
+
 @router.get('/restore', response_model=CSV)
 def restore_csv_data(name: str) -> CSV:
     """
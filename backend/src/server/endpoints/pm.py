@@ -1,17 +1,25 @@
 import pprint
-from typing import Dict, Tuple, List, Any
+from contextlib import aclosing
+from typing import Dict, Tuple, List, Any, AsyncGenerator
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from starlette import status
 
-from cache import dfm as dfm_cache_key, alignments, performance_metrics, aligned_times, ocel_performance_metrics
+from cache import dfm as dfm_cache_key, alignments, performance_metrics, aligned_times, ocel_performance_metrics, \
+    filtered_dfm as filtered_dfm_cache_key, get_long_term_cache, alignments_batch, alignment_by_content, \
+    projected_alignments, reference, get_memoized_long_term_cache
 from server.task_manager import get_task_manager, TaskManager, TaskStatus, TaskDefinition
 from server.utils import ocel_filename_from_query, secure_ocel_filename
 from shared_types import FrontendFriendlyDFM
+from task_events import subscribe_to_task_events, format_server_sent_event
 from task_names import TaskName
 from worker.tasks.dfm import dfm as dfm_task
-from worker.tasks.alignments import compute_alignments as alignment_task, TraceAlignment
+from worker.tasks.alignments import compute_alignments_batch as alignment_batch_task, TraceAlignment, \
+    filter_threshold_of_graph_notation, chunk_alignment_traces, ALIGNMENT_RESULT_VERSION, AlignmentEngine, \
+    get_dfg_steps, align_perfectly_fitting_trace, get_dfg_hash, read_cached_alignments, read_shared_alignments, \
+    read_alignments_batch, ALIGNMENT_BATCH_RESULT_VERSION
 from worker.tasks.performance import calculate_performance_metrics as performance_task, ocel_performance_metrics_task
 from worker.tasks.performance import align_projected_log_times_task
 
@@ -23,6 +31,31 @@ router = APIRouter(prefix="/pm",
 # until the computation is complete but instead immediately result a status that the computation is still running.
 # This allows for the FastAPI server to quickly respond to all requests and we don't have to deal with issues such as
 # blocked servers or timeouting requests.
+# Instead of polling at a fixed interval, clients can subscribe to /task-events and poll again once a task has finished.
+
+# region /task-events Subscribe to finished tasks
+@router.get('/task-events')
+async def stream_task_events(request: Request, ocel: str | None = None, long_term_cache_key: str | None = None):
+    """
+    Server-Sent Events stream, which sends a "task-finished" event with the task id, Celery task name, state, OCEL and
+    long term cache key whenever a task started by the task manager has finished. Clients poll the other endpoints
+    again once a task has finished.
+    :param request: Request, used to notice when the client disconnects
+    :param ocel: Only send the events of tasks of this OCEL, if given
+    :param long_term_cache_key: Only send the events of tasks with this long term cache key, if given
+    :return: Event stream
+    """
+    async def stream() -> AsyncGenerator[str, None]:
+        async with aclosing(subscribe_to_task_events(ocel, long_term_cache_key)) as task_events:
+            async for event in task_events:
+                if await request.is_disconnected():
+                    break
+                yield format_server_sent_event(event)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# endregion
 
 # region /dfm Get filtered DFM
 class DFMNodeResponseModel(BaseModel):
@@ -52,6 +85,11 @@ class AlignmentResponseModel(BaseModel):
     aligned_traces_by_object_type: Dict[str, Dict[str, List[TraceAlignment]]]
 
 
+class AlignmentTaskStatus(TaskStatus[AlignmentResponseModel]):
+    # Number of traces that fit the filtered DFG, hence they were aligned without queuing any work.
+    short_circuited: int | None = None
+
+
 @router.get('/dfm', response_model=TaskStatus[DFMResponseModel])
 def calculate_dfm_with_thresholds(ocel: str = Depends(ocel_filename_from_query),
                                   task_manager: TaskManager = Depends(get_task_manager)):
@@ -65,13 +103,157 @@ def calculate_dfm_with_thresholds(ocel: str = Depends(ocel_filename_from_query),
     return run_dfm_task(ocel, task_manager)
 
 
+# endregion
+
+# region /filtered-dfm Get DFM filtered at a single threshold
+FILTERED_DFM_RESULT_VERSION = "1"
+
+
+class FilteredDFMNodeResponseModel(BaseModel):
+    label: str
+    counts: Dict[str, int]
+    ocel_count: int
+
+
+class FilteredDFMEdgeResponseModel(BaseModel):
+    source: int
+    target: int
+    count: int
+
+
+class FilteredDFMResponseModel(BaseModel):
+    threshold: float
+    nodes: List[FilteredDFMNodeResponseModel]
+    subgraphs: Dict[str, List[FilteredDFMEdgeResponseModel]]
+
+
+@router.get('/filtered-dfm', response_model=TaskStatus[FilteredDFMResponseModel])
+def calculate_filtered_dfm(ocel: str = Depends(ocel_filename_from_query),
+                           threshold: float = Query(example=0.75),
+                           object_types: List[str] | None = Query(default=None),
+                           task_manager: TaskManager = Depends(get_task_manager)):
+    """
+    Async: Calculates the DFM of the given OCEL and returns only the nodes and edges which are included at the given
+    threshold, together with their counts at that threshold. In contrast to /dfm, the filtering is done by the server,
+    which keeps the response small.
+    :param ocel: Path to ocel
+    :param threshold: Filtering threshold
+    :param object_types: Object types to include, all object types if omitted
+    :param task_manager: Taskmanager to run the dfm construction task with
+    :return: Taskstatus containing the filtered DFM once the dfm construction task is finished
+    """
+    dfm = get_dfm(ocel, task_manager)
+    if dfm is None:
+        return TaskStatus(status="running", result=None, preliminary=None)
+
+    if object_types is None:
+        object_types = list(dfm.subgraphs.keys())
+    unknown_object_types = set(object_types).difference(dfm.subgraphs.keys())
+    if len(unknown_object_types) > 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Unknown object types: {', '.join(sorted(unknown_object_types))}")
+
+    # Every threshold within the same box results in the same filtered DFM, so the result is memoized per box.
+    # We sort the object types so the cache keys are consistent.
+    threshold = box_threshold(dfm, threshold)
+    object_types = sorted(set(object_types))
+    cache_key = filtered_dfm_cache_key(threshold, object_types)
+
+    long_term_cache = get_memoized_long_term_cache()
+    if long_term_cache.has(ocel, cache_key):
+        cached_result = long_term_cache.get(ocel, cache_key)
+        if cached_result.get("version") == FILTERED_DFM_RESULT_VERSION and "result" in cached_result:
+            return TaskStatus(status="done", result=cached_result["result"])
+
+    result = filter_dfm_at_threshold(dfm, threshold, object_types)
+    long_term_cache.set(ocel, cache_key, {
+        'result': result,
+        'version': FILTERED_DFM_RESULT_VERSION
+    })
+    return TaskStatus(status="done", result=result)
+
+
+def filter_dfm_at_threshold(dfm: FrontendFriendlyDFM, threshold: float,
+                            object_types: List[str]) -> FilteredDFMResponseModel:
+    """
+    Filters the DFM at the given threshold the same way as the frontend does and annotates the remaining nodes and edges
+    with their counts at that threshold.
+    :param dfm: DFM to filter
+    :param threshold: Boxed filtering threshold
+    :param object_types: Object types to include
+    :return: Filtered DFM, the node indices refer to the list of filtered nodes
+    """
+    node_indices_by_label = {node.label: i for (i, node) in enumerate(dfm.nodes)}
+    edges_by_object_type = {
+        object_type: {(edge.source, edge.target): edge for edge in dfm.subgraphs[object_type]}
+        for object_type in object_types
+    }
+
+    # Determine the included edges of each object type, referring to the node indices of the full DFM.
+    included_edges: Dict[str, List[Tuple[int, int]]] = {}
+    for object_type in object_types:
+        dfg = filter_threshold_of_graph_notation(dfm, object_type, threshold)
+        included_edges[object_type] = [
+            (node_indices_by_label[dfg.nodes[edge.source]], node_indices_by_label[dfg.nodes[edge.target]])
+            for edge in dfg.edges
+        ]
+
+    # Nodes are only shown by the frontend if they are connected to an included edge. Ordering the remaining nodes by
+    # their index in the full DFM ensures that the start and the end node keep the indices 0 and 1.
+    included_nodes = sorted({node for edges in included_edges.values() for edge in edges for node in edge})
+    filtered_node_indices = {node: i for (i, node) in enumerate(included_nodes)}
+
+    nodes = [
+        FilteredDFMNodeResponseModel(
+            label=dfm.nodes[node].label,
+            counts={
+                object_type: get_count_at_threshold(dfm.nodes[node].counts[object_type], threshold)
+                for object_type in object_types if object_type in dfm.nodes[node].counts
+            },
+            ocel_count=get_count_at_threshold(dfm.nodes[node].ocel_counts, threshold)
+        )
+        for node in included_nodes
+    ]
+
+    subgraphs = {
+        object_type: [
+            FilteredDFMEdgeResponseModel(
+                source=filtered_node_indices[source],
+                target=filtered_node_indices[target],
+                count=get_count_at_threshold(edges_by_object_type[object_type][source, target].counts, threshold)
+            )
+            for (source, target) in edges
+        ]
+        for (object_type, edges) in included_edges.items()
+    }
+
+    return FilteredDFMResponseModel(threshold=threshold, nodes=nodes, subgraphs=subgraphs)
+
+
+def get_count_at_threshold(counts: List[Tuple[float, int]], threshold: float) -> int:
+    """
+    Calculates the count specified by the count separators at the given threshold, same as `getCountAtThreshold` in the
+    frontend.
+    :param counts: Count separators, i.e. upper threshold bounds with the count below that bound
+    :param threshold: Threshold
+    :return: Count at the threshold
+    """
+    range_start = 0
+    for (range_end, count) in counts:
+        if range_start <= threshold < range_end:
+            return count
+        range_start = range_end
+    return 0
+
+
 # endregion
 
 
-@router.get('/alignments', response_model=TaskStatus[AlignmentResponseModel])
+@router.get('/alignments', response_model=AlignmentTaskStatus)
 def compute_alignments(process_ocel: str = Query(example="uploaded/demo-ocel.jsonocel"),
                        conformance_ocel: str = Query(example="uploaded/demo-ocel.jsonocel"),
                        threshold: float = Query(example=0.75),
+                       engine: AlignmentEngine = Query(default=AlignmentEngine.PM4PY),
                        task_manager: TaskManager = Depends(get_task_manager)):
     """
     Async: Computes alignments of the projected traces in the conformance OCEL based on DFM constructed from the process
@@ -79,8 +261,12 @@ def compute_alignments(process_ocel: str = Query(example="uploaded/demo-ocel.jso
     :param process_ocel: Path to ocel used in DFM construction
     :param conformance_ocel: Path to ocel to align with the DFM
     :param threshold: Filtering threshold
+    :param engine: Alignment engine used to compute alignments that are not cached yet. Both engines compute optimal
+    alignments, hence cached alignments are shared between the engines. Alignments exceeding the alignment budget are
+    approximated instead and flagged as "approximate".
     :param task_manager: Taskmanager to run the dfm construction task with
     :return: Taskstatus (potentially containing the previously computed (partial) result) of alignment calculation task
+    and the number of short-circuited traces
     """
     # We cannot use "Depends(ocel_filename_from_query)" for the OCELs since it's parameter name is hardcoded.
     # Therefore, we have to ensure that we have safe paths (i.e. no path transitions).
@@ -93,18 +279,24 @@ def compute_alignments(process_ocel: str = Query(example="uploaded/demo-ocel.jso
     conformance_dfm = get_dfm(conformance_ocel, task_manager)
 
     if process_dfm is None or conformance_ocel is None:
-        return TaskStatus(status="running", result=None, preliminary=None)
+        return AlignmentTaskStatus(status="running", result=None, preliminary=None)
 
-    result = run_alignment_tasks(process_ocel, conformance_ocel, process_dfm, conformance_dfm, threshold, task_manager)
+    result = run_alignment_tasks(process_ocel, conformance_ocel, process_dfm, conformance_dfm, threshold, task_manager,
+                                 engine)
 
     def reformat_output(task_output: Dict[Tuple[str, int], Any] | None):
         """Remaps the output of the grouped tasks into a frontend friendly form."""
         if task_output is None:
             return None
 
+        def reformat_alignment(alignment: Dict[str, Any] | None) -> Dict[str, Any] | None:
+            # Preliminary results lack the alignments of running batches. Alignments cached before approximations
+            # existed lack the flag.
+            return None if alignment is None else {'approximate': False, **alignment}
+
         return [
             {
-                object_type: task_output[object_type, trace_id]
+                object_type: reformat_alignment(task_output[object_type, trace_id])
                 for object_type in conformance_dfm.traces[trace_id].thresholds
             }
             for trace_id in range(len(conformance_dfm.traces))
@@ -151,6 +343,7 @@ def compute_legacy_performance_metrics(process_ocel: str = Query(example="upload
         alignments_by_object_type.setdefault(object_type, []).append(alignment)
 
     threshold = box_threshold(process_dfm, threshold)
+    alignment_references = store_projected_alignments(process_ocel, metrics_ocel, threshold, alignments_by_object_type)
 
     tasks = {
         object_type: TaskDefinition(metrics_ocel,
@@ -161,7 +354,7 @@ def compute_legacy_performance_metrics(process_ocel: str = Query(example="upload
                                     performance_task, [metrics_ocel, object_type, alignments],
                                     performance_metrics(process_ocel, threshold, object_type),
                                     result_version="2")
-        for (object_type, alignments) in alignments_by_object_type.items()
+        for (object_type, alignments) in alignment_references.items()
     }
 
     return task_manager.cached_group(tasks)
@@ -202,6 +395,7 @@ def compute_ocel_performance_metrics(process_ocel: str = Query(example="uploaded
         alignments_by_object_type.setdefault(object_type, []).append(alignment)
 
     threshold = box_threshold(process_dfm, threshold)
+    alignment_references = store_projected_alignments(process_ocel, metrics_ocel, threshold, alignments_by_object_type)
 
     align_times_tasks = {
         object_type: TaskDefinition(metrics_ocel,
@@ -212,7 +406,7 @@ def compute_ocel_performance_metrics(process_ocel: str = Query(example="uploaded
                                     align_projected_log_times_task, [metrics_ocel, object_type, alignments],
                                     aligned_times(process_ocel, threshold, object_type),
                                     result_version="1")
-        for (object_type, alignments) in alignments_by_object_type.items()
+        for (object_type, alignments) in alignment_references.items()
     }
 
     aligned_times_status = task_manager.cached_group(align_times_tasks)
@@ -220,20 +414,50 @@ def compute_ocel_performance_metrics(process_ocel: str = Query(example="uploaded
         return TaskStatus(status="running", preliminary=None, result=None)
 
     # Step 4. Actually calculating the performance metrics.
-    # We sort the object types so the cache keys are consistent.
+    # We sort the object types so the cache keys are consistent. The aligned times have been written to the long term
+    # cache by the task manager, so the task reads them from there.
     object_types = sorted(list(aligned_times_status.result.keys()))
+    aligned_times_references = {
+        object_type: reference(metrics_ocel, aligned_times(process_ocel, threshold, object_type))
+        for object_type in object_types
+    }
     ocel_metrics_task = TaskDefinition(metrics_ocel,
                                        TaskName.PERFORMANCE_METRICS.with_attributes(
                                            process_ocel=process_ocel,
                                            metrics_ocel=metrics_ocel,
                                            threshold=threshold,
                                            object_types=object_types),
-                                       ocel_performance_metrics_task, [metrics_ocel, aligned_times_status.result],
+                                       ocel_performance_metrics_task, [metrics_ocel, aligned_times_references],
                                        ocel_performance_metrics(process_ocel, threshold, object_types),
                                        result_version="2")
     return task_manager.cached_task(ocel_metrics_task)
 
 
+def store_projected_alignments(process_ocel: str, metrics_ocel: str, base_threshold: float,
+                               alignments_by_object_type: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """
+    Stores the alignments of each object type in the long term cache, so that tasks receive a reference to them instead
+    of sending the alignments through the message broker.
+    :param process_ocel: Path to ocel used in DFM construction
+    :param metrics_ocel: Path to ocel whose traces are aligned
+    :param base_threshold: Boxed filtering threshold
+    :param alignments_by_object_type: Alignments of the traces of each object type
+    :return: References to the alignments of each object type
+    """
+    long_term_cache = get_long_term_cache()
+    references = {}
+    for (object_type, alignments) in alignments_by_object_type.items():
+        key = projected_alignments(process_ocel, base_threshold, object_type)
+        # The alignments are only written once, the endpoints are polled until all tasks are done.
+        if not long_term_cache.has(metrics_ocel, key):
+            long_term_cache.set(metrics_ocel, key, alignments)
+        references[object_type] = reference(metrics_ocel, key)
+    return references
+
+
+DFM_RESULT_VERSION = "3"
+
+
 def get_dfm(ocel: str, task_manager: TaskManager, ignore_cache: bool = False) -> FrontendFriendlyDFM | None:
     """
     Helper function running the dfm construction task and returning the finished result once it's available
@@ -245,7 +469,21 @@ def get_dfm(ocel: str, task_manager: TaskManager, ignore_cache: bool = False) ->
     task = run_dfm_task(ocel, task_manager, ignore_cache)
     if task.status != "done":
         return None
-    return FrontendFriendlyDFM(**task.result)
+
+    # The DFM is polled by most endpoints, hence it is only validated again once its cache entry changes.
+    dfm = get_memoized_long_term_cache().get_parsed(ocel, dfm_cache_key(), parse_dfm_entry)
+    return dfm if dfm is not None else FrontendFriendlyDFM(**task.result)
+
+
+def parse_dfm_entry(entry: Dict[str, Any]) -> FrontendFriendlyDFM | None:
+    """
+    Parses the long term cache entry of the DFM task, see `run_dfm_task`.
+    :param entry: Cache entry
+    :return: DFM or `None` if the entry has another version
+    """
+    if entry.get("version") != DFM_RESULT_VERSION or "result" not in entry:
+        return None
+    return FrontendFriendlyDFM(**entry["result"])
 
 
 def run_dfm_task(ocel: str, task_manager, ignore_cache=False):
@@ -257,7 +495,7 @@ def run_dfm_task(ocel: str, task_manager, ignore_cache=False):
     :return: Taskstatus (potentially containing the previously computed (partial) result) of dfm construction task
     """
     dfm_task_definition = TaskDefinition(ocel, TaskName.CREATE_DFM, dfm_task, [ocel], dfm_cache_key(),
-                                         result_version="3")
+                                         result_version=DFM_RESULT_VERSION)
     return task_manager.cached_task(dfm_task_definition, ignore_cache)
 
 
@@ -266,16 +504,20 @@ def run_alignment_tasks(process_ocel: str,
                         process_dfm: FrontendFriendlyDFM,
                         conformance_dfm: FrontendFriendlyDFM,
                         threshold: float,
-                        task_manager: TaskManager):
+                        task_manager: TaskManager,
+                        engine: AlignmentEngine = AlignmentEngine.PM4PY) -> AlignmentTaskStatus:
     """
-    Creates alignment calculation task definition and queues the task with the task manager.
+    Creates batched alignment calculation task definitions for all traces that have not been aligned yet and queues
+    them with the task manager.
     :param process_ocel: Path to ocel used in DFM construction
     :param conformance_ocel: Path to ocel to align with the DFM
     :param process_dfm: Constructed process DFM
     :param conformance_dfm: Conformance DFM to align
     :param threshold: Filtering threshold
     :param task_manager: Taskmanager to run the alignment calculation task with
+    :param engine: Alignment engine to compute missing alignments with
     :return: Taskstatus (potentially containing the previously computed (partial) result) of alignment calculation task
+    and the number of traces that were aligned without queuing any work
     """
     if not set(conformance_dfm.subgraphs.keys()).issubset(process_dfm.subgraphs.keys()):
         raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
@@ -283,24 +525,105 @@ def run_alignment_tasks(process_ocel: str,
 
     threshold = box_threshold(process_dfm, threshold)
 
-    tasks = {
-        (object_type, trace_id): TaskDefinition(
-            base_ocel=process_ocel,
-            task_name=TaskName.COMPUTE_ALIGNMENTS.with_attributes(conformance_ocel=conformance_ocel,
-                                                                  base_threshold=threshold,
-                                                                  object_type=object_type,
-                                                                  trace_id=trace_id),
-            task=alignment_task,
-            args=[process_ocel, threshold, object_type,
-                  [conformance_dfm.nodes[node_id].label for node_id in conformance_dfm.traces[trace_id].actions]],
-            long_term_cache_key=alignments(threshold, conformance_ocel, object_type, trace_id),
-            result_version="2"
-        )
-        for trace_id in range(len(conformance_dfm.traces))
-        for object_type in conformance_dfm.traces[trace_id].thresholds
-    }
-
-    return task_manager.cached_group(tasks)
+    long_term_cache = get_memoized_long_term_cache()
+
+    def read_trace_alignments(traces: List[Tuple[str, str, int, List[str]]]) -> List[Dict[str, Any] | None]:
+        # Alignments are shared by content, but older alignments were only stored for the trace id. The entries of
+        # each OCEL are listed once, so only existing entries are read.
+        trace_alignments = read_shared_alignments([alignment_by_content(dfg_hash, trace)
+                                                   for (_, dfg_hash, _, trace) in traces], long_term_cache)
+        unshared = [i for (i, alignment) in enumerate(trace_alignments) if alignment is None]
+        for (i, alignment) in zip(unshared, read_cached_alignments(
+                process_ocel, [alignments(threshold, conformance_ocel, traces[i][0], traces[i][2]) for i in unshared],
+                long_term_cache)):
+            trace_alignments[i] = alignment
+        return trace_alignments
+
+    traces_by_object_type: Dict[str, List[Tuple[int, List[str]]]] = {}
+    for (trace_id, trace) in enumerate(conformance_dfm.traces):
+        labels = [conformance_dfm.nodes[node_id].label for node_id in trace.actions]
+        for object_type in trace.thresholds:
+            traces_by_object_type.setdefault(object_type, []).append((trace_id, labels))
+
+    assembled_result: Dict[Tuple[str, int], Any] = {}
+    chunks: List[Tuple[str, str, List[Tuple[int, List[str]]]]] = []
+    number_of_short_circuited_traces = 0
+    for (object_type, traces) in traces_by_object_type.items():
+        # Traces that can be replayed on the filtered DFG are aligned synchronously without queuing any work.
+        dfg = filter_threshold_of_graph_notation(process_dfm, object_type, threshold)
+        dfg_steps = get_dfg_steps(dfg)
+        dfg_hash = get_dfg_hash(dfg)
+        unaligned_traces = []
+        for (trace_id, trace) in traces:
+            alignment = align_perfectly_fitting_trace(trace, dfg_steps)
+            if alignment is not None:
+                assembled_result[(object_type, trace_id)] = alignment.dict()
+            else:
+                unaligned_traces.append((trace_id, trace))
+        number_of_short_circuited_traces += len(traces) - len(unaligned_traces)
+
+        # Instead of one task per trace, the remaining traces are aligned in a few batches.
+        chunks.extend((object_type, dfg_hash, chunk) for chunk in chunk_alignment_traces(unaligned_traces))
+
+    # The cache entry of a finished batch contains the alignments of all of its traces.
+    batch_keys = [alignments_batch(threshold, conformance_ocel, object_type, [trace_id for (trace_id, _) in chunk])
+                  for (object_type, _, chunk) in chunks]
+    batch_alignments = [read_alignments_batch(process_ocel, key, long_term_cache) if exists else None
+                        for (key, exists) in zip(batch_keys, long_term_cache.has_many(process_ocel, batch_keys))]
+
+    # The alignments of the other batches might have been computed for other OCELs or thresholds, or they are being
+    # computed right now. Their traces are read at once.
+    unfinished_chunks = [i for (i, chunk_alignments) in enumerate(batch_alignments) if chunk_alignments is None]
+    unfinished_traces = [(chunks[i][0], chunks[i][1], trace_id, trace)
+                         for i in unfinished_chunks for (trace_id, trace) in chunks[i][2]]
+    trace_alignments = iter(read_trace_alignments(unfinished_traces))
+    incomplete_chunks = {}
+    for i in unfinished_chunks:
+        batch_alignments[i] = [next(trace_alignments) for _ in chunks[i][2]]
+        if any(alignment is None for alignment in batch_alignments[i]):
+            incomplete_chunks[i] = chunks[i]
+        else:
+            long_term_cache.set(process_ocel, batch_keys[i], {'result': batch_alignments[i],
+                                                              'version': ALIGNMENT_BATCH_RESULT_VERSION})
+
+    # Only batches that still have missing alignments are started, all at once. The cache has been checked already.
+    task_statuses = task_manager.cached_tasks({i: TaskDefinition(
+        base_ocel=process_ocel,
+        task_name=TaskName.COMPUTE_ALIGNMENTS.with_attributes(conformance_ocel=conformance_ocel,
+                                                              base_threshold=threshold,
+                                                              object_type=object_type,
+                                                              first_trace_id=chunk[0][0],
+                                                              traces=len(chunk)),
+        task=alignment_batch_task,
+        args=[process_ocel, threshold, object_type, conformance_ocel, chunk, engine.value],
+        long_term_cache_key=batch_keys[i],
+        result_version=ALIGNMENT_BATCH_RESULT_VERSION
+    ) for (i, (object_type, _, chunk)) in incomplete_chunks.items()}, ignore_cache=True)
+
+    is_preliminary = False
+    for (i, task_status) in task_statuses.items():
+        if task_status.status == "failed":
+            print(f"Failed because of alignment batch of {chunks[i][0]} starting at trace {chunks[i][2][0][0]}")
+            return AlignmentTaskStatus(status="failed", result=None, preliminary=None,
+                                       short_circuited=number_of_short_circuited_traces)
+        if task_status.status == "done":
+            batch_alignments[i] = task_status.result
+        else:
+            # Alignments of running batches are cached as soon as they are computed.
+            is_preliminary = True
+
+    for ((object_type, _, chunk), chunk_alignments) in zip(chunks, batch_alignments):
+        assembled_result.update({(object_type, trace_id): alignment
+                                 for ((trace_id, _), alignment) in zip(chunk, chunk_alignments)})
+    assembled_result = {(object_type, trace_id): assembled_result[(object_type, trace_id)]
+                        for (object_type, traces) in traces_by_object_type.items() for (trace_id, _) in traces}
+
+    if is_preliminary:
+        return AlignmentTaskStatus(status="running", result=None, preliminary=assembled_result,
+                                   short_circuited=number_of_short_circuited_traces)
+    else:
+        return AlignmentTaskStatus(status="done", result=assembled_result, preliminary=None,
+                                   short_circuited=number_of_short_circuited_traces)
 
 
 def box_threshold(dfm: FrontendFriendlyDFM, threshold: float) -> float:
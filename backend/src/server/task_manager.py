@@ -1,13 +1,17 @@
 from dataclasses import dataclass
+from itertools import chain
 from typing import Any, List, Dict, TypeVar, Generic
 
-from celery import Celery
+from celery import Celery, group, states
+from celery.backends.base import KeyValueStoreBackend
 from celery.result import AsyncResult
+from celery.utils import uuid
 from fastapi import Depends
 from pydantic import BaseModel
 
 from cache import ShortTermCache, LongTermCache, task as task_key, preliminary_result, get_short_term_cache, \
-    get_long_term_cache
+    get_memoized_long_term_cache
+from task_events import register_task_events
 from task_names import TaskName
 from worker.main import app
 
@@ -52,18 +56,20 @@ class TaskManager:
 
         # Easiest case: Task has run before, we can just fetch the result from the cache.
         if not ignore_cache and self.__long_term_cache.has(ocel, long_term_key):
-            cached_result = self.__long_term_cache.get(ocel, task.long_term_cache_key)
-            if task.result_version is None or \
-                    ("version" in cached_result and cached_result["version"] == task.result_version and "result" in cached_result):
-                return TaskStatus(status="done", result=self.__long_term_cache.get(ocel, task.long_term_cache_key)["result"])
+            cached_status = self.__read_cached_result(task)
+            if cached_status is not None:
+                return cached_status
 
         # Check if the task is currently running.
         running_result = self.check_on_running_task(ocel, task.task_name, long_term_key, task.result_version)
         if running_result is not None:
             return running_result
 
-        # The task is not running and has never run before. Hence, we need to start it.
-        task_result: AsyncResult = task.task.delay(*task.args, **(task.kwargs if task.kwargs else {}))
+        # The task is not running and has never run before. Hence, we need to start it. The task is registered first, so
+        # clients subscribed to the task events are notified even if it finishes right away.
+        task_id = uuid()
+        register_task_events(self.__short_term_cache, {task_id: (ocel, long_term_key)})
+        task_result: AsyncResult = task.task.apply_async(task.args, task.kwargs or {}, task_id=task_id)
         self.__short_term_cache[TaskManager.__task_cache_key(ocel, task.task_name)] = task_result.id
         return TaskStatus(status="running")
 
@@ -74,7 +80,7 @@ class TaskManager:
         :param ignore_cache: If set to true, the long term cache is ignored and the task is always executed
         :return: TaskStatus containing joint results of the individual tasks and a merged status indicating the status of all tasks combined.
         """
-        task_statuses: Dict[str, TaskStatus] = {key: self.cached_task(task, ignore_cache) for (key, task) in tasks.items()}
+        task_statuses: Dict[str, TaskStatus] = self.cached_tasks(tasks, ignore_cache)
 
         assembled_result: Dict[str, Any] = {}
         is_preliminary: bool = False
@@ -95,6 +101,79 @@ class TaskManager:
         else:
             return TaskStatus(status="done", result=assembled_result, preliminary=None)
 
+    def cached_tasks(self, tasks: Dict[str, TaskDefinition], ignore_cache: bool = False) -> Dict[str, TaskStatus]:
+        """
+        Bulk version of `cached_task`, which takes a constant number of round trips regardless of the number of tasks:
+        The long term cache is listed once per ocel, the ids of the running tasks are fetched from the short term cache
+        at once, their states are read from the result backend at once, and all missing tasks are started as one group.
+        :param tasks: Dictionary of tasks to run. The key is being passed through to the result to allow identifying the individual tasks
+        :param ignore_cache: If set to true, the long term cache is ignored and the tasks are always executed
+        :return: The current status of each task by key, including eventual (preliminary) results.
+        """
+        task_statuses: Dict[str, TaskStatus] = {}
+
+        # Tasks that have run before.
+        if not ignore_cache:
+            keys_by_ocel: Dict[str, List[str]] = {}
+            for (key, task) in tasks.items():
+                keys_by_ocel.setdefault(task.base_ocel, []).append(key)
+
+            for (ocel, keys) in keys_by_ocel.items():
+                is_cached = self.__long_term_cache.has_many(ocel, [tasks[key].long_term_cache_key for key in keys])
+                for (key, cached) in zip(keys, is_cached):
+                    cached_status = self.__read_cached_result(tasks[key]) if cached else None
+                    if cached_status is not None:
+                        task_statuses[key] = cached_status
+
+        # Tasks that are currently running.
+        remaining_keys = [key for key in tasks if key not in task_statuses]
+        task_cache_keys = {key: TaskManager.__task_cache_key(tasks[key].base_ocel, tasks[key].task_name)
+                           for key in remaining_keys}
+        preliminary_result_cache_keys = {key: preliminary_result(tasks[key].base_ocel, "test") for key in remaining_keys}
+        short_term_keys = list(dict.fromkeys(chain(task_cache_keys.values(), preliminary_result_cache_keys.values())))
+        short_term_values = dict(zip(short_term_keys, self.__short_term_cache.get_many(short_term_keys)))
+
+        task_ids = {key: short_term_values[task_cache_keys[key]] for key in remaining_keys
+                    if short_term_values[task_cache_keys[key]] is not None}
+        task_states = read_task_states(list(set(task_ids.values())))
+        finished_task_cache_keys = []
+        for (key, task_id) in task_ids.items():
+            task = tasks[key]
+            task_state = task_states.get(task_id)
+            if task_state is None:
+                # The task is still running or pending, we return the preliminary result
+                task_statuses[key] = TaskStatus(status="running",
+                                                preliminary=short_term_values[preliminary_result_cache_keys[key]])
+            elif task_state["status"] == states.SUCCESS:
+                # The task has finished since the last check, see `check_on_running_task`.
+                self.__store_result(task, task_state["result"])
+                task_statuses[key] = TaskStatus(status="done", result=task_state["result"])
+                finished_task_cache_keys.append(task_cache_keys[key])
+            else:
+                AsyncResult(task_id, app=app).forget()
+                task_statuses[key] = TaskStatus(status="failed")
+                finished_task_cache_keys.append(task_cache_keys[key])
+        self.__short_term_cache.delete_many(list(dict.fromkeys(finished_task_cache_keys)))
+
+        # Tasks that are not running and have never run before. Tasks sharing the same task cache key are started once.
+        missing_keys: Dict[str, List[str]] = {}
+        for key in tasks:
+            if key not in task_statuses:
+                missing_keys.setdefault(task_cache_keys[key], []).append(key)
+        if missing_keys:
+            started_tasks = {uuid(): tasks[keys[0]] for keys in missing_keys.values()}
+            register_task_events(self.__short_term_cache, {task_id: (task.base_ocel, task.long_term_cache_key)
+                                                           for (task_id, task) in started_tasks.items()})
+            group_result = group([task.task.s(*task.args, **(task.kwargs or {})).set(task_id=task_id)
+                                  for (task_id, task) in started_tasks.items()]).apply_async()
+            self.__short_term_cache.set_many({task_cache_key: task_result.id for (task_cache_key, task_result)
+                                              in zip(missing_keys.keys(), group_result.results)})
+            for keys in missing_keys.values():
+                for key in keys:
+                    task_statuses[key] = TaskStatus(status="running")
+
+        return {key: task_statuses[key] for key in tasks}
+
     def check_on_running_task(self, ocel: str, task_name: TaskName | str,
                               long_term_cache_key: str, version: str | None) -> TaskStatus | None:
         """
@@ -120,13 +199,7 @@ class TaskManager:
             # The task has finished since the last check.
             # We now write the result to the long term cache, clear up the short term cache and return the result.
             result = task_result.get()
-            if version is not None:
-                self.__long_term_cache.set(ocel, long_term_cache_key, {
-                    'result': result,
-                    'version': version
-                })
-            else:
-                self.__long_term_cache.set(ocel, long_term_cache_key, result)
+            self.__store_result_in_long_term_cache(ocel, long_term_cache_key, version, result)
             self.__short_term_cache.delete(task_cache_key)
             self.__short_term_cache.delete(preliminary_result_cache_key)
             return TaskStatus(status="done", result=result)
@@ -141,6 +214,30 @@ class TaskManager:
         # The task is still running or pending, we return the preliminary result
         return TaskStatus(status="running", preliminary=self.__short_term_cache.get(preliminary_result(ocel, "test")))
 
+    def __read_cached_result(self, task: TaskDefinition) -> TaskStatus | None:
+        """
+        Reads the result of a task from the long term cache.
+        :param task: Task whose result is in the long term cache
+        :return: Status of the finished task or `None` if the cached result has another version
+        """
+        cached_result = self.__long_term_cache.get(task.base_ocel, task.long_term_cache_key)
+        if task.result_version is None or \
+                ("version" in cached_result and cached_result["version"] == task.result_version and "result" in cached_result):
+            return TaskStatus(status="done", result=cached_result["result"])
+        return None
+
+    def __store_result(self, task: TaskDefinition, result: Any):
+        self.__store_result_in_long_term_cache(task.base_ocel, task.long_term_cache_key, task.result_version, result)
+
+    def __store_result_in_long_term_cache(self, ocel: str, long_term_cache_key: str, version: str | None, result: Any):
+        if version is not None:
+            self.__long_term_cache.set(ocel, long_term_cache_key, {
+                'result': result,
+                'version': version
+            })
+        else:
+            self.__long_term_cache.set(ocel, long_term_cache_key, result)
+
     @staticmethod
     def __task_cache_key(ocel: str, task_name: TaskName | str) -> str:
         """
@@ -166,8 +263,30 @@ class TaskManager:
         return preliminary_result(ocel, task_name)
 
 
+def read_task_states(task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the states of finished tasks from the result backend. Key value store backends like Redis read all states in a
+    single pipelined request.
+    :param task_ids: Ids of the tasks
+    :return: Status and result of each finished task by id, tasks that are still pending or running are missing
+    """
+    if not task_ids:
+        return {}
+
+    if isinstance(app.backend, KeyValueStoreBackend):
+        # A single pass over the tasks without waiting for the running ones.
+        return dict(app.backend.get_many(task_ids, interval=0, max_iterations=1))
+
+    task_states = {}
+    for task_id in task_ids:
+        task_result = AsyncResult(task_id, app=app)
+        if task_result.ready():
+            task_states[task_id] = {"status": task_result.state, "result": task_result.result}
+    return task_states
+
+
 def get_task_manager(short_term_cache: ShortTermCache = Depends(get_short_term_cache),
-                     long_term_cache: LongTermCache = Depends(get_long_term_cache)) -> TaskManager:
+                     long_term_cache: LongTermCache = Depends(get_memoized_long_term_cache)) -> TaskManager:
     """
     Helper function to access a default task manager (when using default caches)
     :param short_term_cache: Short term cache which task manager should use
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from typing import Any, AsyncGenerator, Dict, Tuple
+
+from celery import states
+from redis.asyncio.client import Redis as AsyncRedis
+from redis.client import Redis
+
+from cache import REDIS_HOST, REDIS_PORT, ShortTermCache, get_short_term_cache, task_event_metadata
+
+# Workers publish an event to this Redis channel whenever a task started by the task manager has finished. Clients
+# subscribe to the events via the /pm/task-events endpoint, so they can wait for their tasks instead of polling the
+# endpoints continuously.
+TASK_EVENTS_CHANNEL = os.environ.get('EXPLORI_TASK_EVENTS_CHANNEL', default='explori-task-events')
+# If no matching task finishes within this many seconds, the subscription yields `None`, e.g. to send a keep alive comment.
+TASK_EVENTS_KEEP_ALIVE_SECONDS = float(os.environ.get('EXPLORI_TASK_EVENTS_KEEP_ALIVE_SECONDS', default='15'))
+
+__REDIS_CONNECTION = Redis(REDIS_HOST, REDIS_PORT)
+
+
+def get_task_events_connection() -> Redis:
+    return __REDIS_CONNECTION
+
+
+def register_task_events(short_term_cache: ShortTermCache, tasks: Dict[str, Tuple[str, str]]):
+    """
+    Registers tasks before they are started, such that an event is published once they have finished. The events
+    contain the OCEL and the long term cache key of the task, which clients can filter by.
+    :param short_term_cache: Short term cache shared with the workers
+    :param tasks: OCEL and long term cache key of each task by the id it will be started with
+    """
+    short_term_cache.set_many({task_event_metadata(task_id): {"ocel": ocel, "long_term_cache_key": long_term_cache_key}
+                               for (task_id, (ocel, long_term_cache_key)) in tasks.items()})
+
+
+def publish_task_event(task_id: str, task_name: str, state: str):
+    """
+    Publishes that a task registered by `register_task_events` has finished. Other tasks, e.g. the chunks of a chord,
+    are internal and not published. Tasks that have not finished yet, e.g. because they have been replaced by a
+    chord, are not published either.
+    :param task_id: Id of the task
+    :param task_name: Name of the Celery task
+    :param state: State of the task
+    """
+    if state not in states.READY_STATES:
+        return
+    short_term_cache = get_short_term_cache()
+    metadata = short_term_cache.get(task_event_metadata(task_id))
+    if metadata is None:
+        return
+    short_term_cache.delete(task_event_metadata(task_id))
+    get_task_events_connection().publish(TASK_EVENTS_CHANNEL, json.dumps({
+        "task_id": task_id,
+        "task": task_name,
+        "state": state,
+        **metadata
+    }))
+
+
+async def subscribe_to_task_events(ocel: str | None = None, long_term_cache_key: str | None = None) \
+        -> AsyncGenerator[Dict[str, Any] | None, None]:
+    """
+    Subscribes to the events published by `publish_task_event`. The subscription ends once the generator is closed.
+    :param ocel: Only yield the events of tasks of this OCEL, if given
+    :param long_term_cache_key: Only yield the events of tasks with this long term cache key, if given
+    :return: Generator of the events, which yields `None` if no task has finished within the keep alive interval
+    """
+    connection = AsyncRedis(host=REDIS_HOST, port=int(REDIS_PORT))
+    pubsub = connection.pubsub()
+    await pubsub.subscribe(TASK_EVENTS_CHANNEL)
+    try:
+        # Events of other tasks don't count as keep alive, otherwise subscribers wouldn't notice disconnected clients
+        # as long as other tasks finish.
+        last_yield = time.monotonic()
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=TASK_EVENTS_KEEP_ALIVE_SECONDS)
+            event = json.loads(message["data"]) if message is not None else None
+            if event is not None and is_matching_task_event(event, ocel, long_term_cache_key):
+                yield event
+                last_yield = time.monotonic()
+            elif time.monotonic() - last_yield >= TASK_EVENTS_KEEP_ALIVE_SECONDS:
+                yield None
+                last_yield = time.monotonic()
+    finally:
+        await pubsub.unsubscribe(TASK_EVENTS_CHANNEL)
+        await pubsub.close()
+        await connection.close()
+
+
+def is_matching_task_event(event: Dict[str, Any], ocel: str | None, long_term_cache_key: str | None) -> bool:
+    """
+    Checks whether a task event matches the filters of a subscription, see `subscribe_to_task_events`.
+    :param event: Task event
+    :param ocel: OCEL of the task or `None` to accept all OCELs
+    :param long_term_cache_key: Long term cache key of the task or `None` to accept all keys
+    :return: Whether the event matches
+    """
+    return (ocel is None or event.get("ocel") == ocel) and \
+        (long_term_cache_key is None or event.get("long_term_cache_key") == long_term_cache_key)
+
+
+def format_server_sent_event(event: Dict[str, Any] | None) -> str:
+    """
+    Formats a task event as Server-Sent Event.
+    :param event: Task event or `None` for a keep alive comment
+    :return: Message of the event stream
+    """
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: task-finished\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,381 @@
+import datetime as dt
+import json
+import os
+import re
+from array import array
+from typing import Any, Dict, Generator, List, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from worker.ocel_snapshot import OCELSnapshot, write_snapshot
+
+# Streaming access to .jsonocel files. Instead of loading the whole document with `json.load`, the file is read in
+# chunks and the entries of "ocel:events" and "ocel:objects" are decoded one at a time, so the decoded document is never
+# held in memory as a whole. Only a single event or object (plus one chunk of the file) is decoded at once. Building a
+# snapshot still keeps one Python object per event attribute value and per object id until the snapshot is written, i.e.
+# O(events × attributes + objects) Python objects, while the activities, timestamps and relations are kept in typed
+# arrays.
+READ_CHUNK_SIZE = int(os.environ.get('EXPLORI_JSONOCEL_READ_CHUNK_SIZE', default=1024 * 1024))
+
+EVENTS_KEY = "ocel:events"
+OBJECTS_KEY = "ocel:objects"
+GLOBAL_LOG_KEY = "ocel:global-log"
+
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+DECODER = json.JSONDecoder()
+
+UTC_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+NAIVE_EPOCH = dt.datetime(1970, 1, 1)
+MICROSECOND = dt.timedelta(microseconds=1)
+
+
+class JsonStreamReader:
+    """
+    Incremental reader for large JSON documents. Objects and arrays can be iterated entry by entry, while the values are
+    either decoded as a whole (`value`), iterated again (`object_keys` / `object_items` / `array_values`) or skipped
+    (`skip`). Consumed parts of the document are dropped from the buffer and never read again.
+    """
+    __file: TextIO
+    __buffer: str
+    __position: int
+    __eof: bool
+
+    def __init__(self, file: TextIO):
+        self.__file = file
+        self.__buffer = ""
+        self.__position = 0
+        self.__eof = False
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it.
+        :return: Next character or an empty string at the end of the file
+        """
+        while True:
+            self.__position = WHITESPACE.match(self.__buffer, self.__position).end()
+            if self.__position < len(self.__buffer) or not self.__read_chunk():
+                return self.__buffer[self.__position:self.__position + 1]
+
+    def expect(self, character: str):
+        """
+        Consumes the next non-whitespace character, which has to be the given one.
+        :param character: Expected character
+        """
+        if self.peek() != character:
+            raise ValueError(f"Expected '{character}' at offset {self.__position} of the current chunk.")
+        self.__position += 1
+
+    def value(self) -> Any:
+        """
+        Decodes the next JSON value.
+        :return: Decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.__buffer, self.__position)
+                # A number at the end of the buffer might continue in the next chunk.
+                if end < len(self.__buffer) or self.__eof:
+                    self.__position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.__eof:
+                    raise
+            # The value continues in the next chunk. Reading at least as much as is already buffered doubles the
+            # buffered part of the value, so a long value is only decoded a logarithmic number of times.
+            self.__read_chunk(len(self.__buffer) - self.__position)
+
+    def skip(self):
+        """
+        Skips the next JSON value without keeping it in memory. Objects and arrays are skipped entry by entry, e.g. the
+        objects of an OCEL are decoded one at a time and discarded.
+        """
+        next_character = self.peek()
+        if next_character == "{":
+            for _ in self.object_keys():
+                self.value()
+        elif next_character == "[":
+            for _ in self.array_values():
+                self.value()
+        else:
+            self.value()
+
+    def object_keys(self) -> Generator[str, None, None]:
+        """
+        Iterates over the keys of the next JSON object. The caller has to consume the value of each key, e.g. using
+        `value`, before continuing the iteration.
+        :return: Generator of the keys
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.__position += 1
+            return
+
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Expected an object key.")
+            self.expect(":")
+            yield key
+
+            if self.peek() == ",":
+                self.__position += 1
+            else:
+                self.expect("}")
+                return
+
+    def array_values(self) -> Generator[None, None, None]:
+        """
+        Iterates over the values of the next JSON array. Same as for `object_keys`, the caller has to consume each
+        value before continuing the iteration.
+        :return: Generator yielding once per value
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.__position += 1
+            return
+
+        while True:
+            yield
+            if self.peek() == ",":
+                self.__position += 1
+            else:
+                self.expect("]")
+                return
+
+    def object_items(self) -> Generator[Tuple[str, Any], None, None]:
+        """
+        Iterates over the entries of the next JSON object, decoding one value at a time.
+        :return: Generator of the keys and decoded values
+        """
+        for key in self.object_keys():
+            yield key, self.value()
+
+    def __read_chunk(self, minimum_size: int = 0) -> bool:
+        chunk = self.__file.read(max(READ_CHUNK_SIZE, minimum_size))
+        if not chunk:
+            self.__eof = True
+            return False
+        # Drop the consumed part of the buffer.
+        self.__buffer = self.__buffer[self.__position:] + chunk
+        self.__position = 0
+        return True
+
+
+def has_integer_event_ids(ocel_filename: str) -> bool:
+    """
+    Checks whether all event ids of the .jsonocel file are integers, which ocpa requires (at least v1.2).
+    :param ocel_filename: File name of the OCEL
+    :return: Whether all event ids are integers
+    """
+    with open(ocel_filename, 'r', encoding='utf-8') as f:
+        reader = JsonStreamReader(f)
+        for key in reader.object_keys():
+            if key != EVENTS_KEY:
+                reader.skip()
+                continue
+
+            for event_id in reader.object_keys():
+                try:
+                    int(event_id)
+                except ValueError:
+                    return False
+                reader.value()
+    return True
+
+
+def rewrite_event_ids(ocel_filename: str):
+    """
+    Replaces the event ids of the .jsonocel file by 0, ..., n - 1 in the order of the events in the file. The file is
+    rewritten one event at a time.
+    :param ocel_filename: File name of the OCEL
+    """
+    temporary_filename = f"{ocel_filename}.{os.getpid()}.tmp"
+    with open(ocel_filename, 'r', encoding='utf-8') as source, \
+            open(temporary_filename, 'w', encoding='utf-8') as target:
+        reader = JsonStreamReader(source)
+        target.write("{")
+        for (i, key) in enumerate(reader.object_keys()):
+            target.write(f"{',' if i > 0 else ''}\n    {json.dumps(key)}: ")
+            if key != EVENTS_KEY:
+                copy_value(reader, target)
+                continue
+
+            target.write("{")
+            for (event_id, (_, event)) in enumerate(reader.object_items()):
+                target.write(f"{',' if event_id > 0 else ''}\n        \"{event_id}\": ")
+                target.write(json.dumps(event))
+            target.write("\n    }")
+        target.write("\n}\n")
+    os.replace(temporary_filename, ocel_filename)
+
+
+def copy_value(reader: JsonStreamReader, target: TextIO):
+    """
+    Copies the next JSON value of the reader to the target. Objects are copied entry by entry, e.g. the objects of an
+    OCEL one object at a time.
+    :param reader: Reader positioned before the value
+    :param target: File to write the value to
+    """
+    if reader.peek() != "{":
+        target.write(json.dumps(reader.value()))
+        return
+
+    target.write("{")
+    for (i, (key, value)) in enumerate(reader.object_items()):
+        target.write(f"{',' if i > 0 else ''}\n        {json.dumps(key)}: ")
+        target.write(json.dumps(value))
+    target.write("\n    }")
+
+
+def build_ocel_snapshot(ocel_filename: str, folder: str, source: List[Any]) -> OCELSnapshot | None:
+    """
+    Builds the snapshot of a .jsonocel file (see `worker.ocel_snapshot`) by streaming the file instead of importing it
+    with ocpa. The snapshot is the same as the one of the ocpa OCEL: Events are numbered in the order of the file and
+    sorted by their timestamp, and event attributes become "event_<name>" columns. Only the order of the objects related
+    to an event may differ, as ocpa collects them in a set.
+    :param ocel_filename: File name of the OCEL
+    :param folder: Folder of the snapshot
+    :param source: Version of the OCEL file, e.g. its modification time and size
+    :return: Snapshot or `None` if the timestamps mix different timezones, which only ocpa can represent
+    """
+    object_types: List[str] = []
+    activities: List[str] = []
+    activity_codes: Dict[str, int] = {}
+    event_activities = array('q')
+    timestamps = array('q')
+    start_timestamps = array('q')
+    utc_offsets = set()
+    attributes: Dict[str, List[Any]] = {}
+    attribute_names: Dict[str, None] = {}
+
+    # Objects are numbered by their first occurrence in the file, the relations of the i-th event are
+    # related_objects[related_object_indptr[i]:related_object_indptr[i + 1]]. The objects might precede the global log
+    # in the file, hence object types are numbered by their first occurrence as well and mapped to the object types of
+    # the global log afterwards.
+    object_codes: Dict[str, int] = {}
+    object_type_names: Dict[str, int] = {}
+    object_type_codes = array('q')
+    related_objects = array('q')
+    related_object_indptr = array('q', [0])
+
+    def object_code(object_id: str) -> int:
+        code = object_codes.setdefault(object_id, len(object_codes))
+        if code == len(object_type_codes):
+            object_type_codes.append(-1)
+        return code
+
+    def to_nanoseconds(timestamp: dt.datetime) -> int:
+        offset = timestamp.utcoffset()
+        utc_offsets.add(offset)
+        return (timestamp - (NAIVE_EPOCH if offset is None else UTC_EPOCH)) // MICROSECOND * 1000
+
+    with open(ocel_filename, 'r', encoding='utf-8') as f:
+        reader = JsonStreamReader(f)
+        for key in reader.object_keys():
+            if key == GLOBAL_LOG_KEY:
+                object_types = list(reader.value()["ocel:object-types"])
+            elif key == EVENTS_KEY:
+                for (_, event) in reader.object_items():
+                    activity = event["ocel:activity"]
+                    event_activities.append(activity_codes.setdefault(activity, len(activity_codes)))
+                    if len(activity_codes) > len(activities):
+                        activities.append(activity)
+
+                    timestamp = dt.datetime.fromisoformat(event["ocel:timestamp"])
+                    timestamps.append(to_nanoseconds(timestamp))
+                    vmap = event["ocel:vmap"]
+                    start_timestamp = vmap.get("start_timestamp")
+                    start_timestamps.append(to_nanoseconds(dt.datetime.fromisoformat(start_timestamp))
+                                            if start_timestamp is not None else timestamps[-1])
+
+                    for (name, value) in vmap.items():
+                        attribute_names.setdefault(name)
+                        if name != "start_timestamp":
+                            attributes.setdefault(name, [None] * (len(timestamps) - 1)).append(value)
+                    attribute_names.setdefault("start_timestamp")
+                    for values in attributes.values():
+                        if len(values) < len(timestamps):
+                            values.append(None)
+
+                    # Same as ocpa, related objects are deduplicated.
+                    related_objects.extend(dict.fromkeys(object_code(object_id)
+                                                         for object_id in event["ocel:omap"]))
+                    related_object_indptr.append(len(related_objects))
+            elif key == OBJECTS_KEY:
+                for (object_id, ocel_object) in reader.object_items():
+                    object_type_codes[object_code(object_id)] = object_type_names.setdefault(
+                        ocel_object["ocel:type"], len(object_type_names))
+            else:
+                reader.skip()
+
+    if len(utc_offsets) > 1:
+        return None
+    timezone = next(iter(utc_offsets), None)
+
+    def to_timestamps(values: np.ndarray) -> pd.Series:
+        column = pd.Series(values.astype("datetime64[ns]"))
+        if timezone is None:
+            return column
+        return column.dt.tz_localize("UTC").dt.tz_convert(dt.timezone(timezone))
+
+    # Same as ocpa, events are sorted by their timestamp while keeping the order of the file for equal timestamps.
+    timestamps = np.frombuffer(timestamps, dtype=np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    number_of_events = len(order)
+
+    event_positions = np.empty(number_of_events, dtype=np.int64)
+    event_positions[order] = np.arange(number_of_events)
+
+    columns = {"start_timestamp": to_timestamps(np.frombuffer(start_timestamps, dtype=np.int64)[order])}
+    first_positions = {"start_timestamp": 0}
+    for (name, values) in attributes.items():
+        values = pd.Series(values)
+        columns[name] = values.iloc[order].reset_index(drop=True)
+        first_positions[name] = event_positions[values.notna().to_numpy()].min(initial=number_of_events)
+
+    events = DataFrame({
+        "event_activity": pd.Series(np.array(activities, dtype=object)[np.frombuffer(event_activities,
+                                                                                     dtype=np.int64)[order]]
+                                    if activities else np.array([], dtype=object), dtype=object),
+        "event_timestamp": to_timestamps(timestamps[order]),
+        **{name if name.startswith("event_") else f"event_{name}": columns[name] for name in attribute_names}
+    })
+    events["event_id"] = order.astype(np.int64)
+    events.index = pd.Index(order.astype(np.int64), name="event_id")
+
+    # Split the relations by object type, ordered by the position of the event in the sorted event table.
+    related_object_indptr = np.frombuffer(related_object_indptr, dtype=np.int64)
+    related_objects = np.frombuffer(related_objects, dtype=np.int64)
+    relation_positions = np.repeat(event_positions, np.diff(related_object_indptr))
+    relation_order = np.lexsort((np.arange(len(related_objects)), relation_positions))
+    relation_positions, related_objects = relation_positions[relation_order], related_objects[relation_order]
+    # Same as ocpa, objects of types missing from the global log are dropped. The last entry maps objects without type.
+    type_positions = np.array([object_types.index(object_type) if object_type in object_types else -1
+                               for object_type in object_type_names] + [-1], dtype=np.int64)
+    relation_types = type_positions[np.frombuffer(object_type_codes, dtype=np.int64)[related_objects]]
+    object_ids = np.array(list(object_codes.keys()), dtype=str)
+
+    objects = {}
+    for (j, object_type) in enumerate(object_types):
+        is_of_type = relation_types == j
+        codes, uniques = pd.factorize(related_objects[is_of_type])
+        objects[object_type] = (
+            np.r_[0, np.cumsum(np.bincount(relation_positions[is_of_type], minlength=number_of_events))],
+            codes.astype(np.int64),
+            object_ids[uniques]
+        )
+
+    # ocpa adds the attribute and object columns in the order in which they first occur in the sorted events. Within an
+    # event, attributes come first, followed by the object types in the order of the related objects.
+    types, first_occurrences = np.unique(relation_types, return_index=True)
+    column_order = [((first_positions[name], 0, k), name if name.startswith("event_") else f"event_{name}")
+                    for (k, name) in enumerate(attribute_names)]
+    column_order += [((relation_positions[k], 1, k), object_types[j])
+                     for (j, k) in zip(types.tolist(), first_occurrences.tolist()) if j >= 0]
+    log_columns = ["event_activity", "event_timestamp"] + [column for (_, column) in sorted(column_order)] + \
+                  ["event_id"]
+
+    return write_snapshot(folder, events, objects, object_types, log_columns, source)
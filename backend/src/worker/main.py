@@ -2,6 +2,9 @@ import time
 import os
 
 from celery import Celery
+from celery.signals import task_postrun
+
+from task_events import publish_task_event
 
 REDIS_HOST = os.environ.get('EXPLORI_REDIS_HOST', default='localhost')
 REDIS_PORT = os.environ.get('EXPLORI_REDIS_PORT', default='6379')
@@ -12,3 +15,9 @@ app = Celery(
     backend=f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 )
 app.autodiscover_tasks(['worker.tasks.dfm', 'worker.tasks.alignments', 'worker.tasks.performance'], force=True)
+
+
+@task_postrun.connect
+def publish_finished_task(task_id=None, task=None, state=None, **kwargs):
+    # Clients waiting for the task are notified, see `task_events`.
+    publish_task_event(task_id, task.name, state)
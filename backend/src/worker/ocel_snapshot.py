@@ -0,0 +1,242 @@
+import ast
+import json
+import os
+import shutil
+from itertools import chain
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from ocpa.objects.log.ocel import OCEL
+from pandas import DataFrame
+
+from cache import encode_column, decode_column
+
+# The snapshot of an imported OCEL is a folder of .npy files, which are memory mapped when reading the snapshot:
+# - column_<i>.npy / uniques_<i>.npy: The event table (event ids, activity codes, timestamps as int64, ...), encoded by
+#   `encode_column`. The index of the event table is stored as index.npy (and index_uniques.npy) unless it's the
+#   default range index.
+# - objects_<j>_indptr.npy / objects_<j>_indices.npy / objects_<j>_ids.npy: The objects of the j-th object type
+#   related to each event in CSR form. The objects of the i-th event are
+#   ids[indices[indptr[i]:indptr[i + 1]]]. Objects are numbered by their first occurrence.
+# - meta.json: Column names and encodings, object types and the version of the OCEL file the snapshot belongs to.
+
+# Snapshots of version 1 dropped event columns of other Python objects, which are stored as JSON now.
+SNAPSHOT_VERSION = 2
+META_FILE = "meta.json"
+
+
+class OCELSnapshot:
+    """
+    Memory mapped columnar representation of an imported OCEL.
+    """
+    object_types: List[str]
+    source: List[Any]
+
+    __folder: str
+    __columns: List[Tuple[str, str]]
+    __index: Tuple[str | None, str] | None
+    __log_columns: List[str]
+
+    def __init__(self, folder: str):
+        self.__folder = folder
+        with open(os.path.join(folder, META_FILE), 'r') as f:
+            meta = json.load(f)
+        self.object_types = meta["object_types"]
+        self.source = meta["source"]
+        self.__columns = [(name, kind) for (name, kind) in meta["columns"]]
+        self.__index = tuple(meta["index"]) if meta["index"] is not None else None
+        self.__log_columns = meta["log_columns"]
+
+    def events(self, start: int = 0, end: int | None = None) -> DataFrame:
+        """
+        Restores the event table of the OCEL, i.e. the OCEL without the object columns. Only the rows of the requested
+        range are read from the memory mapped columns.
+        :param start: Position of the first event
+        :param end: Position after the last event, or `None` for all remaining events
+        :return: Event table with the same event columns as the event log of the ocpa OCEL, rows as in `iloc[start:end]`
+        """
+        rows = slice(start, end)
+        events = DataFrame({name: decode_column(kind, self.__column_arrays(f"column_{i}", f"uniques_{i}", rows))
+                            for (i, (name, kind)) in enumerate(self.__columns)})
+        if self.__index is not None:
+            name, kind = self.__index
+            events.index = pd.Index(decode_column(kind, self.__column_arrays("index", "index_uniques", rows)),
+                                    name=name)
+        else:
+            events.index = pd.RangeIndex(*rows.indices(self.number_of_events()))
+        return events
+
+    def log(self, start: int = 0, end: int | None = None) -> DataFrame:
+        """
+        Restores the event log of the OCEL including the object columns, which contain the list of related objects of
+        each event.
+        :param start: Position of the first event
+        :param end: Position after the last event, or `None` for all remaining events
+        :return: Event log with the same columns as the event log of the ocpa OCEL, rows as in `iloc[start:end]`
+        """
+        log = self.events(start, end)
+        start, end, _ = slice(start, end).indices(self.number_of_events())
+        for object_type in self.object_types:
+            indptr, indices, object_ids = self.objects(object_type)
+            indptr = indptr[start:end + 1]
+            related_objects = object_ids[indices[indptr[0]:indptr[-1]]].tolist()
+            indptr = indptr - indptr[0]
+            # Object columns of empty logs have the object dtype as well.
+            log[object_type] = pd.Series([related_objects[a:b] for (a, b) in zip(indptr[:-1], indptr[1:])],
+                                         index=log.index, dtype=object)
+        return log[self.__log_columns]
+
+    def number_of_events(self) -> int:
+        """
+        :return: Number of events of the OCEL
+        """
+        return len(self.__load("objects_0_indptr.npy")) - 1 if self.object_types else len(self.__load("column_0.npy"))
+
+    def objects(self, object_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the objects of the object type related to each event in CSR form.
+        :param object_type: Object type
+        :return: Index pointers, object indices, and object ids
+        """
+        j = self.object_types.index(object_type)
+        return (self.__load(f"objects_{j}_indptr.npy"),
+                self.__load(f"objects_{j}_indices.npy"),
+                self.__load(f"objects_{j}_ids.npy"))
+
+    def project(self, object_type: str) -> DataFrame:
+        """
+        Projects the OCEL onto the object type without exploding the object columns. The result is the same as
+        flattening the OCEL and filtering it for the object type (as done by ocpa), except that the cases are ordered by
+        their first event and the events of each case keep the order of the OCEL.
+        :param object_type: Object type to project onto
+        :return: Projected event log
+        """
+        events = self.events().rename(columns={"event_activity": "concept:name", "event_timestamp": "time:timestamp"})
+        indptr, indices, object_ids = self.objects(object_type)
+
+        event_positions = np.repeat(np.arange(len(events)), np.diff(indptr))
+        has_activity = events["concept:name"].notna().to_numpy()[event_positions]
+        event_positions, case_codes = event_positions[has_activity], indices[has_activity]
+
+        # Objects are numbered by their first occurrence, hence the stable sort orders the cases by their first event.
+        order = np.argsort(case_codes, kind="stable")
+        event_log = events.iloc[event_positions[order]].reset_index(drop=True)
+        event_log["case:concept:name"] = object_ids[case_codes[order]].astype(object)
+        return event_log
+
+    def __column_arrays(self, values_name: str, uniques_name: str, rows: slice = slice(None)) -> Dict[str, np.ndarray]:
+        arrays = {"values": self.__load(f"{values_name}.npy")[rows]}
+        if os.path.isfile(os.path.join(self.__folder, f"{uniques_name}.npy")):
+            arrays["uniques"] = self.__load(f"{uniques_name}.npy")
+        return arrays
+
+    def __load(self, filename: str) -> np.ndarray:
+        return np.load(os.path.join(self.__folder, filename), mmap_mode='r', allow_pickle=False)
+
+
+def read_ocel_snapshot(folder: str, source: List[Any]) -> OCELSnapshot | None:
+    """
+    Opens the snapshot if it exists and belongs to the given version of the OCEL file.
+    :param folder: Folder of the snapshot
+    :param source: Version of the OCEL file, e.g. its modification time and size
+    :return: Snapshot or `None` if there is no valid snapshot
+    """
+    if not os.path.isfile(os.path.join(folder, META_FILE)):
+        return None
+
+    with open(os.path.join(folder, META_FILE), 'r') as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION or meta.get("source") != source:
+        return None
+    return OCELSnapshot(folder)
+
+
+def write_ocel_snapshot(folder: str, ocel: OCEL, source: List[Any]) -> OCELSnapshot:
+    """
+    Writes the snapshot of the imported OCEL.
+    :param folder: Folder of the snapshot
+    :param ocel: Imported OCEL
+    :param source: Version of the OCEL file, e.g. its modification time and size
+    :return: Written snapshot
+    """
+    log: DataFrame = ocel.log.log
+    object_types = list(ocel.object_types)
+
+    objects = {}
+    for object_type in object_types:
+        related_objects = [as_object_list(value) for value in log[object_type].values]
+        object_counts = np.fromiter(map(len, related_objects), dtype=np.int64, count=len(related_objects))
+        codes, object_ids = pd.factorize(pd.Series(list(chain.from_iterable(related_objects)), dtype=object))
+        objects[object_type] = (np.r_[0, np.cumsum(object_counts)], codes.astype(np.int64),
+                                np.array(object_ids, dtype=str))
+
+    return write_snapshot(folder, log.drop(columns=object_types), objects, object_types, list(log.columns), source)
+
+
+def write_snapshot(folder: str, events: DataFrame, objects: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                   object_types: List[str], log_columns: List[str], source: List[Any]) -> OCELSnapshot:
+    """
+    Writes a snapshot from its columnar parts. The snapshot is written to a temporary folder first, so readers never
+    see a partially written snapshot.
+    :param folder: Folder of the snapshot
+    :param events: Event table, i.e. the event log without the object columns
+    :param objects: Related objects of each event per object type in CSR form, see `OCELSnapshot.objects`
+    :param object_types: Object types of the OCEL
+    :param log_columns: Column order of the event log
+    :param source: Version of the OCEL file, e.g. its modification time and size
+    :return: Written snapshot
+    """
+    temporary_folder = f"{folder}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary_folder, ignore_errors=True)
+    os.makedirs(temporary_folder)
+
+    columns = []
+    for column in events.columns:
+        kind, arrays = encode_column(events[column])
+        for (name, values) in arrays.items():
+            np.save(os.path.join(temporary_folder, f"{'column' if name == 'values' else name}_{len(columns)}.npy"),
+                    values, allow_pickle=False)
+        columns.append((column, kind))
+
+    index = None
+    if not isinstance(events.index, pd.RangeIndex) or events.index.name is not None:
+        kind, arrays = encode_column(events.index.to_series())
+        np.save(os.path.join(temporary_folder, "index.npy"), arrays["values"], allow_pickle=False)
+        if "uniques" in arrays:
+            np.save(os.path.join(temporary_folder, "index_uniques.npy"), arrays["uniques"], allow_pickle=False)
+        index = (events.index.name, kind)
+
+    for (j, object_type) in enumerate(object_types):
+        indptr, indices, object_ids = objects[object_type]
+        np.save(os.path.join(temporary_folder, f"objects_{j}_indptr.npy"), indptr)
+        np.save(os.path.join(temporary_folder, f"objects_{j}_indices.npy"), indices)
+        np.save(os.path.join(temporary_folder, f"objects_{j}_ids.npy"), object_ids)
+
+    with open(os.path.join(temporary_folder, META_FILE), 'w') as f:
+        json.dump({
+            "version": SNAPSHOT_VERSION,
+            "source": source,
+            "columns": columns,
+            "index": index,
+            "log_columns": log_columns,
+            "object_types": object_types
+        }, f)
+
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(temporary_folder, folder)
+    return OCELSnapshot(folder)
+
+
+def as_object_list(value: Any) -> List[Any]:
+    """
+    Returns the objects stored in an object column of the event log of an ocpa OCEL.
+    :param value: Value of the object column
+    :return: List of object ids
+    """
+    # Same as ocpa, we accept sets that have been serialized as strings, e.g. by the csv importer.
+    if isinstance(value, str) and value.startswith("{"):
+        value = ast.literal_eval(value)
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return []
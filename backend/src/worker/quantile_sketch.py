@@ -0,0 +1,90 @@
+import math
+import os
+from typing import List
+
+from pydantic import BaseModel
+
+# Capacity of the top level of `KLLSketch`, which bounds the rank error to roughly 1.7 / k of the number of values.
+SKETCH_CAPACITY = int(os.environ.get('EXPLORI_QUANTILE_SKETCH_CAPACITY', default='200'))
+SKETCH_MIN_LEVEL_CAPACITY = 2
+SKETCH_CAPACITY_DECAY = 2 / 3
+
+
+class KLLSketch(BaseModel):
+    """
+    Mergeable quantile sketch by Karnin, Lang and Liberty (https://arxiv.org/abs/1603.05346). The values are kept in a
+    hierarchy of compactors, where each value of level h represents 2^h values. Once a level exceeds its capacity, it
+    is sorted and every other value is promoted to the next level. The sketch stores O(k log(n / k)) values and is
+    exact as long as no level has been compacted, i.e. for at most about k values.
+
+    Compactions alternate between promoting the values at even and odd positions instead of choosing randomly, so
+    sketches are reproducible.
+    """
+    k: int = SKETCH_CAPACITY
+    compactors: List[List[int]] = [[]]
+    offsets: List[int] = [0]
+
+    def update(self, values: List[int]):
+        """
+        Adds values to the sketch.
+        :param values: Values to add
+        """
+        self.compactors[0].extend(values)
+        self.__compress()
+
+    def merge(self, other: 'KLLSketch'):
+        """
+        Adds the values of another sketch to this sketch.
+        :param other: Sketch to merge, which is not modified
+        """
+        for (level, compactor) in enumerate(other.compactors):
+            if level == len(self.compactors):
+                self.compactors.append([])
+                self.offsets.append(0)
+            self.compactors[level].extend(compactor)
+        self.__compress()
+
+    def count(self) -> int:
+        """
+        :return: Number of values added to the sketch
+        """
+        return sum(len(compactor) << level for (level, compactor) in enumerate(self.compactors))
+
+    def value_at_rank(self, rank: int) -> int:
+        """
+        Returns the (approximately) rank-th smallest value, i.e. `sorted(values)[rank]` if the sketch is exact.
+        :param rank: Rank of the value, between 0 and the number of values - 1
+        :return: Value
+        """
+        weighted_values = sorted((value, 1 << level)
+                                 for (level, compactor) in enumerate(self.compactors) for value in compactor)
+        if not weighted_values:
+            raise ValueError("The sketch is empty.")
+
+        cumulative_weight = 0
+        for (value, weight) in weighted_values:
+            cumulative_weight += weight
+            if cumulative_weight > rank:
+                return value
+        return weighted_values[-1][0]
+
+    def __capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(SKETCH_MIN_LEVEL_CAPACITY, math.ceil(self.k * SKETCH_CAPACITY_DECAY ** depth))
+
+    def __compress(self):
+        while sum(map(len, self.compactors)) > sum(self.__capacity(level) for level in range(len(self.compactors))):
+            for (level, compactor) in enumerate(self.compactors):
+                if len(compactor) < self.__capacity(level):
+                    continue
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                    self.offsets.append(0)
+
+                compactor.sort()
+                # An odd value stays at its level.
+                kept = [compactor.pop()] if len(compactor) % 2 == 1 else []
+                self.compactors[level + 1].extend(compactor[self.offsets[level]::2])
+                self.offsets[level] = 1 - self.offsets[level]
+                self.compactors[level] = kept
+                break
@@ -1,15 +1,20 @@
+import heapq
 import json
-from collections import namedtuple
+import math
+import os
+import time
+from collections import namedtuple, deque
 from enum import Enum
 from pathlib import PureWindowsPath
-from typing import List, Tuple, NamedTuple, Dict, Any, Literal
+from typing import List, Tuple, NamedTuple, Dict, Any, Literal, Callable, Set
 import operator as op
 
 import pandas
 from pm4py.objects.log.obj import EventLog
 from pydantic import BaseModel
 
-from cache import get_long_term_cache, dfm as dfm_cache_key
+from cache import get_long_term_cache, LongTermCache, dfm as dfm_cache_key, alignments as alignments_cache_key, hash, \
+    alignment_by_content, SHARED_ALIGNMENTS_OCEL, filtered_dfg as filtered_dfg_cache_key, SizeBoundedLRUCache
 from server import task_manager
 from shared_types import FrontendFriendlyDFM, FrontendFriendlyNode, FrontendFriendlyEdge
 from worker.main import app
@@ -33,12 +38,60 @@ class FilteredDFG(BaseModel):
 
 SKIP_MOVE = ">>"
 
+# Move types of `DFGAligner`, ordered by the preference of pm4py's Dijkstra.
+SYNC_MOVE = 0
+LOG_MOVE = 1
+MODEL_MOVE = 2
+
+# Version of the alignment cache entries, see `server.endpoints.pm.run_alignment_tasks`.
+ALIGNMENT_RESULT_VERSION = "2"
+# Version of the cache entries of alignment batches, which contain the alignments of all traces of the batch, see
+# `compute_alignments_batch`. Batches of earlier versions only contained the trace ids.
+ALIGNMENT_BATCH_RESULT_VERSION = f"{ALIGNMENT_RESULT_VERSION}.1"
+
+# Version of the filtered DFGs stored by `load_filtered_dfg`.
+FILTERED_DFG_VERSION = "1"
+
+# Aligners of filtered DFGs are kept in memory by each worker process, see `get_aligner`.
+ALIGNMENT_MODEL_CACHE_BYTES = int(os.environ.get('EXPLORI_ALIGNMENT_MODEL_CACHE_BYTES', default=str(64 * 1024 ** 2)))
+ALIGNMENT_MODEL_BYTES_PER_ELEMENT = 2048
+__ALIGNMENT_MODEL_CACHE = SizeBoundedLRUCache(ALIGNMENT_MODEL_CACHE_BYTES)
+
+# Budget of the alignment of a single trace, see `get_alignment_budget`. Alignments exceeding the budget are approximated
+# by `DFGAligner.align_approximately`. The memory of the native engine is estimated by the number of stored states,
+# pm4py only supports the time limit.
+ALIGNMENT_MAX_EXPANDED_STATES = int(os.environ.get('EXPLORI_ALIGNMENT_MAX_EXPANDED_STATES', default='1000000'))
+ALIGNMENT_MAX_SECONDS = float(os.environ.get('EXPLORI_ALIGNMENT_MAX_SECONDS', default='60'))
+ALIGNMENT_MAX_MEMORY_BYTES = int(os.environ.get('EXPLORI_ALIGNMENT_MAX_MEMORY_BYTES', default=str(512 * 1024 ** 2)))
+ALIGNMENT_STATE_BYTES = 400
+ALIGNMENT_BEAM_WIDTH = int(os.environ.get('EXPLORI_ALIGNMENT_BEAM_WIDTH', default='100'))
+
+# Alignments of an object type are computed in batches, see `chunk_alignment_traces`.
+ALIGNMENT_BATCH_TARGET_CHUNKS = int(os.environ.get('EXPLORI_ALIGNMENT_BATCH_TARGET_CHUNKS', default='8'))
+ALIGNMENT_BATCH_MIN_EVENTS = int(os.environ.get('EXPLORI_ALIGNMENT_BATCH_MIN_EVENTS', default='2000'))
+ALIGNMENT_BATCH_MAX_TRACES = int(os.environ.get('EXPLORI_ALIGNMENT_BATCH_MAX_TRACES', default='500'))
+
 class AlignElement(BaseModel):
     activity: str
 
 class TraceAlignment(BaseModel):
     log_alignment: List[AlignElement]
     model_alignment: List[AlignElement]
+    # Whether the alignment exceeded its budget and is not necessarily optimal, see `get_alignment_budget`.
+    approximate: bool = False
+
+
+class AlignmentBudget(NamedTuple):
+    max_expanded_states: int
+    max_seconds: float
+    max_memory_bytes: int
+
+
+class AlignmentEngine(str, Enum):
+    # Alignments on the petrinet of the DFG using pm4py, see `build_petrinet`.
+    PM4PY = "pm4py"
+    # Alignments directly on the DFG, see `DFGAligner`.
+    NATIVE = "native"
 
 
 def rearrange_and_deduplicate_alignments(aligned_traces: List[Dict[str, Any]]) -> List[TraceAlignment]:
@@ -97,33 +150,561 @@ def rearrange_alignment(alignment: List[List[Tuple[str, str]]]) -> TraceAlignmen
 
 
 @app.task()
-def compute_alignments(process_ocel: str, threshold: float, object_type: str, trace: List[str]):
+def compute_alignments(process_ocel: str, threshold: float, object_type: str, trace: List[str],
+                       engine: AlignmentEngine = AlignmentEngine.PM4PY):
     """
     Celery task which computes the alignment between a DFG and a single trace.
     :param process_ocel: Ocel of the DFM containing the DFG to calculate alignments on
     :param threshold: Filtering threshold to apply before calculating alignments
     :param object_type: Object type indicating for which DFG the alignments should be calculated
     :param trace: Trace which gets converted into an artificial projected event log which is then aligned to the DFG
+    :param engine: Alignment engine to use
     :return: Resulting trace alignment information
     """
+    dfg = load_filtered_dfg(process_ocel, object_type, threshold)
+    return get_aligner(dfg, engine)(trace).dict()
+
+
+@app.task()
+def compute_alignments_batch(process_ocel: str, threshold: float, object_type: str, conformance_ocel: str,
+                             traces: List[Tuple[int, List[str]]],
+                             engine: AlignmentEngine = AlignmentEngine.PM4PY) -> List[Dict[str, Any]]:
+    """
+    Celery task which computes the alignments between a DFG and several traces. The DFG is filtered and prepared for the
+    alignment engine only once for all traces. Alignments are stored by the content of the DFG and the trace, so
+    alignments computed for other OCELs or thresholds are reused. The cache entry of each trace only points to its
+    alignment and is written as soon as the alignment is available, so finished alignments can be read before the batch
+    is done. Approximate alignments depend on the alignment budget, hence they are only stored in the entry of the trace
+    and never shared.
+    :param process_ocel: Ocel of the DFM containing the DFG to calculate alignments on
+    :param threshold: Filtering threshold to apply before calculating alignments
+    :param object_type: Object type indicating for which DFG the alignments should be calculated
+    :param conformance_ocel: Ocel containing the traces
+    :param traces: Trace ids and traces to align
+    :param engine: Alignment engine to use
+    :return: Alignments of the traces in the same order, which are cached as result of the batch
+    """
+    dfg = load_filtered_dfg(process_ocel, object_type, threshold)
+    dfg_hash = get_dfg_hash(dfg)
+    aligner = None
+
+    long_term_cache = get_long_term_cache()
+    batch_alignments = []
+    for (trace_id, trace) in traces:
+        # Alignments are stored by content, the entry of the trace only points to it.
+        content_key = alignment_by_content(dfg_hash, trace)
+        trace_key = alignments_cache_key(threshold, conformance_ocel, object_type, trace_id)
+        alignment = read_shared_alignment(content_key)
+        if alignment is None:
+            if aligner is None:
+                aligner = get_aligner(dfg, engine)
+            trace_alignment = aligner(trace)
+            alignment = trace_alignment.dict()
+            if trace_alignment.approximate:
+                long_term_cache.set(process_ocel, trace_key, {
+                    'result': alignment,
+                    'version': ALIGNMENT_RESULT_VERSION
+                })
+                batch_alignments.append(alignment)
+                continue
+
+            long_term_cache.set(SHARED_ALIGNMENTS_OCEL, content_key, {
+                'result': alignment,
+                'version': ALIGNMENT_RESULT_VERSION
+            })
+
+        long_term_cache.set(process_ocel, trace_key, {
+            'pointer': content_key,
+            'version': ALIGNMENT_RESULT_VERSION
+        })
+        batch_alignments.append(alignment)
+
+    return batch_alignments
+
+
+def read_cached_alignment(ocel: str, key: str, long_term_cache: LongTermCache | None = None) -> Dict[str, Any] | None:
+    """
+    Reads an alignment from the long term cache. Entries either contain the alignment itself or point to an alignment
+    stored by content in the shared alignments, see `cache.alignment_by_content`.
+    :param ocel: Ocel the entry belongs to
+    :param key: Long term cache key of the entry
+    :param long_term_cache: Cache to read the entry from, defaults to the long term cache
+    :return: Alignment or `None` if there is no entry of the current version
+    """
+    if long_term_cache is None:
+        long_term_cache = get_long_term_cache()
+    try:
+        cached_alignment = long_term_cache.get(ocel, key)
+    except json.JSONDecodeError:
+        # Entries are written atomically, but an entry might have been truncated by an earlier version. The entry is
+        # treated as missing, so it is computed and written again.
+        return None
+    if cached_alignment is None or cached_alignment.get("version") != ALIGNMENT_RESULT_VERSION:
+        return None
+    if "pointer" in cached_alignment:
+        return read_cached_alignment(SHARED_ALIGNMENTS_OCEL, cached_alignment["pointer"], long_term_cache)
+    return cached_alignment.get("result")
+
+
+def read_cached_alignments(ocel: str, keys: List[str], long_term_cache: LongTermCache | None = None) \
+        -> List[Dict[str, Any] | None]:
+    """
+    Bulk version of `read_cached_alignment`, which lists the cache entries of the OCEL once and only reads the existing
+    entries.
+    :param ocel: Ocel the entries belong to
+    :param keys: Long term cache keys of the entries
+    :param long_term_cache: Cache to read the entries from, defaults to the long term cache
+    :return: Alignments in the order of the keys, `None` for missing entries
+    """
+    if long_term_cache is None:
+        long_term_cache = get_long_term_cache()
+    return [read_cached_alignment(ocel, key, long_term_cache) if exists else None
+            for (key, exists) in zip(keys, long_term_cache.has_many(ocel, keys))]
+
+
+def read_alignments_batch(ocel: str, key: str, long_term_cache: LongTermCache | None = None) \
+        -> List[Dict[str, Any]] | None:
+    """
+    Reads the alignments of a finished batch, see `compute_alignments_batch`.
+    :param ocel: Ocel the entry belongs to
+    :param key: Long term cache key of the batch, see `cache.alignments_batch`
+    :param long_term_cache: Cache to read the entry from, defaults to the long term cache
+    :return: Alignments of the traces of the batch or `None` if there is no entry of the current version
+    """
+    if long_term_cache is None:
+        long_term_cache = get_long_term_cache()
+    try:
+        cached_batch = long_term_cache.get(ocel, key)
+    except json.JSONDecodeError:
+        return None
+    if cached_batch is None or cached_batch.get("version") != ALIGNMENT_BATCH_RESULT_VERSION:
+        return None
+    return cached_batch.get("result")
+
+
+def read_shared_alignment(content_key: str, long_term_cache: LongTermCache | None = None) -> Dict[str, Any] | None:
+    """
+    Reads an alignment shared by content, see `compute_alignments_batch`. Approximate alignments, which might have been
+    shared by earlier versions, are ignored.
+    :param content_key: Key of the alignment, see `cache.alignment_by_content`
+    :param long_term_cache: Cache to read the alignment from, defaults to the long term cache
+    :return: Exact alignment or `None` if there is none
+    """
+    return exact_alignment(read_cached_alignment(SHARED_ALIGNMENTS_OCEL, content_key, long_term_cache))
+
+
+def read_shared_alignments(content_keys: List[str], long_term_cache: LongTermCache | None = None) \
+        -> List[Dict[str, Any] | None]:
+    """
+    Bulk version of `read_shared_alignment`, see `read_cached_alignments`.
+    :param content_keys: Keys of the alignments, see `cache.alignment_by_content`
+    :param long_term_cache: Cache to read the alignments from, defaults to the long term cache
+    :return: Exact alignments in the order of the keys, `None` if there is none
+    """
+    return [exact_alignment(alignment)
+            for alignment in read_cached_alignments(SHARED_ALIGNMENTS_OCEL, content_keys, long_term_cache)]
+
+
+def exact_alignment(alignment: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    return alignment if alignment is not None and not alignment.get("approximate", False) else None
+
+
+def get_dfg_hash(dfg: FilteredDFG) -> str:
+    """
+    Hashes the canonical form of the DFG, i.e. its node labels and edges independent of their order. Alignments only
+    depend on this form, so DFGs of different OCELs or thresholds with the same hash share their alignments.
+    :param dfg: Filtered DFG
+    :return: Hash of the DFG
+    """
+    return hash(json.dumps({"nodes": sorted(dfg.nodes), "edges": sorted(get_dfg_steps(dfg))}))
+
+
+def chunk_alignment_traces(traces: List[Tuple[int, List[str]]]) -> List[List[Tuple[int, List[str]]]]:
+    """
+    Splits the traces of one object type into chunks of similar alignment effort, which is estimated by the number of
+    events. Few traces end up in a single chunk, while many traces are spread across about
+    `ALIGNMENT_BATCH_TARGET_CHUNKS` chunks to keep all workers busy. The chunks only depend on the traces, so repeated
+    requests for the same traces refer to the same chunks.
+    :param traces: Trace ids and traces to align
+    :return: Chunks of trace ids and traces
+    """
+    total_events = sum(len(trace) + 1 for (_, trace) in traces)
+    chunk_events = max(ALIGNMENT_BATCH_MIN_EVENTS, math.ceil(total_events / ALIGNMENT_BATCH_TARGET_CHUNKS))
+
+    chunks = []
+    chunk = []
+    events = 0
+    for (trace_id, trace) in traces:
+        chunk.append((trace_id, trace))
+        events += len(trace) + 1
+        if events >= chunk_events or len(chunk) >= ALIGNMENT_BATCH_MAX_TRACES:
+            chunks.append(chunk)
+            chunk = []
+            events = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def load_filtered_dfg(process_ocel: str, object_type: str, threshold: float) -> FilteredDFG:
+    """
+    Loads the filtered DFG of the object type. The DFG is filtered from the DFM of the OCEL only once per threshold and
+    then stored in the long term cache, so that it's not necessary to read and validate the whole DFM again. The stored
+    DFG is identified by the modification time and size of the DFM entry, so it's filtered again once the DFM changes.
+    :param process_ocel: Ocel of the DFM containing the DFG to calculate alignments on
+    :param object_type: Object type indicating which DFG should be filtered
+    :param threshold: Filtering threshold to apply
+    :return: Threshold filtered DFG
+    """
     process_ocel = PureWindowsPath(process_ocel).as_posix()
 
-    # we know that the DFM exists because the `compute_alignments` endpoint does not start this task before the DFM is discovered
     long_term_cache = get_long_term_cache()
+    # The `compute_alignments` endpoint does not start this task before the DFM is discovered.
+    dfm_stat = long_term_cache.stat(process_ocel, dfm_cache_key())
+    if dfm_stat is None:
+        raise ValueError(f"The DFM of {process_ocel} has to be discovered before aligning traces on it.")
+    dfm_version = [dfm_stat.st_mtime_ns, dfm_stat.st_size]
+
+    cached_dfg = long_term_cache.get(process_ocel, filtered_dfg_cache_key(threshold, object_type))
+    if cached_dfg is not None and cached_dfg.get('version') == FILTERED_DFG_VERSION and \
+            cached_dfg.get('dfm_version') == dfm_version:
+        return FilteredDFG(**cached_dfg['result'])
+
     dfm = long_term_cache.get(process_ocel, dfm_cache_key())
+    if dfm is None:
+        raise ValueError(f"The DFM of {process_ocel} has to be discovered before aligning traces on it.")
     if 'version' in dfm and 'result' in dfm:
         dfm = dfm['result']
     dfm = FrontendFriendlyDFM(**dfm)
     dfg = filter_threshold_of_graph_notation(dfm, object_type, threshold)
 
-    projected_log = build_trace_event_log(trace)
+    long_term_cache.set(process_ocel, filtered_dfg_cache_key(threshold, object_type), {
+        'result': dfg.dict(),
+        'version': FILTERED_DFG_VERSION,
+        'dfm_version': dfm_version
+    })
+    return dfg
+
+
+def get_aligner(dfg: FilteredDFG, engine: AlignmentEngine) -> Callable[[List[str]], TraceAlignment]:
+    """
+    Returns the aligner of the DFG, see `build_aligner`. Aligners are kept in memory by each worker process and shared
+    by all DFGs with the same canonical form.
+    :param dfg: Filtered DFG to align traces on
+    :param engine: Alignment engine to use
+    :return: Function aligning a trace with the DFG
+    """
+    cache = get_alignment_model_cache()
+    key = (get_dfg_hash(dfg), AlignmentEngine(engine))
+
+    aligner = cache.get(key)
+    if aligner is None:
+        aligner = build_aligner(dfg, engine)
+        # Rough estimate of the size of the petrinet or the adjacency lists.
+        cache.set(key, aligner, ALIGNMENT_MODEL_BYTES_PER_ELEMENT * (1 + len(dfg.nodes) + len(dfg.edges)))
+    return aligner
+
+
+def get_alignment_model_cache() -> SizeBoundedLRUCache:
+    return __ALIGNMENT_MODEL_CACHE
+
+
+def get_alignment_budget() -> AlignmentBudget:
+    return AlignmentBudget(max_expanded_states=ALIGNMENT_MAX_EXPANDED_STATES, max_seconds=ALIGNMENT_MAX_SECONDS,
+                           max_memory_bytes=ALIGNMENT_MAX_MEMORY_BYTES)
+
+
+def build_aligner(dfg: FilteredDFG, engine: AlignmentEngine) -> Callable[[List[str]], TraceAlignment]:
+    """
+    Prepares the DFG for the alignment engine, so that several traces can be aligned with it. Alignments exceeding the
+    budget returned by `get_alignment_budget` are approximated.
+    :param dfg: Filtered DFG to align traces on
+    :param engine: Alignment engine to use
+    :return: Function aligning a trace with the DFG
+    """
+    aligner = DFGAligner(dfg)
+    if engine == AlignmentEngine.NATIVE:
+        return lambda trace: aligner.align(trace, get_alignment_budget())
+
     petrinet, initial_marking, final_marking = build_petrinet(dfg)
     # petrinet, initial_marking, final_marking = build_pm4py_dfg(dfg)
+    return lambda trace: align_trace(trace, petrinet, initial_marking, final_marking,
+                                     get_alignment_budget().max_seconds) or aligner.align_approximately(trace)
+
+
+def align_trace(trace: List[str], petrinet: PetriNet, initial_marking, final_marking,
+                max_seconds: float = math.inf) -> TraceAlignment | None:
+    """
+    Aligns a single trace with the petrinet of a DFG.
+    :param trace: Trace to align
+    :param petrinet: Petrinet of the DFG, see `build_petrinet`
+    :param initial_marking: Initial marking of the petrinet
+    :param final_marking: Final marking of the petrinet
+    :param max_seconds: Time limit of the alignment
+    :return: Trace alignment or `None` if the time limit was exceeded
+    """
+    projected_log = build_trace_event_log(trace)
 
     # aligned_traces = conformance_diagnostics_alignments(projected_log, petrinet, initial_marking, final_marking)
-    aligned_traces = alignment_algorithm.apply(projected_log, petrinet, initial_marking, final_marking, variant=alignment_algorithm.VERSION_DIJKSTRA_LESS_MEMORY)
+    parameters = {} if max_seconds == math.inf else {
+        alignment_algorithm.Parameters.PARAM_MAX_ALIGN_TIME_TRACE: max_seconds
+    }
+    aligned_traces = alignment_algorithm.apply(projected_log, petrinet, initial_marking, final_marking,
+                                               variant=alignment_algorithm.VERSION_DIJKSTRA_LESS_MEMORY,
+                                               parameters=parameters)
+
+    if aligned_traces[0] is None:
+        return None
+    return rearrange_alignment(aligned_traces[0]['alignment'])
+
+
+class DFGAligner:
+    """
+    Computes optimal alignments directly on a DFG instead of on its petrinet. Every run of the petrinet built by
+    `build_petrinet` corresponds to a path through the DFG starting before the start node, where entering a node
+    executes its label. Hence, an optimal alignment is a shortest path in the product of the trace and the DFG, whose
+    states are (number of aligned events, current node). Synchronous moves are free, log and model moves cost 1.
+
+    The shortest path is found using A*. Its heuristic uses that each remaining event with a label that does not occur
+    in the DFG needs a log move, and that the stop node is at least the shortest path length away, while each remaining
+    event can save at most one model move by being executed synchronously. Ties are broken like pm4py's Dijkstra, i.e.
+    by preferring states further along the trace, then synchronous, log and model moves, and log moves are never
+    scheduled directly after model moves.
+
+    Alignments exceeding their budget are approximated by a beam search instead, see `compute_approximate_alignment`.
+    """
+    __labels: List[str]
+    __successors: List[List[int]]
+    __distances_to_stop: List[float]
+    __stop: int
+    __nodes_by_label: Dict[str, List[int]]
+    __shortest_path_parents: Dict[int, List[int | None]]
+
+    def __init__(self, dfg: FilteredDFG):
+        # Node 0 is the artificial source place of the petrinet, the nodes of the DFG follow.
+        self.__labels = [START_TOKEN] + dfg.nodes
+        self.__successors = [[] for _ in self.__labels]
+        self.__successors[0].append(1 + dfg.nodes.index(START_TOKEN))
+        for edge in dfg.edges:
+            # Self loops don't change the state when executed as model moves, but can still be synchronous moves.
+            if edge.target + 1 not in self.__successors[edge.source + 1]:
+                self.__successors[edge.source + 1].append(edge.target + 1)
+        self.__stop = 1 + dfg.nodes.index(STOP_TOKEN)
+        self.__nodes_by_label = {}
+        for (i, label) in enumerate(dfg.nodes):
+            self.__nodes_by_label.setdefault(label, []).append(i + 1)
+        self.__shortest_path_parents = {}
+
+        # Breadth first search from the stop node on the reversed DFG.
+        predecessors = [[] for _ in self.__labels]
+        for (source, targets) in enumerate(self.__successors):
+            for target in targets:
+                predecessors[target].append(source)
+        self.__distances_to_stop = [math.inf] * len(self.__labels)
+        self.__distances_to_stop[self.__stop] = 0
+        queue = deque([self.__stop])
+        while queue:
+            node = queue.popleft()
+            for predecessor in predecessors[node]:
+                if self.__distances_to_stop[predecessor] == math.inf:
+                    self.__distances_to_stop[predecessor] = self.__distances_to_stop[node] + 1
+                    queue.append(predecessor)
+
+    def align(self, trace: List[str], budget: AlignmentBudget | None = None) -> TraceAlignment:
+        """
+        Aligns the trace with the DFG.
+        :param trace: Trace to align
+        :param budget: Budget of the optimal alignment, which is approximated if the budget is exceeded
+        :return: Trace alignment, in the same form as `rearrange_alignment` returns for pm4py alignments
+        """
+        alignment = self.compute_alignment(trace, budget)
+        if alignment is None:
+            return self.align_approximately(trace)
+        return rearrange_alignment(alignment)
+
+    def align_approximately(self, trace: List[str]) -> TraceAlignment:
+        """
+        Aligns the trace with the DFG using `compute_approximate_alignment`.
+        :param trace: Trace to align
+        :return: Trace alignment flagged as approximate
+        """
+        alignment = rearrange_alignment(self.compute_approximate_alignment(trace))
+        alignment.approximate = True
+        return alignment
+
+    def compute_alignment(self, trace: List[str], budget: AlignmentBudget | None = None) -> List[Tuple[str, str]] | None:
+        """
+        Computes an optimal alignment of the trace on the DFG.
+        :param trace: Trace to align
+        :param budget: Maximum number of expanded states, time and memory of the search
+        :return: Alignment as list of (log label, model label) pairs, using `SKIP_MOVE` for log and model moves, or
+        `None` if the budget was exceeded
+        """
+        labels = self.__labels
+        successors = self.__successors
+        distances_to_stop = self.__distances_to_stop
+        if distances_to_stop[0] == math.inf:
+            raise ValueError("The stop node of the DFG is not reachable from the start node.")
+
+        # Number of remaining events that cannot be executed synchronously because the DFG does not contain them.
+        known_labels = set(labels)
+        unknown_suffix_counts = [0] * (len(trace) + 1)
+        for i in range(len(trace) - 1, -1, -1):
+            unknown_suffix_counts[i] = unknown_suffix_counts[i + 1] + (trace[i] not in known_labels)
+
+        def heuristic(position: int, node: int) -> float:
+            unknown = unknown_suffix_counts[position]
+            return unknown + max(0, distances_to_stop[node] - (len(trace) - position - unknown))
+
+        # States are (position, node, whether the last move was a model move). Heap entries are ordered by estimated
+        # total cost, negated position, move type, alignment length and insertion order.
+        counter = 0
+        open_states = [(heuristic(0, 0), 0, SYNC_MOVE, 0, counter, 0, (0, 0, False), None, None)]
+        parents: Dict[Tuple[int, int, bool], Tuple[Tuple[int, int, bool] | None, Tuple[str, str] | None]] = {}
+        start_time = time.monotonic()
+
+        while open_states:
+            (_, _, _, length, _, cost, state, parent, move) = heapq.heappop(open_states)
+            if state in parents:
+                continue
+            parents[state] = (parent, move)
+
+            if budget is not None and (
+                    len(parents) > budget.max_expanded_states or
+                    (len(parents) + len(open_states)) * ALIGNMENT_STATE_BYTES > budget.max_memory_bytes or
+                    # Reading the clock is comparatively expensive.
+                    (len(parents) % 1024 == 0 and time.monotonic() - start_time > budget.max_seconds)):
+                return None
+
+            (position, node, after_model_move) = state
+            if position == len(trace) and node == self.__stop:
+                alignment = []
+                while parent is not None:
+                    alignment.append(move)
+                    (parent, move) = parents[parent]
+                return alignment[::-1]
+
+            def push(move_cost: int, next_position: int, next_node: int, move_type: int, next_move: Tuple[str, str]):
+                nonlocal counter
+                next_state = (next_position, next_node, move_type == MODEL_MOVE)
+                if next_state in parents or distances_to_stop[next_node] == math.inf:
+                    return
+                counter += 1
+                heapq.heappush(open_states, (cost + move_cost + heuristic(next_position, next_node), -next_position,
+                                             move_type, length + 1, counter, cost + move_cost, next_state, state,
+                                             next_move))
+
+            synchronous_targets = set()
+            if position < len(trace):
+                for target in successors[node]:
+                    if labels[target] == trace[position]:
+                        push(0, position + 1, target, SYNC_MOVE, (trace[position], labels[target]))
+                        synchronous_targets.add(target)
+            for target in successors[node]:
+                # A model move is dominated by a synchronous move into the same node.
+                if target not in synchronous_targets and target != node:
+                    push(1, position, target, MODEL_MOVE, (SKIP_MOVE, labels[target]))
+            if position < len(trace) and not after_model_move:
+                push(1, position + 1, node, LOG_MOVE, (trace[position], SKIP_MOVE))
+
+        raise ValueError("The trace cannot be aligned with the DFG.")
+
+    def compute_approximate_alignment(self, trace: List[str], beam_width: int | None = None) -> List[Tuple[str, str]]:
+        """
+        Computes an alignment of the trace on the DFG using a beam search over the events of the trace. After each
+        event, only the `beam_width` cheapest nodes (plus their distance to the stop node) are kept. An event is either
+        a log move, or executed synchronously after the model moves of a shortest path to a node with its label. Hence,
+        the alignment is optimal if the beam contains all nodes, and the effort is linear in the length of the trace
+        otherwise.
+        :param trace: Trace to align
+        :param beam_width: Number of nodes kept after each event, defaults to `ALIGNMENT_BEAM_WIDTH`
+        :return: Alignment as list of (log label, model label) pairs, using `SKIP_MOVE` for log and model moves
+        """
+        labels = self.__labels
+        distances_to_stop = self.__distances_to_stop
+        if distances_to_stop[0] == math.inf:
+            raise ValueError("The stop node of the DFG is not reachable from the start node.")
+        beam_width = beam_width if beam_width is not None else ALIGNMENT_BEAM_WIDTH
+
+        # The beam maps nodes to their cost and alignment, which is stored as (alignment of the parent, moves).
+        beam: Dict[int, Tuple[int, Tuple[Any, List[Tuple[str, str]]] | None]] = {0: (0, None)}
+        for activity in trace:
+            candidates = {}
+
+            def offer(node: int, cost: int, alignment: Tuple[Any, List[Tuple[str, str]]]):
+                if node not in candidates or cost < candidates[node][0]:
+                    candidates[node] = (cost, alignment)
+
+            for (node, (cost, alignment)) in beam.items():
+                offer(node, cost + 1, (alignment, [(activity, SKIP_MOVE)]))
+                for target in self.__nodes_by_label.get(activity, []):
+                    path = self.__shortest_path(node, target)
+                    if path is not None and distances_to_stop[target] != math.inf:
+                        moves = [(SKIP_MOVE, labels[step]) for step in path[:-1]] + [(activity, labels[target])]
+                        offer(target, cost + len(path) - 1, (alignment, moves))
+
+            beam = dict(sorted(candidates.items(),
+                               key=lambda item: (item[1][0] + distances_to_stop[item[0]], item[0]))[:beam_width])
+
+        (node, (_, alignment)) = min(beam.items(), key=lambda item: (item[1][0] + distances_to_stop[item[0]], item[0]))
+        if node != self.__stop:
+            alignment = (alignment, [(SKIP_MOVE, labels[step]) for step in self.__shortest_path(node, self.__stop)])
+
+        segments = []
+        while alignment is not None:
+            (alignment, moves) = alignment
+            segments.append(moves)
+        return [move for moves in segments[::-1] for move in moves]
+
+    def __shortest_path(self, source: int, target: int) -> List[int] | None:
+        # Nodes entered on a shortest path of at least one step from the source to the target, including the target.
+        if source not in self.__shortest_path_parents:
+            parents = [None] * len(self.__labels)
+            queue = deque()
+            for successor in self.__successors[source]:
+                parents[successor] = source
+                queue.append(successor)
+            while queue:
+                node = queue.popleft()
+                for successor in self.__successors[node]:
+                    if parents[successor] is None:
+                        parents[successor] = node
+                        queue.append(successor)
+            self.__shortest_path_parents[source] = parents
+
+        parents = self.__shortest_path_parents[source]
+        if parents[target] is None:
+            return None
+        path = [target]
+        while parents[path[-1]] != source:
+            path.append(parents[path[-1]])
+        return path[::-1]
+
+
+def get_dfg_steps(dfg: FilteredDFG) -> Set[Tuple[str, str]]:
+    """
+    Returns the edges of the DFG as pairs of node labels.
+    :param dfg: Filtered DFG
+    :return: Set of (source label, target label) pairs
+    """
+    return {(dfg.nodes[edge.source], dfg.nodes[edge.target]) for edge in dfg.edges}
+
+
+def align_perfectly_fitting_trace(trace: List[str], dfg_steps: Set[Tuple[str, str]]) -> TraceAlignment | None:
+    """
+    Checks whether the trace can be replayed on the DFG, i.e. whether it runs from the start to the stop node along
+    edges of the DFG. The optimal alignment of such a trace only consists of synchronous moves.
+    :param trace: Trace to align
+    :param dfg_steps: Edges of the DFG, see `get_dfg_steps`
+    :return: Synchronous trace alignment or `None` if the trace does not fit the DFG perfectly
+    """
+    if len(trace) < 2 or trace[0] != START_TOKEN or trace[-1] != STOP_TOKEN:
+        return None
+    if not all(step in dfg_steps for step in zip(trace, trace[1:])):
+        return None
 
-    return rearrange_alignment(aligned_traces[0]['alignment']).dict()
+    moves = [AlignElement(activity=activity) for activity in trace]
+    return TraceAlignment(log_alignment=moves, model_alignment=moves)
 
 
 def filter_threshold_of_graph_notation(dfm: FrontendFriendlyDFM, object_type: str, filter_threshold: float) -> FilteredDFG:
@@ -1,9 +1,13 @@
+import os
 from collections import namedtuple
-from typing import Dict, List, Tuple, Generator, Set
+from typing import Dict, List, Tuple, Generator, Set, Any
 from pathlib import PureWindowsPath
 
+import numpy as np
+from celery import chord
+
 from worker.main import app
-from worker.utils import get_all_projected_traces
+from worker.utils import get_all_projected_traces, get_projected_traces
 
 Edge = namedtuple('Edge', ['source', 'target'])
 Node = str
@@ -17,9 +21,22 @@ LowerBoundCountSeparator = namedtuple(
 START_TOKEN = "|EXPLORI_START|"
 STOP_TOKEN = "|EXPLORI_END|"
 
+# In the integer encoded representation, each activity is replaced by its index in the activity vocabulary. The start
+# and the stop token always get the first two codes, which are also their indices in the frontend friendly notation.
+NodeCode = int
+START_CODE: NodeCode = 0
+STOP_CODE: NodeCode = 1
 
-@app.task()
-def dfm(ocel_filename: str):
+
+# The per object type DFGs are independent of each other. If an OCEL has at least this many object types, their
+# computation is fanned out to separate Celery tasks, which are then merged by a chord.
+DFM_FAN_OUT_MIN_OBJECT_TYPES = int(os.environ.get('EXPLORI_DFM_FAN_OUT_MIN_OBJECT_TYPES', default='4'))
+
+ObjectTypeDFG = namedtuple("ObjectTypeDFG", ['edge_counts', 'node_counts', 'trace_thresholds'])
+
+
+@app.task(bind=True)
+def dfm(self, ocel_filename: str):
     """
     Celery task which constructs a DFM from an ocel.
     :param ocel_filename: Path to ocel from which to build the DFM
@@ -36,27 +53,215 @@ def dfm(ocel_filename: str):
         ocel_filename,
         build_if_non_existent=True)
 
+    # The DFM is computed on integer encoded activities, the labels are only decoded in the very last step.
+    vocabulary, encoded_traces = encode_projected_traces(projected_traces)
+    object_types = list(encoded_traces.keys())
+
+    if len(object_types) >= DFM_FAN_OUT_MIN_OBJECT_TYPES:
+        # The replacing chord inherits the id of this task, hence its result is the result of this task.
+        return self.replace(chord(
+            [object_type_dfg.s(ocel_filename, object_type, vocabulary) for object_type in object_types],
+            merge_object_type_dfgs.s(ocel_filename, object_types, vocabulary)))
+
+    object_type_dfgs = [build_object_type_dfg(encoded_traces[object_type], len(vocabulary))
+                        for object_type in object_types]
+    return assemble_dfm(encoded_traces, vocabulary, object_type_dfgs)
+
+
+@app.task()
+def object_type_dfg(ocel_filename: str, object_type: ObjectType, vocabulary: List[Node]):
+    """
+    Celery task which computes the DFG of a single object type as part of the fanned out `dfm` task.
+    :param ocel_filename: Path to ocel from which the DFM is built
+    :param object_type: Object type whose DFG should be computed
+    :param vocabulary: Activity vocabulary shared by all object types of the OCEL
+    :return: Serialized DFG of the object type
+    """
+    traces = get_projected_traces(ocel_filename, object_type, build_if_non_existent=True)
+    _, encoded_traces = encode_projected_traces({object_type: traces}, vocabulary)
+    return serialize_object_type_dfg(build_object_type_dfg(encoded_traces[object_type], len(vocabulary)))
+
+
+@app.task()
+def merge_object_type_dfgs(serialized_dfgs: List[Dict[str, Any]], ocel_filename: str, object_types: List[ObjectType],
+                           vocabulary: List[Node]):
+    """
+    Celery task which merges the DFGs of all object types computed by `object_type_dfg` into the DFM.
+    :param serialized_dfgs: Serialized DFGs in the same order as `object_types`
+    :param ocel_filename: Path to ocel from which the DFM is built
+    :param object_types: Object types of the OCEL
+    :param vocabulary: Activity vocabulary shared by all object types of the OCEL
+    :return: Constructed DFM in frontend friendly format
+    """
+    projected_traces = {object_type: get_projected_traces(ocel_filename, object_type, build_if_non_existent=True)
+                        for object_type in object_types}
+    _, encoded_traces = encode_projected_traces(projected_traces, vocabulary)
+    object_type_dfgs = [deserialize_object_type_dfg(serialized_dfg) for serialized_dfg in serialized_dfgs]
+    return assemble_dfm(encoded_traces, vocabulary, object_type_dfgs)
+
+
+def build_object_type_dfg(traces: List[Trace], vocabulary_size: int) -> ObjectTypeDFG:
+    """
+    Computes the threshold annotated DFG of a single object type.
+    :param traces: Integer encoded traces of the object type
+    :param vocabulary_size: Number of codes in the activity vocabulary
+    :return: Count separators of each edge and node, number of objects and threshold of each trace
+    """
+    edge_totals, node_totals, edge_traces, total_objects = prepare_encoded_dfg_computation(traces, vocabulary_size)
+    return ObjectTypeDFG(*calculate_threshold_counts_on_dfg_indexed(
+        edge_totals, node_totals, edge_traces, total_objects))
+
+
+def assemble_dfm(encoded_traces: Dict[ObjectType, List[Trace]], vocabulary: List[Node],
+                 object_type_dfgs: List[ObjectTypeDFG]):
+    """
+    Merges the DFGs of all object types into the DFM in frontend friendly format.
+    :param encoded_traces: Integer encoded traces of each object type
+    :param vocabulary: Activity vocabulary used to encode the traces
+    :param object_type_dfgs: DFGs of the object types in the same order as the keys of `encoded_traces`
+    :return: Constructed DFM in frontend friendly format
+    """
     edge_counts: Dict[ObjectType, Dict[Edge, List[CountSeperator]]] = {}
-    node_counts: Dict[ObjectType, Dict[Node, List[CountSeperator]]] = {}
+    node_counts: Dict[ObjectType, Dict[NodeCode, List[CountSeperator]]] = {}
     trace_thresholds: Dict[ObjectType,
-                           Dict[Tuple[Node], Tuple[int, float]]] = {}
+                           Dict[Tuple[NodeCode], Tuple[int, float]]] = {}
 
-    for object_type in projected_traces:
-        edge_totals, node_totals, edge_traces, total_objects = prepare_dfg_computation(
-            projected_traces[object_type])
+    for (object_type, type_dfg) in zip(encoded_traces, object_type_dfgs):
+        edge_counts[object_type] = type_dfg.edge_counts
+        node_counts[object_type] = type_dfg.node_counts
+        trace_thresholds[object_type] = type_dfg.trace_thresholds
 
-        type_edge_counts, type_node_counts, type_trace_thresholds = \
-            calculate_threshold_counts_on_dfg(
-                edge_totals, node_totals, edge_traces, total_objects)
+    ocel_node_counts = calculate_ocel_node_counts(
+        encoded_traces, trace_thresholds, start_node=START_CODE, stop_node=STOP_CODE)
 
-        edge_counts[object_type] = type_edge_counts
-        node_counts[object_type] = type_node_counts
-        trace_thresholds[object_type] = type_trace_thresholds
+    return convert_to_frontend_friendly_graph_notation(edge_counts, node_counts, ocel_node_counts, trace_thresholds,
+                                                       vocabulary=vocabulary)
 
-    ocel_node_counts = calculate_ocel_node_counts(
-        projected_traces, trace_thresholds)
 
-    return convert_to_frontend_friendly_graph_notation(edge_counts, node_counts, ocel_node_counts, trace_thresholds)
+def serialize_object_type_dfg(type_dfg: ObjectTypeDFG) -> Dict[str, Any]:
+    """
+    Converts the DFG of an object type into a JSON compatible format (JSON does not support tuples as keys).
+    :param type_dfg: DFG of an object type
+    :return: JSON compatible representation of the DFG
+    """
+    return {
+        'edge_counts': [[edge.source, edge.target, counts] for (edge, counts) in type_dfg.edge_counts.items()],
+        'node_counts': [[node, counts] for (node, counts) in type_dfg.node_counts.items()],
+        'trace_thresholds': [[list(trace), count, threshold]
+                             for (trace, (count, threshold)) in type_dfg.trace_thresholds.items()]
+    }
+
+
+def deserialize_object_type_dfg(serialized_dfg: Dict[str, Any]) -> ObjectTypeDFG:
+    """
+    Inverse of `serialize_object_type_dfg`.
+    :param serialized_dfg: JSON compatible representation of the DFG
+    :return: DFG of an object type
+    """
+    def count_separators(counts: List[List[Any]]) -> List[CountSeperator]:
+        return [CountSeperator(*count) for count in counts]
+
+    return ObjectTypeDFG(
+        edge_counts={Edge(source, target): count_separators(counts)
+                     for (source, target, counts) in serialized_dfg['edge_counts']},
+        node_counts={node: count_separators(counts) for (node, counts) in serialized_dfg['node_counts']},
+        trace_thresholds={tuple(trace): (count, threshold)
+                          for (trace, count, threshold) in serialized_dfg['trace_thresholds']}
+    )
+
+
+def encode_projected_traces(projected_traces: Dict[ObjectType, List[Tuple[List[str], int, List[List[int]]]]],
+                            vocabulary: List[Node] | None = None) -> (
+        List[Node],
+        Dict[ObjectType, List[Trace]]):
+    """
+    Interns the activities of all projected traces of an OCEL into a shared vocabulary of small integers.
+    :param projected_traces: Projected traces (activities, number of objects, event ids) of each object type
+    :param vocabulary: Existing vocabulary to extend, e.g. to encode traces consistently across multiple tasks
+    :return: Vocabulary mapping each code to its activity, projected traces with activities stored as int32 arrays
+    """
+    if vocabulary is None:
+        vocabulary = [START_TOKEN, STOP_TOKEN]
+    codes: Dict[Node, NodeCode] = {activity: code for (code, activity) in enumerate(vocabulary)}
+    encoded_traces: Dict[ObjectType, List[Trace]] = {}
+
+    for (object_type, traces) in projected_traces.items():
+        encoded_traces[object_type] = [
+            Trace(np.fromiter((codes.setdefault(activity, len(codes)) for activity in activities),
+                              dtype=np.int32, count=len(activities)),
+                  trace_count,
+                  event_ids)
+            for (activities, trace_count, event_ids) in traces
+        ]
+
+    return list(codes.keys()), encoded_traces
+
+
+def prepare_encoded_dfg_computation(traces: List[Trace], vocabulary_size: int) -> (
+        Dict[Edge, int],
+        Dict[NodeCode, int], Dict[Edge, List[Trace]],
+        int):
+    """
+    Integer encoded counterpart of `prepare_dfg_computation`. Instead of counting edges and nodes trace by trace, all
+    traces are concatenated and the counts are computed in a vectorized way over the pair codes of all steps. The
+    result contains the same data in the same order as `prepare_dfg_computation`, but with codes instead of labels.
+    :param traces: Integer encoded traces for which to compute the additional data
+    :param vocabulary_size: Number of codes in the activity vocabulary
+    :return: Number of objects passing through each edge, number of objects passing through each node,
+             traces containing each edge, number of total objects
+    """
+    # Wrap the traces by a start and a stop token so traces of length 1 are handled correctly.
+    wrapped_traces = [
+        Trace(np.concatenate(([START_CODE], actions, [STOP_CODE])).astype(np.int32),
+              trace_count,
+              [[]] + event_ids + [[]])
+        for (actions, trace_count, event_ids) in traces
+    ]
+    total_objects = sum(trace.trace_count for trace in wrapped_traces)
+    if len(wrapped_traces) == 0:
+        return {}, {}, {}, total_objects
+
+    trace_counts = np.array([trace.trace_count for trace in wrapped_traces], dtype=np.int64)
+    trace_lengths = np.array([len(trace.actions) for trace in wrapped_traces], dtype=np.int64)
+    actions = np.concatenate([trace.actions for trace in wrapped_traces]).astype(np.int64)
+    action_traces = np.repeat(np.arange(len(wrapped_traces)), trace_lengths)
+
+    # Node counts, ordered by the first occurrence of the node like in `prepare_dfg_computation`.
+    unique_nodes, first_node_occurrences, node_inverse = np.unique(actions, return_index=True, return_inverse=True)
+    node_totals = np.zeros(len(unique_nodes), dtype=np.int64)
+    np.add.at(node_totals, node_inverse, trace_counts[action_traces])
+    node_counts: Dict[NodeCode, int] = {
+        int(unique_nodes[i]): int(node_totals[i]) for i in np.argsort(first_node_occurrences, kind='stable')
+    }
+
+    # Each step within a trace is identified by the pair code `source * vocabulary_size + target`. Pairs across the
+    # boundary of two concatenated traces are no steps.
+    is_step = action_traces[:-1] == action_traces[1:]
+    step_traces = action_traces[:-1][is_step]
+    pair_codes = actions[:-1][is_step] * vocabulary_size + actions[1:][is_step]
+
+    unique_pairs, first_pair_occurrences, pair_inverse = np.unique(pair_codes, return_index=True,
+                                                                   return_inverse=True)
+    pair_totals = np.zeros(len(unique_pairs), dtype=np.int64)
+    np.add.at(pair_totals, pair_inverse, trace_counts[step_traces])
+
+    # Each trace must only be added once to the traces of an edge, even if the edge repeats itself within the trace.
+    # Sorting the distinct (trace, edge) combinations stably by edge keeps the traces of each edge in their original order.
+    trace_edge_combinations = np.unique(step_traces * len(unique_pairs) + pair_inverse)
+    combination_traces = trace_edge_combinations // len(unique_pairs)
+    combination_edges = trace_edge_combinations % len(unique_pairs)
+    by_edge = np.argsort(combination_edges, kind='stable')
+    traces_by_edge = np.split(combination_traces[by_edge],
+                              np.cumsum(np.bincount(combination_edges, minlength=len(unique_pairs)))[:-1])
+
+    edge_counts: Dict[Edge, int] = {}
+    edge_traces: Dict[Edge, List[Trace]] = {}
+    for i in np.argsort(first_pair_occurrences, kind='stable'):
+        edge = Edge(int(unique_pairs[i] // vocabulary_size), int(unique_pairs[i] % vocabulary_size))
+        edge_counts[edge] = int(pair_totals[i])
+        edge_traces[edge] = [wrapped_traces[trace_index] for trace_index in traces_by_edge[i]]
+
+    return edge_counts, node_counts, edge_traces, total_objects
 
 
 def prepare_dfg_computation(traces: List[Trace]) -> (
@@ -116,6 +321,8 @@ def calculate_threshold_counts_on_dfg(edge_totals: Dict[Edge, int], node_totals:
     """
     Calculates threshold lower bound for edges and nodes above which those would still be included in a filtered DFG
     to be able to quickly switch between different thresholds without to perform the filtering operation on-demand.
+    This is the reference implementation of the sweep, `calculate_threshold_counts_on_dfg_indexed` computes the same
+    result without quadratic list operations and is the one used by the `dfm` task.
     :param edge_totals: Number of objects passing through each edge
     :param node_totals: Number of objects passing through each node
     :param edge_traces: Traces containing each edge
@@ -178,18 +385,138 @@ def calculate_threshold_counts_on_dfg(edge_totals: Dict[Edge, int], node_totals:
     return edge_counts, node_counts, trace_thresholds
 
 
+def calculate_threshold_counts_on_dfg_indexed(edge_totals: Dict[Edge, int], node_totals: Dict[Node, int],
+                                              edge_traces: Dict[Edge, List[Trace]], total_objects: int) -> (
+        Dict[Edge, List[CountSeperator]],
+        Dict[Node, List[CountSeperator]],
+        Dict[Tuple[Node], Tuple[int, float]]):
+    """
+    Computes exactly the same result as `calculate_threshold_counts_on_dfg`, but runs in linear time with respect to
+    the size of the traces. Instead of removing traces from `edge_traces` (which is a linear operation on lists), the
+    traces that have already been removed are tracked by their index. The count separators are appended and reversed
+    once at the end instead of being inserted at the front of the lists.
+    :param edge_totals: Number of objects passing through each edge
+    :param node_totals: Number of objects passing through each node
+    :param edge_traces: Traces containing each edge
+    :param total_objects: Total number of objects
+    :return: Lower threshold bound and number of objects going through edge or node after at that threshold
+    """
+    edges = sorted(list(edge_totals.keys()),
+                   key=lambda edge: edge_totals[edge])
+
+    current_objects = total_objects
+    # While sweeping, the count separators are stored from highest to lowest threshold.
+    edge_counts: Dict[Edge, List[CountSeperator]] = {
+        edge: [CountSeperator(1.01, edge_totals[edge])] for edge in edges}
+    node_counts: Dict[Node, List[CountSeperator]] = {node: [CountSeperator(1.01, node_totals[node])] for node in
+                                                     node_totals}
+    trace_thresholds: Dict[Tuple[Node], Tuple[int, float]] = {}
+
+    # Each trace is referenced by multiple edges, hence the identity of the trace object is used as its index.
+    removed_trace_ids: Set[int] = set()
+
+    for edge in edges:
+        updated_edge_counts: Dict[Edge, int] = {}
+        updated_node_counts: Dict[Node, int] = {}
+        removed_traces: List[Trace] = []
+
+        for trace in edge_traces[edge]:
+            if id(trace) in removed_trace_ids:
+                continue
+            removed_trace_ids.add(id(trace))
+
+            count: int = trace.trace_count
+            step_multiplicities, node_multiplicities = count_trace_steps(trace)
+
+            for (other_edge, multiplicity) in step_multiplicities.items():
+                updated_edge_counts.setdefault(
+                    other_edge, edge_counts[other_edge][-1].instance_count)
+                updated_edge_counts[other_edge] -= multiplicity * count
+
+            for (node, multiplicity) in node_multiplicities.items():
+                updated_node_counts.setdefault(
+                    node, node_counts[node][-1].instance_count)
+                updated_node_counts[node] -= multiplicity * count
+
+            current_objects -= count
+            removed_traces.append(trace)
+
+        threshold = current_objects / total_objects
+        for other_edge in updated_edge_counts:
+            edge_counts[other_edge].append(CountSeperator(
+                threshold, updated_edge_counts[other_edge]))
+        for node in updated_node_counts:
+            node_counts[node].append(CountSeperator(
+                threshold, updated_node_counts[node]))
+        for trace in removed_traces:
+            trace_thresholds[tuple(action_list(trace.actions))] = (
+                trace.trace_count, threshold)
+
+    for counts in edge_counts.values():
+        counts.reverse()
+    for counts in node_counts.values():
+        counts.reverse()
+
+    return edge_counts, node_counts, trace_thresholds
+
+
+def count_trace_steps(trace: Trace) -> (Dict[Edge, int], Dict[Node, int]):
+    """
+    Counts how often each edge and each node occurs within a single trace.
+    :param trace: Trace whose edges and nodes should be counted
+    :return: Number of occurrences of each edge, number of occurrences of each node
+    """
+    actions = action_list(trace.actions)
+
+    step_multiplicities: Dict[Edge, int] = {}
+    for step in steps(actions):
+        edge = Edge(*step)
+        step_multiplicities[edge] = step_multiplicities.get(edge, 0) + 1
+
+    node_multiplicities: Dict[Node, int] = {}
+    for node in actions:
+        node_multiplicities[node] = node_multiplicities.get(node, 0) + 1
+
+    return step_multiplicities, node_multiplicities
+
+
+def action_list(actions: List[Node] | np.ndarray) -> List[Node] | List[NodeCode]:
+    """
+    Helper function to iterate over the actions of both label based and integer encoded traces using plain Python
+    values. Iterating over a NumPy array element-wise is much slower than over a list.
+    :param actions: Actions of a trace
+    :return: Actions as a list
+    """
+    if isinstance(actions, np.ndarray):
+        return actions.tolist()
+    return actions
+
+
 def calculate_ocel_node_counts(projected_traces: Dict[ObjectType, List[Tuple[List[str], int, List[List[int]]]]],
-                               trace_thresholds: Dict[ObjectType, Dict[Tuple[Node], Tuple[int, float]]]) -> \
+                               trace_thresholds: Dict[ObjectType, Dict[Tuple[Node], Tuple[int, float]]],
+                               start_node: Node | NodeCode = START_TOKEN, stop_node: Node | NodeCode = STOP_TOKEN) -> \
         Dict[Node, List[CountSeperator]]:
+    """
+    Calculates the number of distinct OCEL events of each node for all thresholds.
+    :param projected_traces: Projected traces (activities, number of objects, event ids) of each object type
+    :param trace_thresholds: Number of objects and threshold of each trace (wrapped by start and stop node)
+    :param start_node: Node (or code when working on integer encoded traces) wrapping the traces at the start
+    :param stop_node: Node (or code when working on integer encoded traces) wrapping the traces at the end
+    :return: Count separators of each node
+    """
     def get_threshold(object_type: str, trace: Tuple[List[str], int, List[List[int]]]):
-        return trace_thresholds[object_type][tuple([START_TOKEN] + list(trace[0]) + [STOP_TOKEN])][1]
+        return trace_thresholds[object_type][tuple([start_node] + action_list(trace[0]) + [stop_node])][1]
 
     all_traces = [(ot, trace, get_threshold(ot, trace)) for (
         ot, ot_traces) in projected_traces.items() for trace in ot_traces]
     all_traces.sort(key=lambda x: x[2])
 
     result_with_lower_bounds: Dict[Node, List[LowerBoundCountSeparator]] = {}
-    node_event_ids: Dict[Node, Set[int]] = {}
+    node_event_counts: Dict[Node, int] = {}
+
+    # Every OCEL event has exactly one activity, hence the sets of event ids of the nodes are disjoint. Instead of keeping
+    # a set of all event ids per node, a single bitmap indexed by event id records which events have been counted.
+    seen_event_ids = EventIdBitmap(projected_traces)
 
     # The basic idea is to iterate over all traces from "most frequent" (lowest threshold) to "least frequent" (highest threshold).
     # For each trace, we keep track of all OCEL event ids seen so far and update the node counts accordingly.
@@ -200,10 +527,9 @@ def calculate_ocel_node_counts(projected_traces: Dict[ObjectType, List[Tuple[Lis
     for (object_type, trace, threshold) in all_traces:
         activities, _, trace_event_ids = trace
 
-        for (activity, event_ids) in zip(activities, trace_event_ids):
-            # Add new event ids without duplicating (thanks to set, this is done performantly).
-            node_event_ids.setdefault(activity, set()).update(event_ids)
-            count = len(node_event_ids[activity])
+        for (activity, event_ids) in zip(action_list(activities), trace_event_ids):
+            node_event_counts[activity] = node_event_counts.get(activity, 0) + seen_event_ids.add(event_ids)
+            count = node_event_counts[activity]
             if activity in result_with_lower_bounds:
                 old_count = result_with_lower_bounds[activity][-1]
 
@@ -234,106 +560,158 @@ def calculate_ocel_node_counts(projected_traces: Dict[ObjectType, List[Tuple[Lis
 
     result = {node: convert_lower_bounds_to_upper_bounds(counts) for (
         node, counts) in result_with_lower_bounds.items()}
-    result[START_TOKEN] = [CountSeperator(1.01, 0)]
-    result[STOP_TOKEN] = [CountSeperator(1.01, 0)]
+    result[start_node] = [CountSeperator(1.01, 0)]
+    result[stop_node] = [CountSeperator(1.01, 0)]
     return result
 
 
+class EventIdBitmap:
+    """
+    Compact set of OCEL event ids which stores a single bit per event id between the smallest and the largest event id
+    of the projected traces. Event ids are integers which are densely assigned when importing an OCEL.
+    """
+    # Below this number of event ids, the per call overhead of NumPy is higher than checking the bits one by one.
+    VECTORIZATION_THRESHOLD = 64
+
+    __offset: int
+    __bits: bytearray
+    __bits_view: np.ndarray
+
+    def __init__(self, projected_traces: Dict[ObjectType, List[Tuple[List[str], int, List[List[int]]]]]):
+        all_event_ids = [event_ids for traces in projected_traces.values()
+                         for (_, _, trace_event_ids) in traces for event_ids in trace_event_ids if len(event_ids) > 0]
+        if len(all_event_ids) == 0:
+            self.__offset = 0
+            largest_event_id = 0
+        else:
+            self.__offset = min(min(event_ids) for event_ids in all_event_ids)
+            largest_event_id = max(max(event_ids) for event_ids in all_event_ids)
+
+        self.__bits = bytearray((largest_event_id - self.__offset) // 8 + 1)
+        # The NumPy view shares the memory of the bytearray.
+        self.__bits_view = np.frombuffer(self.__bits, dtype=np.uint8)
+
+    def add(self, event_ids: List[int]) -> int:
+        """
+        Adds the event ids to the set.
+        :param event_ids: Event ids to add, may contain duplicates
+        :return: Number of distinct event ids which have not been in the set before
+        """
+        if len(event_ids) < EventIdBitmap.VECTORIZATION_THRESHOLD:
+            bits = self.__bits
+            new_event_ids = 0
+            for event_id in event_ids:
+                position = event_id - self.__offset
+                mask = 1 << (position & 7)
+                if not bits[position >> 3] & mask:
+                    bits[position >> 3] |= mask
+                    new_event_ids += 1
+            return new_event_ids
+
+        positions = np.asarray(event_ids, dtype=np.int64) - self.__offset
+        is_new = (self.__bits_view[positions >> 3] & BIT_MASKS[positions & 7]) == 0
+        if not is_new.any():
+            return 0
+
+        # The same event id can occur multiple times, e.g. if an event is related to multiple objects of a variant.
+        new_positions = np.unique(positions[is_new])
+        np.bitwise_or.at(self.__bits_view, new_positions >> 3, BIT_MASKS[new_positions & 7])
+        return len(new_positions)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.__bits)
+
+
+BIT_MASKS = np.array([1 << i for i in range(8)], dtype=np.uint8)
+
+
 def convert_to_frontend_friendly_graph_notation(edge_counts: Dict[ObjectType, Dict[Edge, List[CountSeperator]]],
                                                 node_counts: Dict[ObjectType, Dict[Node, List[CountSeperator]]],
                                                 ocel_node_counts: Dict[Node, List[CountSeperator]],
                                                 trace_thresholds: Dict[
-                                                    ObjectType, Dict[Tuple[Node], Tuple[int, float]]]):
-    # Step 1: Build node indices.
-    node_indices: Dict[str, int] = {
-        START_TOKEN: 0,
-        STOP_TOKEN: 1
+                                                    ObjectType, Dict[Tuple[Node], Tuple[int, float]]],
+                                                vocabulary: List[Node] | None = None):
+    """
+    Converts the computed counts and thresholds into the notation used by the frontend.
+    :param edge_counts: Count separators of each edge of each object type
+    :param node_counts: Count separators of each node of each object type
+    :param ocel_node_counts: Count separators of the distinct OCEL events of each node
+    :param trace_thresholds: Number of objects and threshold of each trace of each object type
+    :param vocabulary: If the inputs are integer encoded, the vocabulary used to decode the node labels
+    :return: DFM in frontend friendly format
+    """
+    def label(node: Node | NodeCode) -> Node:
+        return vocabulary[node] if vocabulary is not None else node
+
+    # Step 1: Build node indices and collect the counts of each node by object type.
+    node_indices: Dict[Node | NodeCode, int] = {
+        START_CODE if vocabulary is not None else START_TOKEN: 0,
+        STOP_CODE if vocabulary is not None else STOP_TOKEN: 1
     }
-    nodes = set(sum([list(node_counts[object_type].keys())
-                for object_type in node_counts], start=[]))
-    for node in nodes:
-        node_indices.setdefault(node, len(node_indices))
+    counts_by_node: Dict[Node | NodeCode, Dict[ObjectType, List[CountSeperator]]] = {}
+    for (object_type, type_node_counts) in node_counts.items():
+        for (node, counts) in type_node_counts.items():
+            node_indices.setdefault(node, len(node_indices))
+            counts_by_node.setdefault(node, {})[object_type] = counts
+
+    # Step 2: Index the object types of each trace. Traces are ordered by their first occurrence.
+    trace_object_types: Dict[Tuple[Node | NodeCode], List[ObjectType]] = {}
+    for (object_type, traces) in trace_thresholds.items():
+        for trace in traces:
+            trace_object_types.setdefault(trace, []).append(object_type)
 
-    # Step 2: Build frontend traces, store trace indices for edges and nodes. We also use the loop over all occurring
+    # Step 3: Build frontend traces, store trace indices for edges and nodes. We also use the loop over all occurring
     # thresholds to build the threshold boxes.
-    seen_traces = set()
     frontend_traces = []
     node_traces: Dict[Node, List[int]] = {}
     edge_traces: Dict[Tuple[ObjectType, Node, Node], List[int]] = {}
 
     all_occurring_thresholds = set()
 
-    for traces in trace_thresholds.values():
-        for trace in traces:
-            if trace in seen_traces:
-                continue
-            seen_traces.add(trace)
+    for (trace_index, (trace, object_types)) in enumerate(trace_object_types.items()):
+        thresholds = {}
+        for object_type in object_types:
+            count, threshold = trace_thresholds[object_type][trace]
+            thresholds[object_type] = {
+                "count": count,
+                "threshold": threshold
+            }
+            all_occurring_thresholds.add(threshold)
 
-            trace_index = len(frontend_traces)
+        frontend_traces.append({
+            "actions": [node_indices[node] for node in trace],
+            "thresholds": thresholds
+        })
 
-            trace_object_types = {
-                object_type for object_type in trace_thresholds if trace in trace_thresholds[object_type]
-            }
+        for node in set(trace):
+            node_traces.setdefault(node, []).append(trace_index)
 
-            frontend_traces.append({
-                "actions": [node_indices[node] for node in trace],
-                "thresholds": {
-                    object_type: {
-                        "count": trace_thresholds[object_type][trace][0],
-                        "threshold": trace_thresholds[object_type][trace][1]
-                    }
-                    for object_type in trace_object_types
-                }
-            })
-
-            thresholds_set = {
-                trace_thresholds[object_type][trace][1] for object_type in trace_object_types}
-            all_occurring_thresholds.update(thresholds_set)
-
-            seen_nodes = set()
-            for node in trace:
-                if node not in seen_nodes:
-                    node_traces.setdefault(node, []).append(trace_index)
-                    seen_nodes.add(node)
-
-            seen_edges = set()
-            for (source, target) in steps(trace):
-                for object_type in trace_object_types:
-                    edge = (object_type, source, target)
-                    if edge not in seen_edges:
-                        edge_traces.setdefault(edge, []).append(trace_index)
-                        seen_edges.add(edge)
-
-    # Step 3: Build frontend nodes.
-    frontend_nodes = [{} for _ in range(len(node_indices))]
-    for node in nodes:
-        counts: Dict[ObjectType, List[CountSeperator]] = {
-            object_type: node_counts[object_type][node]
-            for object_type in node_counts
-            if node in node_counts[object_type]
-        }
+        for (source, target) in set(steps(trace)):
+            for object_type in object_types:
+                edge_traces.setdefault((object_type, source, target), []).append(trace_index)
 
+    # Step 4: Build frontend nodes and frontend edges, the latter seperated by object type.
+    frontend_nodes = [{} for _ in range(len(node_indices))]
+    for (node, counts) in counts_by_node.items():
         frontend_nodes[node_indices[node]] = {
-            'label': node,
+            'label': label(node),
             'counts': counts,
             'ocel_counts': ocel_node_counts[node],
             'traces': node_traces[node]
         }
 
-    # Step 4: Build frontend edges, seperated by object type.
-    frontend_subgraphs: Dict[str, List[Dict[str, float]]] = \
-        {
-            object_type:
-                [
-                    {
-                        'source': node_indices[edge.source],
-                        'target': node_indices[edge.target],
-                        'counts': edge_counts[object_type][edge],
-                        'traces': edge_traces[object_type, edge.source, edge.target]
-                    }
-                    for edge in edge_counts[object_type]
-                ]
-            for object_type in edge_counts
+    frontend_subgraphs: Dict[str, List[Dict[str, float]]] = {
+        object_type: [
+            {
+                'source': node_indices[edge.source],
+                'target': node_indices[edge.target],
+                'counts': counts,
+                'traces': edge_traces[object_type, edge.source, edge.target]
+            }
+            for (edge, counts) in type_edge_counts.items()
+        ]
+        for (object_type, type_edge_counts) in edge_counts.items()
     }
 
     threshold_boxes = sorted(list(all_occurring_thresholds))
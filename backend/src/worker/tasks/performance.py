@@ -1,53 +1,112 @@
 import math
+import os
 from collections import namedtuple
 from datetime import datetime
+from enum import Enum
+from itertools import chain
 from math import isnan
 from typing import Dict, Any, List, Tuple
 
+import numpy as np
+import pandas as pd
 import pm4py
-from pandas import DataFrame, Timedelta, Timestamp
-from pandas.core.groupby import DataFrameGroupBy
+from celery import chord
+from pandas import DataFrame, Series, Timedelta, Timestamp
 from pm4py.objects.log.obj import EventLog, Trace
 from pydantic import BaseModel
 
+from cache import resolve_reference, reference, is_reference, chunked_aligned_times, get_long_term_cache, \
+    get_memoized_long_term_cache, LongTermCache
 from worker.main import app
 from worker.tasks.alignments import TraceAlignment, SKIP_MOVE
 from worker.tasks.dfm import START_TOKEN, STOP_TOKEN, Node, ObjectType
-from worker.utils import get_projected_event_log, get_ocel
+from worker.ocel_snapshot import as_object_list
+from worker.quantile_sketch import KLLSketch
+from worker.utils import get_projected_event_dataframe, get_ocel_log, group_cases_by_variant, get_ocel_snapshot
 
 OCELEventId = int
+TimeArrays = Tuple[List[np.ndarray], np.ndarray]
 ProjectedEventTime = namedtuple("ProjectedEventTimes", ['aligned_time', 'model_move_counter'])
 AlignedEdgeTimes = namedtuple("AlignedEdgeTimes", ['previous_activity', 'activation_time', 'execution_time'])
 
 
 # region Aligning timestamps for OCEL metrics
 @app.task()
-def align_projected_log_times_task(base_ocel: str, object_type: str, alignments: List[Dict[str, Any]]):
-    projected_event_log: EventLog = get_projected_event_log(base_ocel, object_type)
-    projected_event_log: DataFrame = pm4py.convert_to_dataframe(projected_event_log)
-    projected_event_log: DataFrameGroupBy = projected_event_log.groupby('case:concept:name')
-
-    alignments_dict = preprocess_alignments(alignments)
-    aligned_times: Dict[OCELEventId, Dict[str, ProjectedEventTime]] = {}
-
-    for object_id, case in projected_event_log:
-        case: DataFrame = case
-        aligned_case_times = align_case(case, alignments_dict)
-
-        for (ocel_event_id, time) in aligned_case_times.items():
-            aligned_times.setdefault(int(ocel_event_id), {})[object_id] = time
-
+def align_projected_log_times_task(base_ocel: str, object_type: str, alignments: List[Dict[str, Any]] | Dict[str, Any]):
+    # The alignments are usually passed as reference to the long term cache, see `cache.reference`.
+    alignments = resolve_reference(alignments)
+    projected_event_log: DataFrame = get_projected_event_dataframe(base_ocel, object_type)
+    return align_projected_log_times(projected_event_log, preprocess_alignments(alignments))
+
+
+def align_projected_log_times(projected_event_log: DataFrame, alignments: Dict[Any, TraceAlignment]) \
+        -> Dict[OCELEventId, Dict[str, AlignedEdgeTimes]]:
+    """
+    Aligns the times of all cases of a projected event log, with the same result as calling `align_case` for each case.
+    The synchronous moves of the alignment of each variant are mapped to positions within the case once (see
+    `plan_case_alignment`) and then applied to all cases of the variant at once.
+    :param projected_event_log: Projected event log, see `get_projected_event_dataframe`
+    :param alignments: Alignments by trace, see `preprocess_alignments`
+    :return: Aligned times by OCEL event id and object id
+    """
+    if len(projected_event_log) == 0:
+        return {}
+
+    order, case_starts, variants = group_cases_by_variant(projected_event_log)
+    case_ids = projected_event_log['case:concept:name'].to_numpy(dtype=object)[order][case_starts]
+    event_ids = projected_event_log['event_id'].to_numpy()[order]
+    start_timestamps = projected_event_log['event_start_timestamp'].iloc[order].to_numpy(dtype=object)
+    finish_timestamps = projected_event_log['time:timestamp'].iloc[order].to_numpy(dtype=object)
+
+    # One entry per synchronous move of each case, sorted by case and move like `align_case` visits them.
+    entry_cases, entry_moves, entry_positions, entry_previous_positions, entry_steps = [], [], [], [], []
+    steps = []
+    for (trace, variant_cases) in variants:
+        for (move, (position, previous_position, counter, previous_counter)) in \
+                enumerate(plan_case_alignment(alignments[trace])):
+            entry_cases.append(variant_cases)
+            entry_moves.append(np.full(len(variant_cases), move))
+            entry_positions.append(case_starts[variant_cases] + position)
+            # Moves without previous synchronous move have no activation time, the position is just a placeholder.
+            entry_previous_positions.append(case_starts[variant_cases] + (previous_position or 0))
+            entry_steps.append(np.full(len(variant_cases), len(steps)))
+            steps.append((trace[previous_position] if previous_position is not None else None, counter,
+                          previous_counter if previous_position is not None else None))
+
+    if not steps:
+        return {}
+    entry_cases, entry_moves = np.concatenate(entry_cases), np.concatenate(entry_moves)
+    entry_order = np.lexsort((entry_moves, entry_cases))
+    entry_cases = entry_cases[entry_order]
+    entry_positions = np.concatenate(entry_positions)[entry_order]
+    entry_previous_positions = np.concatenate(entry_previous_positions)[entry_order]
+    entry_steps = np.concatenate(entry_steps)[entry_order]
+
+    aligned_times: Dict[OCELEventId, Dict[str, AlignedEdgeTimes]] = {}
+    for (object_id, event_id, start_timestamp, finish_timestamp, step) in zip(
+            case_ids[entry_cases], event_ids[entry_positions].tolist(), start_timestamps[entry_positions],
+            finish_timestamps[entry_previous_positions], entry_steps.tolist()):
+        (previous_activity, counter, previous_counter) = steps[step]
+        aligned_times.setdefault(int(event_id), {})[object_id] = AlignedEdgeTimes(
+            previous_activity=previous_activity,
+            activation_time=ProjectedEventTime(finish_timestamp, previous_counter)
+            if previous_activity is not None else None,
+            execution_time=ProjectedEventTime(start_timestamp, counter))
     return aligned_times
 
 
-def align_case(case: DataFrame, alignments: Dict[Any, TraceAlignment]) -> Dict[OCELEventId, AlignedEdgeTimes]:
+def plan_case_alignment(alignment: TraceAlignment) -> List[Tuple[int, int | None, int, int]]:
+    """
+    Maps the synchronous moves of an alignment to the events of the aligned cases.
+    :param alignment: Alignment of the trace of the cases
+    :return: For each synchronous move, the position of its event in the case, the position of the event of the previous
+    synchronous move (or `None`), and the number of model moves before both moves
+    """
     model_move_counter = 0
-    result = {}
-
-    alignment = alignments[tuple(case['concept:name'])]
-    last_activity = None
-    finish_time_of_previous_activity = None
+    plan = []
 
+    previous_position = None
+    previous_model_move_counter = 0
     case_position = 0
     for (log_move, model_move) in zip(alignment.log_alignment, alignment.model_alignment):
         log_move: str = log_move.activity
@@ -66,18 +125,31 @@ def align_case(case: DataFrame, alignments: Dict[Any, TraceAlignment]) -> Dict[O
             continue
 
         assert log_move == model_move
-        event = case.iloc[case_position]
-        ocel_event_id = event['event_id']
-        start_timestamp = event['event_start_timestamp']
-        finish_timestamp = event['time:timestamp']
-
-        result[ocel_event_id] = AlignedEdgeTimes(previous_activity=last_activity,
-                                                 activation_time=finish_time_of_previous_activity,
-                                                 execution_time=ProjectedEventTime(start_timestamp, model_move_counter))
+        plan.append((case_position, previous_position, model_move_counter, previous_model_move_counter))
 
+        previous_position = case_position
+        previous_model_move_counter = model_move_counter
         case_position += 1
-        last_activity = event['concept:name']
-        finish_time_of_previous_activity = ProjectedEventTime(finish_timestamp, model_move_counter)
+    return plan
+
+
+def align_case(case: DataFrame, alignments: Dict[Any, TraceAlignment]) -> Dict[OCELEventId, AlignedEdgeTimes]:
+    result = {}
+
+    alignment = alignments[tuple(case['concept:name'])]
+    for (position, previous_position, counter, previous_counter) in plan_case_alignment(alignment):
+        event = case.iloc[position]
+        activation_time = None
+        last_activity = None
+        if previous_position is not None:
+            previous_event = case.iloc[previous_position]
+            activation_time = ProjectedEventTime(previous_event['time:timestamp'], previous_counter)
+            last_activity = previous_event['concept:name']
+
+        result[event['event_id']] = AlignedEdgeTimes(previous_activity=last_activity,
+                                                     activation_time=activation_time,
+                                                     execution_time=ProjectedEventTime(event['event_start_timestamp'],
+                                                                                       counter))
     return result
 
 
@@ -96,6 +168,21 @@ class CollectedTimes(BaseModel):
     edge_pooling_times: Dict[Node, Dict[Node, Dict[ObjectType, List[int]]]]
     edge_waiting_times: Dict[Node, Dict[Node, Dict[ObjectType, List[int]]]]
 
+    def merge(self, other: 'CollectedTimes'):
+        """
+        Adds the times of another part of the OCEL to these times.
+        :param other: Collected times to merge, which are not modified
+        """
+        def merge_lists(target: Dict[Any, Any], source: Dict[Any, Any]):
+            for (key, value) in source.items():
+                if isinstance(value, list):
+                    target.setdefault(key, []).extend(value)
+                else:
+                    merge_lists(target.setdefault(key, {}), value)
+
+        for field in self.__fields__:
+            merge_lists(getattr(self, field), getattr(other, field))
+
 
 class AggregatedMetric(BaseModel):
     min: int
@@ -104,6 +191,120 @@ class AggregatedMetric(BaseModel):
     mean: int
     stdev: float
     sum: int
+    p90: int | None = None
+    p95: int | None = None
+    p99: int | None = None
+
+
+class TimeAggregationMode(str, Enum):
+    # Times are collected in lists, which are sorted to compute exact aggregates, see `collect_times_vectorized`.
+    EXACT = "exact"
+    # Times are aggregated while collecting them using constant memory per metric, see `accumulate_times`.
+    STREAMING = "streaming"
+
+
+TIME_AGGREGATION_MODE = TimeAggregationMode(os.environ.get('EXPLORI_TIME_AGGREGATION_MODE', default='exact'))
+
+# The times of the events of an OCEL are independent of each other. If an OCEL has more events than this, the events
+# are split into chunks of this size, whose times are collected by separate Celery tasks and then merged by a chord.
+PERFORMANCE_METRICS_CHUNK_EVENTS = int(os.environ.get('EXPLORI_PERFORMANCE_METRICS_CHUNK_EVENTS', default='50000'))
+
+
+class TimeAccumulator(BaseModel):
+    """
+    Mergeable aggregate of times. Mean and variance are maintained using Welford's algorithm (combining batches as
+    described by Chan et al.), while the quantiles are estimated by a `KLLSketch`.
+    """
+    count: int = 0
+    sum: int = 0
+    min: int | None = None
+    max: int | None = None
+    mean: float = 0
+    m2: float = 0
+    sketch: KLLSketch = KLLSketch()
+
+    def update(self, times: List[int]):
+        """
+        Adds times to the aggregate.
+        :param times: Times to add
+        """
+        if not times:
+            return
+        values = np.array(times, dtype=np.float64)
+        self.__combine(len(times), sum(times), min(times), max(times), float(values.mean()),
+                       float(((values - values.mean()) ** 2).sum()))
+        self.sketch.update(times)
+
+    def merge(self, other: 'TimeAccumulator'):
+        """
+        Adds the times of another aggregate to this aggregate.
+        :param other: Aggregate to merge, which is not modified
+        """
+        if other.count == 0:
+            return
+        self.__combine(other.count, other.sum, other.min, other.max, other.mean, other.m2)
+        self.sketch.merge(other.sketch)
+
+    def to_metric(self) -> AggregatedMetric:
+        """
+        Computes the same metric as `aggregate_times_to_frontend_friendly` does from the list of times. The median and
+        percentiles are exact as long as the sketch is, see `KLLSketch`.
+        :return: Aggregated metric
+        """
+        if self.count == 0:
+            raise ValueError()
+        average_time = round(self.sum / self.count)
+        # The standard deviation is computed around the rounded mean.
+        standard_deviation = math.sqrt(max(0.0, self.m2 / self.count + (self.mean - average_time) ** 2))
+        return AggregatedMetric(min=self.min,
+                                median=self.sketch.value_at_rank(self.count // 2),
+                                max=self.max,
+                                mean=average_time,
+                                stdev=standard_deviation,
+                                sum=self.sum,
+                                p90=self.sketch.value_at_rank(self.count * 90 // 100),
+                                p95=self.sketch.value_at_rank(self.count * 95 // 100),
+                                p99=self.sketch.value_at_rank(self.count * 99 // 100))
+
+    def __combine(self, count: int, time_sum: int, min_time: int, max_time: int, mean: float, m2: float):
+        total_count = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / total_count
+        self.mean += delta * count / total_count
+        self.count = total_count
+        self.sum += time_sum
+        self.min = min_time if self.min is None else min(self.min, min_time)
+        self.max = max_time if self.max is None else max(self.max, max_time)
+
+
+class AccumulatedTimes(BaseModel):
+    """
+    Streaming counterpart of `CollectedTimes`, which stores a `TimeAccumulator` instead of the list of times.
+    """
+    waiting_times: Dict[Node, TimeAccumulator]
+    service_times: Dict[Node, TimeAccumulator]
+    sojourn_times: Dict[Node, TimeAccumulator]
+    pooling_times: Dict[Node, Dict[ObjectType, TimeAccumulator]]
+    synchronization_times: Dict[Node, TimeAccumulator]
+    lagging_times: Dict[Node, Dict[ObjectType, TimeAccumulator]]
+    flow_times: Dict[Node, TimeAccumulator]
+    edge_pooling_times: Dict[Node, Dict[Node, Dict[ObjectType, TimeAccumulator]]]
+    edge_waiting_times: Dict[Node, Dict[Node, Dict[ObjectType, TimeAccumulator]]]
+
+    def merge(self, other: 'AccumulatedTimes'):
+        """
+        Adds the times of another aggregate, e.g. of another part of the OCEL, to this aggregate.
+        :param other: Aggregate to merge, which is not modified
+        """
+        def merge_accumulators(target: Dict[Any, Any], source: Dict[Any, Any]):
+            for (key, value) in source.items():
+                if isinstance(value, TimeAccumulator):
+                    target.setdefault(key, TimeAccumulator()).merge(value)
+                else:
+                    merge_accumulators(target.setdefault(key, {}), value)
+
+        for field in self.__fields__:
+            merge_accumulators(getattr(self, field), getattr(other, field))
 
 
 class NodePerformanceMetrics(BaseModel):
@@ -126,13 +327,113 @@ class FrontendFriendlyPerformanceMetrics(BaseModel):
     edges: Dict[Node, Dict[Node, Dict[ObjectType, EdgePerformanceMetrics]]]
 
 
+@app.task(bind=True)
+def ocel_performance_metrics_task(self, ocel: str,
+                                  aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]):
+    number_of_events = get_ocel_snapshot(ocel).number_of_events()
+    if number_of_events > PERFORMANCE_METRICS_CHUNK_EVENTS:
+        # The replacing chord inherits the id of this task, hence its result is the result of this task. The chunks only
+        # receive references to the aligned times, which each worker reads from the long term cache once.
+        (aligned_times_references, chunked_keys) = reference_aligned_times(ocel, self.request.id, aligned_times)
+        return self.replace(chord(
+            [performance_metrics_chunk.s(ocel, aligned_times_references, start,
+                                         start + PERFORMANCE_METRICS_CHUNK_EVENTS, TIME_AGGREGATION_MODE)
+             for start in range(0, number_of_events, PERFORMANCE_METRICS_CHUNK_EVENTS)],
+            merge_performance_metrics_chunks.s(TIME_AGGREGATION_MODE, ocel, chunked_keys)))
+
+    collected_times = collect_times_in_mode(get_ocel_log(ocel), resolve_aligned_times(aligned_times),
+                                            TIME_AGGREGATION_MODE)
+    return aggregate_times_to_frontend_friendly(collected_times).dict()
+
+
+@app.task()
+def performance_metrics_chunk(ocel: str, aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]],
+                              start: int, end: int, mode: TimeAggregationMode):
+    """
+    Celery task which collects the times of a chunk of events as part of the fanned out `ocel_performance_metrics_task`.
+    Only the events of the chunk are restored from the snapshot of the OCEL.
+    :param ocel: Path to the OCEL
+    :param aligned_times: Aligned times of the events per object type, or references to them
+    :param start: Position of the first event of the chunk in the event log of the OCEL
+    :param end: Position after the last event of the chunk
+    :param mode: Aggregation mode, which determines the type of the collected times
+    :return: Serialized `CollectedTimes` or `AccumulatedTimes` of the chunk
+    """
+    # The chunks of an OCEL share the aligned times, hence they are memoized by the worker process.
+    aligned_times = resolve_aligned_times(aligned_times, get_memoized_long_term_cache())
+    return collect_times_in_mode(get_ocel_log(ocel, start, end), aligned_times, mode).dict()
+
+
+def reference_aligned_times(ocel: str, task_id: str,
+                            aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]] | Dict[str, Any]) \
+        -> Tuple[Dict[ObjectType, Dict[str, Any]] | Dict[str, Any], List[str]]:
+    """
+    Stores the aligned times of the object types that have been passed inline in the long term cache, so that they are
+    not sent through the message broker once per chunk. References are passed on as they are.
+    :param ocel: Path to the OCEL
+    :param task_id: Id of the task whose chunks receive the aligned times
+    :param aligned_times: Aligned times of the events per object type, or references to them
+    :return: References to the aligned times and the keys of the stored entries, which have to be deleted afterwards
+    """
+    if is_reference(aligned_times):
+        return aligned_times, []
+
+    references = {}
+    keys = []
+    for (object_type, ot_times) in aligned_times.items():
+        if not is_reference(ot_times):
+            key = chunked_aligned_times(task_id, object_type)
+            get_long_term_cache().set(ocel, key, ot_times)
+            keys.append(key)
+            ot_times = reference(ocel, key)
+        references[object_type] = ot_times
+    return references, keys
+
+
 @app.task()
-def ocel_performance_metrics_task(ocel: str, aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]):
-    ocel: DataFrame = get_ocel(ocel).log.log
-    collected_times = collect_times(ocel, aligned_times)
+def merge_performance_metrics_chunks(serialized_times: List[Dict[str, Any]], mode: TimeAggregationMode,
+                                     ocel: str | None = None, chunked_keys: List[str] | None = None):
+    """
+    Celery task which merges the times of all chunks computed by `performance_metrics_chunk` into the metrics.
+    :param serialized_times: Serialized times of the chunks
+    :param mode: Aggregation mode of the chunks
+    :param ocel: Path to the OCEL
+    :param chunked_keys: Keys of the aligned times stored for the chunks by `reference_aligned_times`, which are deleted
+    since all chunks have finished
+    :return: Performance metrics in frontend friendly format
+    """
+    for key in chunked_keys or []:
+        get_long_term_cache().delete(ocel, key)
+
+    times_type = AccumulatedTimes if TimeAggregationMode(mode) == TimeAggregationMode.STREAMING else CollectedTimes
+    collected_times = times_type(**serialized_times[0])
+    for times in serialized_times[1:]:
+        collected_times.merge(times_type(**times))
     return aggregate_times_to_frontend_friendly(collected_times).dict()
 
 
+def resolve_aligned_times(aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]] | Dict[str, Any],
+                          long_term_cache: LongTermCache | None = None) \
+        -> Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]:
+    # The aligned times of each object type are usually passed as reference to the long term cache.
+    return {object_type: resolve_reference(ot_times, long_term_cache)
+            for (object_type, ot_times) in resolve_reference(aligned_times, long_term_cache).items()}
+
+
+def collect_times_in_mode(ocel: DataFrame, aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]],
+                          mode: TimeAggregationMode) -> CollectedTimes | AccumulatedTimes:
+    """
+    Collects the times of the events using `collect_times_vectorized` or `accumulate_times` depending on the mode.
+    :param ocel: Event log of the OCEL, or a part of it
+    :param aligned_times: Aligned times of the events per object type, event id and object id
+    :param mode: Aggregation mode
+    :return: Collected or accumulated times
+    """
+    if TimeAggregationMode(mode) == TimeAggregationMode.STREAMING:
+        return accumulate_times(ocel, aligned_times)
+    return collect_times_vectorized(ocel, aligned_times)
+
+
 def collect_times(ocel: DataFrame, aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]):
     """Calculates all occurring node waiting times, service times, sourjourn times, node pooling times,
     synchronization times, lagging times, flow times, edge pooling times and edge waiting times.
@@ -272,8 +573,196 @@ def collect_times(ocel: DataFrame, aligned_times: Dict[ObjectType, Dict[str, Dic
     )
 
 
-def aggregate_times_to_frontend_friendly(collected_times: CollectedTimes) -> FrontendFriendlyPerformanceMetrics:
-    def aggregate(times: List[int]) -> AggregatedMetric:
+def collect_times_vectorized(ocel: DataFrame,
+                             aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]) -> CollectedTimes:
+    """
+    Vectorized version of `collect_times` with the same result, see `compute_times`.
+    :param ocel: Event log of the OCEL
+    :param aligned_times: Aligned times of the events per object type, event id and object id
+    :return: Collected times
+    """
+    return CollectedTimes(**{metric: group_into_lists(keys, times)
+                             for (metric, (keys, times)) in compute_times(ocel, aligned_times).items()})
+
+
+def accumulate_times(ocel: DataFrame,
+                     aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]) -> AccumulatedTimes:
+    """
+    Streaming version of `collect_times_vectorized`, which aggregates the times of each metric in a `TimeAccumulator`.
+    :param ocel: Event log of the OCEL, or a part of it
+    :param aligned_times: Aligned times of the events per object type, event id and object id
+    :return: Accumulated times
+    """
+    return AccumulatedTimes(**{metric: group_into_accumulators(keys, times)
+                               for (metric, (keys, times)) in compute_times(ocel, aligned_times).items()})
+
+
+def compute_times(ocel: DataFrame,
+                  aligned_times: Dict[ObjectType, Dict[str, Dict[str, ProjectedEventTime]]]) -> Dict[str, TimeArrays]:
+    """
+    Computes the times of `collect_times` as arrays. The relations of the events to objects are exploded once per object
+    type and joined with the aligned activation times, such that all times follow from grouped minima and maxima of
+    nanosecond timestamps.
+    :param ocel: Event log of the OCEL
+    :param aligned_times: Aligned times of the events per object type, event id and object id
+    :return: Keys (e.g. activity and object type) and times in seconds of each metric of `CollectedTimes`, in the order
+    of the events
+    """
+    object_types = list(aligned_times.keys())
+    activities = ocel['event_activity'].to_numpy(dtype=object)
+    event_ids = ocel['event_id'].map(str).to_numpy(dtype=object)
+    start_timestamps = to_nanoseconds(ocel['event_start_timestamp'])
+    end_timestamps = to_nanoseconds(ocel['event_timestamp'])
+
+    # Activation times of the (event, object) pairs, ignoring transitions that have model moves in between.
+    activations = []
+    for (object_type_code, object_type) in enumerate(object_types):
+        related_objects = [as_object_list(value) for value in ocel[object_type].values]
+        object_counts = np.fromiter(map(len, related_objects), dtype=np.int64, count=len(related_objects))
+        relations = DataFrame({
+            'position': np.repeat(np.arange(len(ocel)), object_counts),
+            'event_id': pd.Series(np.repeat(event_ids, object_counts), dtype=object),
+            'object_id': pd.Series(list(chain.from_iterable(related_objects)), dtype=object)
+        })
+        ot_activations = DataFrame([
+            (event_id, object_id, previous_activity, activation_time[0])
+            for (event_id, event_times) in aligned_times[object_type].items()
+            for (object_id, (previous_activity, activation_time, execution_time)) in event_times.items()
+            if activation_time and previous_activity and activation_time[1] == execution_time[1]
+        ], columns=['event_id', 'object_id', 'previous_activity', 'activation_time'], dtype=object)
+        ot_activations = relations.merge(ot_activations, on=['event_id', 'object_id'])
+        ot_activations['object_type'] = object_type_code
+        activations.append(ot_activations[['position', 'object_type', 'previous_activity', 'activation_time']])
+
+    activations = pd.concat(activations, ignore_index=True) if activations else \
+        DataFrame(columns=['position', 'object_type', 'previous_activity', 'activation_time'])
+    activations['activation_time'] = to_nanoseconds(activations['activation_time'])
+    object_type_names = np.array(object_types, dtype=object)
+
+    # Groups are sorted by the position of the event, so the times are collected in the order of the events.
+    by_object_type = activations.groupby(['position', 'object_type'])['activation_time'].agg(['min', 'max']) \
+        .reset_index()
+    by_previous_activity = activations \
+        .groupby(['position', 'object_type', 'previous_activity'])['activation_time'].agg(['min', 'max']).reset_index()
+    by_event = by_object_type.groupby('position').agg(first=('min', 'min'), last=('max', 'max'))
+
+    positions = by_object_type['position'].to_numpy(dtype=np.int64)
+    object_type_keys = [activities[positions], object_type_names[by_object_type['object_type']]]
+    pooling_times = to_rounded_seconds(by_object_type['max'] - by_object_type['min'])
+    lagging_times = to_rounded_seconds(by_object_type['min'].to_numpy() - by_event['first'].loc[positions].to_numpy())
+
+    positions = by_previous_activity['position'].to_numpy(dtype=np.int64)
+    edge_keys = [by_previous_activity['previous_activity'].to_numpy(dtype=object), activities[positions],
+                 object_type_names[by_previous_activity['object_type']]]
+    edge_pooling_times = to_rounded_seconds(by_previous_activity['max'] - by_previous_activity['min'])
+    edge_waiting_times = to_rounded_seconds(start_timestamps[positions] - by_previous_activity['max'].to_numpy())
+
+    positions = by_event.index.to_numpy(dtype=np.int64)
+    waiting_times = start_timestamps[positions] - by_event['last'].to_numpy()
+    sojourn_times = waiting_times + (end_timestamps - start_timestamps)[positions]
+    synchronization_times = by_event['last'].to_numpy() - by_event['first'].to_numpy()
+    flow_times = synchronization_times + sojourn_times
+
+    return {
+        'waiting_times': ([activities[positions]], to_rounded_seconds(waiting_times)),
+        'service_times': ([activities], to_rounded_seconds(end_timestamps - start_timestamps)),
+        'sojourn_times': ([activities[positions]], to_rounded_seconds(sojourn_times)),
+        'pooling_times': (object_type_keys, pooling_times),
+        'synchronization_times': ([activities[positions]], to_rounded_seconds(synchronization_times)),
+        'lagging_times': (object_type_keys, lagging_times),
+        'flow_times': ([activities[positions]], to_rounded_seconds(flow_times)),
+        'edge_pooling_times': (edge_keys, edge_pooling_times),
+        'edge_waiting_times': (edge_keys, edge_waiting_times)
+    }
+
+
+def to_nanoseconds(timestamps: Series) -> np.ndarray:
+    """
+    Converts timestamps, e.g. serialized aligned times, to nanoseconds since the epoch. Timestamps without timezone are
+    treated as UTC, which keeps the differences between them.
+    :param timestamps: Timestamps
+    :return: Array of int64 nanoseconds
+    """
+    return pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).asi8
+
+
+def to_rounded_seconds(nanoseconds: np.ndarray | Series) -> np.ndarray:
+    """
+    Rounds time differences to seconds, exactly like `round(Timedelta.total_seconds())` does, which truncates the
+    difference to microseconds first.
+    :param nanoseconds: Time differences in nanoseconds
+    :return: Array of int64 seconds
+    """
+    microseconds = np.asarray(nanoseconds, dtype=np.int64) // 1000
+    return np.rint(microseconds // 10 ** 6 + (microseconds % 10 ** 6) / 10 ** 6).astype(np.int64)
+
+
+def group_into_lists(keys: List[np.ndarray], values: np.ndarray) -> Dict[Any, Any]:
+    """
+    Collects the values in nested dictionaries of lists, see `CollectedTimes`.
+    :param keys: Keys of each nesting level, e.g. the activity and the object type of each value
+    :param values: Values
+    :return: Nested dictionaries with the lists of values of each key
+    """
+    result = {}
+    for (*key, value) in zip(*keys, values.tolist()):
+        target = result
+        for key_part in key[:-1]:
+            target = target.setdefault(key_part, {})
+        target.setdefault(key[-1], []).append(value)
+    return result
+
+
+def group_into_accumulators(keys: List[np.ndarray], values: np.ndarray) -> Dict[Any, Any]:
+    """
+    Aggregates the values in nested dictionaries of `TimeAccumulator`s, with the same nesting as `group_into_lists`.
+    The values are stably sorted by their keys once, such that each group is a slice of the sorted values whose
+    aggregates are folded by `reduceat`.
+    :param keys: Keys of each nesting level, e.g. the activity and the object type of each value
+    :param values: Values
+    :return: Nested dictionaries with the accumulated values of each key
+    """
+    if len(values) == 0:
+        return {}
+
+    factorized_keys = [pd.factorize(key_part, use_na_sentinel=False) for key_part in keys]
+    order = np.lexsort([codes for (codes, _) in reversed(factorized_keys)])
+    codes = [key_codes[order] for (key_codes, _) in factorized_keys]
+    values = np.asarray(values, dtype=np.int64)[order]
+
+    is_group_start = np.zeros(len(values), dtype=bool)
+    is_group_start[0] = True
+    for key_codes in codes:
+        is_group_start[1:] |= key_codes[1:] != key_codes[:-1]
+    starts = np.flatnonzero(is_group_start)
+    ends = np.r_[starts[1:], len(values)]
+
+    counts = ends - starts
+    sums = np.add.reduceat(values, starts)
+    means = sums / counts
+    m2s = np.add.reduceat((values - np.repeat(means, counts)) ** 2, starts)
+    minima = np.minimum.reduceat(values, starts)
+    maxima = np.maximum.reduceat(values, starts)
+
+    result = {}
+    for (group, (start, end)) in enumerate(zip(starts.tolist(), ends.tolist())):
+        *key, last_key_part = [uniques[key_codes[start]] for ((_, uniques), key_codes) in zip(factorized_keys, codes)]
+        target = result
+        for key_part in key:
+            target = target.setdefault(key_part, {})
+        sketch = KLLSketch()
+        sketch.update(values[start:end].tolist())
+        target[last_key_part] = TimeAccumulator(count=int(counts[group]), sum=int(sums[group]),
+                                                min=int(minima[group]), max=int(maxima[group]),
+                                                mean=float(means[group]), m2=float(m2s[group]), sketch=sketch)
+    return result
+
+
+def aggregate_times_to_frontend_friendly(
+        collected_times: CollectedTimes | AccumulatedTimes) -> FrontendFriendlyPerformanceMetrics:
+    def aggregate(times: List[int] | TimeAccumulator) -> AggregatedMetric:
+        if isinstance(times, TimeAccumulator):
+            return times.to_metric()
         if len(times) == 0:
             raise ValueError()
         times.sort()
@@ -286,9 +775,13 @@ def aggregate_times_to_frontend_friendly(collected_times: CollectedTimes) -> Fro
                                 max=max_time,
                                 mean=average_time,
                                 stdev=standard_deviation,
-                                sum=time_sum)
+                                sum=time_sum,
+                                p90=times[len(times) * 90 // 100],
+                                p95=times[len(times) * 95 // 100],
+                                p99=times[len(times) * 99 // 100])
 
-    def get_aggegated_node_metric_if_available(metrics: Dict[Node, List[int]], node: Node) -> AggregatedMetric | None:
+    def get_aggegated_node_metric_if_available(metrics: Dict[Node, List[int] | TimeAccumulator],
+                                               node: Node) -> AggregatedMetric | None:
         if node in metrics:
             return aggregate(metrics[node])
         return None
@@ -343,8 +836,9 @@ def aggregate_times_to_frontend_friendly(collected_times: CollectedTimes) -> Fro
 
 # region Legacy performance metrics
 @app.task()
-def calculate_performance_metrics(base_ocel: str, object_type: str, alignments: List[Dict[str, Any]]):
-    log_cases = extract_cases_with_timestamps(get_projected_event_log(base_ocel, object_type))
+def calculate_performance_metrics(base_ocel: str, object_type: str, alignments: List[Dict[str, Any]] | Dict[str, Any]):
+    alignments = resolve_reference(alignments)
+    log_cases = extract_cases_with_timestamps(get_projected_event_dataframe(base_ocel, object_type))
     aligned_log = align_log(log_cases, alignments)
     metrics, _, _ = pm4py.discover_performance_dfg(aligned_log)
     return {
@@ -352,9 +846,7 @@ def calculate_performance_metrics(base_ocel: str, object_type: str, alignments:
     }
 
 
-def extract_cases_with_timestamps(log: EventLog) -> Dict[str, List[Tuple[str, datetime]]]:
-    log: DataFrame = pm4py.convert_to_dataframe(log)
-
+def extract_cases_with_timestamps(log: DataFrame) -> Dict[str, List[Tuple[str, datetime]]]:
     log_cases: Dict[str, List[Tuple[str, datetime]]] = {}
     for _, row in log.iterrows():
         log_cases.setdefault(row['case:concept:name'], []).append((row['concept:name'], row['time:timestamp']))
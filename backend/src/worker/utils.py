@@ -1,30 +1,42 @@
 import json
 import os
 import pprint
+import sys
 from pathlib import PureWindowsPath
 from typing import Dict, List, Tuple, Any
 
+import numpy as np
+import pandas as pd
 import pm4py
 from fastapi import HTTPException
-from ocpa.algo.util.util import project_log
-from ocpa.objects.log.importer.csv.util import succint_mdl_to_exploded_mdl
 from ocpa.objects.log.ocel import OCEL
 from ocpa.objects.log.importer.ocel import factory as ocel_import_factory
 from ocpa.objects.log.importer.csv import factory as ocel_import_factory_csv
 from pandas import DataFrame
-from pandas.core.groupby import DataFrameGroupBy
 from pm4py.objects.log.obj import EventLog
 from pydantic import BaseModel
 from starlette import status
 
-from cache import get_long_term_cache, projected_log, projected_log_traces, metadata, LongTermCacheEntryType
+from cache import get_long_term_cache, projected_log, projected_log_traces, metadata, LongTermCacheEntryType, \
+    SizeBoundedLRUCache, ocel_snapshot
 from server.endpoints.log_management import CSV
+from worker.jsonocel import build_ocel_snapshot
+from worker.ocel_snapshot import OCELSnapshot, read_ocel_snapshot, write_ocel_snapshot
 
 
 class OCELMetadata(BaseModel):
     object_types: List[str]
 
 
+# Parsed OCELs are kept in memory by each worker process, so consecutive tasks on the same OCEL don't import it again.
+PARSED_OCEL_CACHE_BYTES = int(os.environ.get('EXPLORI_PARSED_OCEL_CACHE_BYTES', default=str(1024 ** 3)))
+__PARSED_OCEL_CACHE = SizeBoundedLRUCache(PARSED_OCEL_CACHE_BYTES)
+
+
+def get_parsed_ocel_cache() -> SizeBoundedLRUCache:
+    return __PARSED_OCEL_CACHE
+
+
 def get_all_projected_traces(ocel_filename: str, build_if_non_existent: bool = True) -> Dict[str, List[Tuple[List[str], int, List[List[int]]]]] | None:
     if build_if_non_existent:
         ensure_that_all_event_projected_logs_exist(ocel_filename)
@@ -51,27 +63,67 @@ def get_projected_traces(ocel_filename: str, object_type: str, build_if_non_exis
         return None  # Abort if we should not create the traces now.
 
     # Create the traces:
-    event_log: EventLog = get_projected_event_log(ocel_filename, object_type)
-    event_log: DataFrame = pm4py.convert_to_dataframe(event_log)
-    event_log: DataFrameGroupBy = event_log.groupby("case:concept:name")
+    event_log: DataFrame = get_projected_event_dataframe(ocel_filename, object_type)
+    traces = extract_variants(event_log)
 
-    trace_event_ids: Dict[Any, List[List[int]]] = {}
-    for (case_id, case) in event_log:
-        trace = tuple(case['concept:name'].values)
+    cache.set(ocel_filename, projected_log_traces(object_type), traces)
+    return traces
 
-        # Initialize the state for this trace if it does not exist yet.
-        trace_event_ids.setdefault(trace, [[] for _ in range(len(trace))])
 
-        for (i, (_, event)) in enumerate(case.iterrows()):
-            trace_event_ids[trace][i].append(event['event_id'])
+def extract_variants(event_log: DataFrame) -> List[Tuple[List[str], int, List[List[int]]]]:
+    """
+    Groups the cases of a projected event log by their activity sequence. The cases are ordered by their case id.
+    :param event_log: Projected event log, see `get_projected_event_dataframe`
+    :return: List of variants containing the activities, the number of cases, and the OCEL event ids of each position
+    """
+    if len(event_log) == 0:
+        return []
 
-    # traces: List[(Activities, nr_cases, event_ids_for_each_activity)]
-    traces = [(trace, len(event_ids[0]), event_ids) for (trace, event_ids) in trace_event_ids.items()]
+    order, case_starts, variants = group_cases_by_variant(event_log)
+    event_ids = event_log["event_id"].to_numpy()[order]
 
-    cache.set(ocel_filename, projected_log_traces(object_type), traces)
+    traces = []
+    for (activities, variant_cases) in variants:
+        # Row i contains the event ids of the i-th activity of all cases of the variant.
+        positions = case_starts[variant_cases][np.newaxis, :] + np.arange(len(activities))[:, np.newaxis]
+        traces.append((activities, len(variant_cases), event_ids[positions].tolist()))
     return traces
 
 
+def group_cases_by_variant(event_log: DataFrame) -> Tuple[np.ndarray, np.ndarray, List[Tuple[Tuple[str], np.ndarray]]]:
+    """
+    Groups the cases of a non-empty projected event log by their activity sequence.
+    :param event_log: Projected event log, see `get_projected_event_dataframe`
+    :return: Order sorting the events by case id (keeping the order of the events of a case), the position of the first
+    event of each case in this order, and the activities and the (indices of the) cases of each variant
+    """
+    case_codes, _ = pd.factorize(event_log["case:concept:name"], sort=True)
+    activity_codes, activities = pd.factorize(event_log["concept:name"])
+
+    # Sort the events by case, the events of a case keep their order.
+    order = np.argsort(case_codes, kind="stable")
+    case_codes = case_codes[order]
+    activity_codes = activity_codes[order].astype(np.int32)
+
+    case_starts = np.flatnonzero(np.r_[True, case_codes[1:] != case_codes[:-1]])
+    case_ends = np.r_[case_starts[1:], len(case_codes)]
+
+    # The variant of each case is identified by the bytes of its activity codes.
+    activity_bytes = activity_codes.tobytes()
+    item_size = activity_codes.itemsize
+    variant_keys = [activity_bytes[start * item_size:end * item_size] for (start, end) in zip(case_starts, case_ends)]
+    variant_codes, _ = pd.factorize(pd.Series(variant_keys, dtype=object))
+
+    variants = []
+    cases_by_variant = np.argsort(variant_codes, kind="stable")
+    variant_bounds = np.flatnonzero(np.r_[True, np.diff(variant_codes[cases_by_variant]) != 0, True])
+    for (first, last) in zip(variant_bounds[:-1], variant_bounds[1:]):
+        variant_cases = cases_by_variant[first:last]
+        start, end = case_starts[variant_cases[0]], case_ends[variant_cases[0]]
+        variants.append((tuple(activities[activity_codes[start:end]]), variant_cases))
+    return order, case_starts, variants
+
+
 def ensure_that_all_event_projected_logs_exist(ocel_filename: str):
     cache = get_long_term_cache()
     meta = get_metadata(ocel_filename, build_if_non_existent=False)
@@ -80,15 +132,32 @@ def ensure_that_all_event_projected_logs_exist(ocel_filename: str):
     else:
         for object_type in meta.object_types:
             if not cache.has(ocel_filename, projected_log(object_type),
-                             value_type=LongTermCacheEntryType.CLASSIC_EVENT_LOG):
+                             value_type=LongTermCacheEntryType.COLUMNAR_EVENT_LOG):
                 project_ocel(ocel_filename, build_metadata=False)
                 return
 
 
 def get_projected_event_log(ocel_filename: str, object_type: str, project_if_non_existent: bool = True) -> EventLog | None:
+    event_log = get_projected_event_dataframe(ocel_filename, object_type, project_if_non_existent)
+    if event_log is None:
+        return None
+    return pm4py.convert_to_event_log(event_log)
+
+
+def get_projected_event_dataframe(ocel_filename: str, object_type: str,
+                                  project_if_non_existent: bool = True) -> DataFrame | None:
+    """
+    Returns the event log of the OCEL projected onto the object type. The rows of each case are adjacent and ordered
+    like the events in the OCEL.
+    :param ocel_filename: File name of the OCEL
+    :param object_type: Object type to project onto
+    :param project_if_non_existent: If set to false, `None` is returned if the projection has not been cached yet
+    :return: Projected event log with the columns "concept:name", "time:timestamp", "case:concept:name" as well as the
+    remaining event attributes such as "event_id"
+    """
     cache = get_long_term_cache()
-    if cache.has(ocel_filename, projected_log(object_type), LongTermCacheEntryType.CLASSIC_EVENT_LOG):
-        return cache.get(ocel_filename, projected_log(object_type), LongTermCacheEntryType.CLASSIC_EVENT_LOG)
+    if cache.has(ocel_filename, projected_log(object_type), LongTermCacheEntryType.COLUMNAR_EVENT_LOG):
+        return cache.get(ocel_filename, projected_log(object_type), LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
 
     if not project_if_non_existent:
         return None
@@ -112,28 +181,21 @@ def get_metadata(ocel_filename: str, build_if_non_existent: bool = True) -> OCEL
         return OCELMetadata(**cache.get(ocel_filename, metadata()))
 
     if build_if_non_existent:
-        ocel: OCEL = get_ocel(ocel_filename)
-        return __build_metadata(ocel_filename, ocel)
+        return __build_metadata(ocel_filename, get_ocel_snapshot(ocel_filename).object_types)
     else:
         return None
 
 
-def project_ocel(ocel_filename: str, build_metadata: bool = True) -> Dict[str, EventLog]:
+def project_ocel(ocel_filename: str, build_metadata: bool = True) -> Dict[str, DataFrame]:
     cache = get_long_term_cache()
-    ocel: OCEL = get_ocel(ocel_filename)
+    snapshot = get_ocel_snapshot(ocel_filename)
 
     if build_metadata:
-        __build_metadata(ocel_filename, ocel)
-
-    # Prepare event log for projection to object types.
-    df: DataFrame = ocel.log.log
-    exploded_df = succint_mdl_to_exploded_mdl(df)
+        __build_metadata(ocel_filename, snapshot.object_types)
 
-    result = {}
-    for object_type in ocel.object_types:
-        result[object_type] = project_log(exploded_df, object_type)
-        cache.set(ocel_filename, projected_log(object_type), result[object_type],
-                  LongTermCacheEntryType.CLASSIC_EVENT_LOG)
+    result = {object_type: snapshot.project(object_type) for object_type in snapshot.object_types}
+    for (object_type, event_log) in result.items():
+        cache.set(ocel_filename, projected_log(object_type), event_log, LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
     return result
 
 
@@ -141,6 +203,58 @@ def get_ocel(ocel_filename: str) -> OCEL:
     """
     This function returns the OCEL for the given ocel file name.
     If a csv OCEL is selected, fetches the csv column mappings to import it.
+    Imported OCELs are memoized by the worker process as long as neither the file nor the column mappings change.
+    The returned OCEL is shared and must not be modified.
+    :param ocel_filename: File name of the OCEL to import.
+    :return: Imported OCEL.
+    """
+    cache = get_parsed_ocel_cache()
+    key = __parsed_ocel_key(ocel_filename)
+
+    ocel = cache.get(key)
+    if ocel is not None:
+        return ocel
+
+    ocel = import_ocel(ocel_filename)
+    cache.set(key, ocel, estimate_ocel_size(ocel))
+    return ocel
+
+
+def get_ocel_snapshot(ocel_filename: str) -> OCELSnapshot:
+    """
+    Returns the memory mapped snapshot of the OCEL, see `worker.ocel_snapshot`. If there is no snapshot for the current
+    version of the file yet, .jsonocel files are streamed into a new snapshot, other OCELs are imported using ocpa.
+    :param ocel_filename: File name of the OCEL.
+    :return: Snapshot of the OCEL.
+    """
+    folder = os.path.join(get_long_term_cache().get_folder(ocel_filename), ocel_snapshot())
+    # The absolute path is not part of the source, as the cache folder already depends on the OCEL.
+    source = list(__parsed_ocel_key(ocel_filename)[1:])
+
+    snapshot = read_ocel_snapshot(folder, source)
+    if snapshot is None and ocel_filename.split(".")[-1] == "jsonocel":
+        # Stream .jsonocel files into the snapshot instead of loading the whole document with ocpa.
+        snapshot = build_ocel_snapshot(ocel_filename, folder, source)
+    if snapshot is None:
+        snapshot = write_ocel_snapshot(folder, get_ocel(ocel_filename), source)
+    return snapshot
+
+
+def get_ocel_log(ocel_filename: str, start: int = 0, end: int | None = None) -> DataFrame:
+    """
+    Returns the event log of the OCEL, i.e. `get_ocel(ocel_filename).log.log`, restored from the snapshot of the OCEL.
+    Only the events of the given range are restored.
+    :param ocel_filename: File name of the OCEL.
+    :param start: Position of the first event.
+    :param end: Position after the last event, or `None` for all remaining events.
+    :return: Event log of the OCEL, same as `iloc[start:end]` of the full event log.
+    """
+    return get_ocel_snapshot(ocel_filename).log(start, end)
+
+
+def import_ocel(ocel_filename: str) -> OCEL:
+    """
+    Imports the OCEL using the ocpa importers.
     :param ocel_filename: File name of the OCEL to import.
     :return: Imported OCEL.
     """
@@ -162,7 +276,35 @@ def get_ocel(ocel_filename: str) -> OCEL:
         return ocel_import_factory.apply(ocel_filename)
 
 
-def load_projected_event_logs(ocel_filename: str) -> Dict[str, EventLog] | None:
+def estimate_ocel_size(ocel: OCEL) -> int:
+    """
+    Estimates the memory used by the event log of the OCEL, including the object ids referenced by each event.
+    :param ocel: Imported OCEL
+    :return: Estimated size in bytes
+    """
+    log: DataFrame = ocel.log.log
+    size = int(log.memory_usage(deep=True).sum())
+    for object_type in ocel.object_types:
+        if object_type in log.columns:
+            size += sum(sys.getsizeof(object_id) for objects in log[object_type].values
+                        if isinstance(objects, (list, tuple, set)) for object_id in objects)
+    return size
+
+
+def __parsed_ocel_key(ocel_filename: str) -> Tuple[Any, ...]:
+    # The modification time and the size identify the version of the file. For csv OCELs, the column mappings are part
+    # of the key as they influence the import.
+    file_stat = os.stat(ocel_filename)
+    key = (os.path.abspath(ocel_filename), file_stat.st_mtime_ns, file_stat.st_size)
+
+    if ocel_filename.split(".")[-1] == "csv":
+        csv_path = get_csv_file_name(ocel_filename)
+        if os.path.isfile(csv_path):
+            key += (os.stat(csv_path).st_mtime_ns,)
+    return key
+
+
+def load_projected_event_logs(ocel_filename: str) -> Dict[str, DataFrame] | None:
     cache = get_long_term_cache()
     if not cache.has(ocel_filename, metadata()):
         return None
@@ -171,13 +313,13 @@ def load_projected_event_logs(ocel_filename: str) -> Dict[str, EventLog] | None:
     result = {}
     for object_type in object_types:
         result[object_type] = cache.get(ocel_filename, projected_log(object_type),
-                                        LongTermCacheEntryType.CLASSIC_EVENT_LOG)
+                                        LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
     return result
 
 
-def __build_metadata(ocel_filename: str, ocel: OCEL) -> OCELMetadata:
+def __build_metadata(ocel_filename: str, object_types: List[str]) -> OCELMetadata:
     cache = get_long_term_cache()
-    result = OCELMetadata(object_types=list(ocel.object_types))
+    result = OCELMetadata(object_types=list(object_types))
     cache.set(ocel_filename, metadata(), result)
     return result
 
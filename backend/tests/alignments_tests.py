@@ -0,0 +1,336 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from cache import FileBasedLongTermCache, alignments, dfm as dfm_cache_key, alignment_by_content, \
+    SHARED_ALIGNMENTS_OCEL
+from server.endpoints.pm import run_alignment_tasks, compute_alignments as compute_alignments_endpoint
+from server.task_manager import TaskStatus
+from shared_types import FrontendFriendlyDFM
+from worker.tasks.alignments import compute_alignments, compute_alignments_batch, chunk_alignment_traces, \
+    AlignmentEngine, TraceAlignment, FilteredDFG, Edge, SKIP_MOVE, build_aligner, \
+    filter_threshold_of_graph_notation, align_perfectly_fitting_trace, get_dfg_steps, read_cached_alignment, \
+    load_filtered_dfg, get_aligner, DFGAligner, get_dfg_hash
+from worker.tasks.dfm import dfm, START_TOKEN, STOP_TOKEN
+
+
+class AlignmentTests(TestCase):
+
+    def test_chunk_alignment_traces(self):
+        traces = [(trace_id, ["a"] * (trace_id % 7)) for trace_id in range(1000)]
+
+        with patch("worker.tasks.alignments.ALIGNMENT_BATCH_MIN_EVENTS", 100), \
+                patch("worker.tasks.alignments.ALIGNMENT_BATCH_TARGET_CHUNKS", 8), \
+                patch("worker.tasks.alignments.ALIGNMENT_BATCH_MAX_TRACES", 100):
+            chunks = chunk_alignment_traces(traces)
+            self.assertEqual(traces, [trace for chunk in chunks for trace in chunk])
+            self.assertEqual(10, len(chunks))
+            self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+
+            # Few traces are aligned in a single batch.
+            self.assertEqual([traces[:20]], chunk_alignment_traces(traces[:20]))
+
+        self.assertEqual([], chunk_alignment_traces([]))
+
+    def test_compute_alignments_batch(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[len(process_dfm.thresholds) // 2]
+        traces = [(trace_id, [process_dfm.nodes[node_id].label for node_id in trace.actions])
+                  for (trace_id, trace) in enumerate(process_dfm.traces) if "MATERIAL" in trace.thresholds]
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set(ocel_filename, dfm_cache_key(), {"result": process_dfm.dict(), "version": "3"})
+
+            with patch("worker.tasks.alignments.get_long_term_cache", return_value=cache):
+                batch_alignments = compute_alignments_batch(ocel_filename, threshold, "MATERIAL", ocel_filename, traces)
+                self.assertEqual([compute_alignments(ocel_filename, threshold, "MATERIAL", trace)
+                                  for (_, trace) in traces], batch_alignments)
+
+                for ((trace_id, _), alignment) in zip(traces, batch_alignments):
+                    self.assertEqual(alignment, read_cached_alignment(
+                        ocel_filename, alignments(threshold, ocel_filename, "MATERIAL", trace_id)))
+
+                # Truncated entries are treated as missing.
+                trace_id = traces[0][0]
+                with open(os.path.join(cache.get_folder(ocel_filename),
+                                       f"{alignments(threshold, ocel_filename, 'MATERIAL', trace_id)}.json"), 'w') as f:
+                    f.write('{"pointer": "alignm')
+                self.assertIsNone(read_cached_alignment(ocel_filename, alignments(threshold, ocel_filename,
+                                                                                  "MATERIAL", trace_id)))
+                compute_alignments_batch(ocel_filename, threshold, "MATERIAL", ocel_filename, traces[:1])
+                self.assertIsNotNone(read_cached_alignment(ocel_filename, alignments(threshold, ocel_filename,
+                                                                                     "MATERIAL", trace_id)))
+
+                # Alignments are shared by content, so aligning the same traces for another OCEL computes nothing.
+                with patch("worker.tasks.alignments.build_aligner", side_effect=AssertionError):
+                    self.assertEqual(batch_alignments, compute_alignments_batch(ocel_filename, threshold, "MATERIAL",
+                                                                                "other.jsonocel", traces))
+                for (trace_id, trace) in traces:
+                    self.assertEqual(read_cached_alignment(ocel_filename, alignments(threshold, ocel_filename,
+                                                                                     "MATERIAL", trace_id)),
+                                     read_cached_alignment(ocel_filename, alignments(threshold, "other.jsonocel",
+                                                                                     "MATERIAL", trace_id)))
+
+    def test_approximate_alignments_are_not_shared(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[0]
+        dfg = filter_threshold_of_graph_notation(process_dfm, "MATERIAL", threshold)
+        traces = [(0, [START_TOKEN, "Unknown Activity", STOP_TOKEN])]
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set(ocel_filename, dfm_cache_key(), {"result": process_dfm.dict(), "version": "3"})
+
+            with patch("worker.tasks.alignments.get_long_term_cache", return_value=cache), \
+                    patch("worker.tasks.alignments.ALIGNMENT_MAX_EXPANDED_STATES", 1):
+                compute_alignments_batch(ocel_filename, threshold, "MATERIAL", ocel_filename, traces,
+                                         AlignmentEngine.NATIVE)
+
+                self.assertTrue(read_cached_alignment(ocel_filename, alignments(threshold, ocel_filename,
+                                                                               "MATERIAL", 0))["approximate"])
+                self.assertFalse(cache.has(SHARED_ALIGNMENTS_OCEL,
+                                           alignment_by_content(get_dfg_hash(dfg), traces[0][1])))
+
+    def test_run_alignment_tasks(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[len(process_dfm.thresholds) // 2]
+        # Reversed traces don't fit the DFG, hence they are aligned in batches.
+        conformance_dfm = process_dfm.copy(deep=True)
+        for trace in conformance_dfm.traces:
+            trace.actions.reverse()
+        task_manager = MagicMock()
+        task_manager.cached_tasks.side_effect = lambda tasks, ignore_cache: {key: TaskStatus(status="running")
+                                                                            for key in tasks}
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set(ocel_filename, dfm_cache_key(), {"result": process_dfm.dict(), "version": "3"})
+
+            with patch("worker.tasks.alignments.get_long_term_cache", return_value=cache), \
+                    patch("server.endpoints.pm.get_memoized_long_term_cache", return_value=cache), \
+                    patch("worker.tasks.alignments.ALIGNMENT_BATCH_MIN_EVENTS", 1), \
+                    patch("worker.tasks.alignments.ALIGNMENT_BATCH_MAX_TRACES", 1):
+                task_status = run_alignment_tasks(ocel_filename, ocel_filename, process_dfm, conformance_dfm,
+                                                  threshold, task_manager)
+                self.assertEqual("running", task_status.status)
+
+                # All batches are started at once.
+                task_manager.cached_tasks.assert_called_once()
+                tasks = list(task_manager.cached_tasks.call_args.args[0].values())
+                self.assertTrue(task_manager.cached_tasks.call_args.kwargs["ignore_cache"])
+                self.assertGreater(len(tasks), 1)
+
+                # The task manager caches the result of the batches, except for the first one, which is still running.
+                for task in tasks:
+                    result = task.task(*task.args)
+                    if task is not tasks[0]:
+                        cache.set(task.base_ocel, task.long_term_cache_key,
+                                  {"result": result, "version": task.result_version})
+
+                # Batches whose alignments are all cached aren't started again.
+                task_status = run_alignment_tasks(ocel_filename, ocel_filename, process_dfm, conformance_dfm,
+                                                  threshold, task_manager)
+                self.assertEqual({}, task_manager.cached_tasks.call_args.args[0])
+                self.assertEqual("done", task_status.status)
+                self.assertEqual(sum(len(trace.thresholds) for trace in conformance_dfm.traces), len(task_status.result))
+                self.assertTrue(all(alignment is not None for alignment in task_status.result.values()))
+                # The alignments of the first batch have been read by trace, hence they are cached as batch now.
+                self.assertTrue(cache.has(ocel_filename, tasks[0].long_term_cache_key))
+
+    def test_run_alignment_tasks_short_circuits_fitting_traces(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[0]
+        task_manager = MagicMock()
+        task_manager.cached_tasks.side_effect = lambda tasks, ignore_cache: {key: TaskStatus(status="running")
+                                                                            for key in tasks}
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            with patch("server.endpoints.pm.get_memoized_long_term_cache", return_value=cache):
+                task_status = run_alignment_tasks(ocel_filename, ocel_filename, process_dfm, process_dfm, threshold,
+                                                  task_manager)
+
+        # Only the one trace that doesn't fit the filtered DFG is aligned by a task, the others are short-circuited.
+        tasks = task_manager.cached_tasks.call_args.args[0].values()
+        self.assertEqual(1, sum(len(task.args[4]) for task in tasks))
+        self.assertEqual(5, task_status.short_circuited)
+        self.assertEqual(6, len(task_status.preliminary))
+        self.assertEqual(5, sum(alignment is not None for alignment in task_status.preliminary.values()))
+
+    def test_compute_alignments_endpoint_while_running(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[0]
+        task_manager = MagicMock()
+        task_manager.cached_tasks.side_effect = lambda tasks, ignore_cache: {key: TaskStatus(status="running")
+                                                                            for key in tasks}
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            with patch("server.endpoints.pm.secure_ocel_filename", side_effect=lambda ocel: ocel), \
+                    patch("server.endpoints.pm.get_dfm", return_value=process_dfm), \
+                    patch("server.endpoints.pm.get_memoized_long_term_cache", return_value=cache):
+                task_status = compute_alignments_endpoint(ocel_filename, ocel_filename, threshold,
+                                                          AlignmentEngine.PM4PY, task_manager)
+
+        # The alignment of the running batch is missing from the preliminary result, the others are flagged as exact.
+        self.assertEqual("running", task_status.status)
+        self.assertIsNone(task_status.result)
+        self.assertEqual(len(process_dfm.traces), len(task_status.preliminary))
+        alignments_by_trace = [alignment for trace in task_status.preliminary for alignment in trace.values()]
+        self.assertEqual(1, sum(alignment is None for alignment in alignments_by_trace))
+        self.assertEqual(5, task_status.short_circuited)
+        self.assertTrue(all(alignment["approximate"] is False
+                            for alignment in alignments_by_trace if alignment is not None))
+
+    def test_load_filtered_dfg(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        threshold = process_dfm.thresholds[len(process_dfm.thresholds) // 2]
+        expected_dfg = filter_threshold_of_graph_notation(process_dfm, "MATERIAL", threshold)
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set(ocel_filename, dfm_cache_key(), {"result": process_dfm.dict(), "version": "3"})
+
+            with patch("worker.tasks.alignments.get_long_term_cache", return_value=cache):
+                self.assertEqual(expected_dfg, load_filtered_dfg(ocel_filename, "MATERIAL", threshold))
+
+                # The filtered DFG is read from its own cache entry afterwards.
+                with patch("worker.tasks.alignments.filter_threshold_of_graph_notation", side_effect=AssertionError):
+                    self.assertEqual(expected_dfg, load_filtered_dfg(ocel_filename, "MATERIAL", threshold))
+
+                # Once the DFM has been discovered again, the DFG is filtered from the new DFM.
+                changed_dfm = process_dfm.copy(deep=True)
+                changed_dfm.subgraphs["MATERIAL"] = []
+                self.assertNotEqual(expected_dfg, filter_threshold_of_graph_notation(changed_dfm, "MATERIAL", threshold))
+                cache.set(ocel_filename, dfm_cache_key(), {"result": changed_dfm.dict(), "version": "3"})
+                file_stat = cache.stat(ocel_filename, dfm_cache_key())
+                os.utime(os.path.join(cache.get_folder(ocel_filename), f"{dfm_cache_key()}.json"),
+                         ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+                self.assertEqual(filter_threshold_of_graph_notation(changed_dfm, "MATERIAL", threshold),
+                                 load_filtered_dfg(ocel_filename, "MATERIAL", threshold))
+
+                # Without a DFM, there is nothing to align on.
+                os.remove(os.path.join(cache.get_folder(ocel_filename), f"{dfm_cache_key()}.json"))
+                with self.assertRaises(ValueError):
+                    load_filtered_dfg(ocel_filename, "MATERIAL", threshold)
+
+    def test_get_aligner(self):
+        dfg = FilteredDFG(nodes=[START_TOKEN, STOP_TOKEN, "a"], edges=[Edge(0, 2), Edge(2, 1)])
+        same_dfg = FilteredDFG(nodes=["a", START_TOKEN, STOP_TOKEN], edges=[Edge(0, 2), Edge(1, 0)])
+
+        for engine in AlignmentEngine:
+            aligner = get_aligner(dfg, engine)
+            self.assertIs(aligner, get_aligner(dfg, engine))
+            self.assertIs(aligner, get_aligner(same_dfg, engine))
+            self.assertEqual(build_aligner(dfg, engine)([START_TOKEN, "b", STOP_TOKEN]),
+                             aligner([START_TOKEN, "b", STOP_TOKEN]))
+
+    def test_native_alignments_match_pm4py(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+        traces = [[process_dfm.nodes[node_id].label for node_id in trace.actions] for trace in process_dfm.traces]
+        # Also align traces with unknown activities and without start or stop.
+        traces += [trace[:1] + ["Unknown Activity"] + trace[1:] for trace in traces] + [trace[1:-1] for trace in traces]
+
+        for threshold in process_dfm.thresholds:
+            for object_type in process_dfm.subgraphs:
+                dfg = filter_threshold_of_graph_notation(process_dfm, object_type, threshold)
+                pm4py_aligner = build_aligner(dfg, AlignmentEngine.PM4PY)
+                native_aligner = build_aligner(dfg, AlignmentEngine.NATIVE)
+                edges = {(dfg.nodes[edge.source], dfg.nodes[edge.target]) for edge in dfg.edges}
+
+                for trace in traces:
+                    expected_alignment = pm4py_aligner(trace)
+                    alignment = native_aligner(trace)
+
+                    # Ties between optimal alignments may be broken differently, but the costs are the same.
+                    self.assertEqual(self.count_deviations(expected_alignment), self.count_deviations(alignment))
+                    self.assertEqual(trace, [move.activity for move in alignment.log_alignment
+                                             if move.activity != SKIP_MOVE])
+                    model_run = [move.activity for move in alignment.model_alignment if move.activity != SKIP_MOVE]
+                    self.assertEqual(START_TOKEN, model_run[0])
+                    self.assertEqual(STOP_TOKEN, model_run[-1])
+                    self.assertTrue(all(step in edges for step in zip(model_run, model_run[1:])))
+
+    def test_native_alignment(self):
+        dfg = FilteredDFG(nodes=[START_TOKEN, STOP_TOKEN, "a", "b", "c"],
+                          edges=[Edge(0, 2), Edge(2, 3), Edge(3, 3), Edge(3, 4), Edge(4, 1), Edge(2, 4)])
+
+        for trace in [[START_TOKEN, "a", "b", "b", "c", STOP_TOKEN],
+                      [START_TOKEN, "a", "x", "c", STOP_TOKEN],
+                      [START_TOKEN, "b", STOP_TOKEN],
+                      ["a", "c"]]:
+            self.assertEqual(build_aligner(dfg, AlignmentEngine.PM4PY)(trace),
+                             build_aligner(dfg, AlignmentEngine.NATIVE)(trace))
+
+    def test_approximate_alignment(self):
+        dfg = FilteredDFG(nodes=[START_TOKEN, STOP_TOKEN, "a", "b", "c"],
+                          edges=[Edge(0, 2), Edge(2, 3), Edge(3, 3), Edge(3, 4), Edge(4, 1), Edge(2, 4)])
+        aligner = DFGAligner(dfg)
+
+        for trace in [[START_TOKEN, "a", "b", "b", "c", STOP_TOKEN],
+                      [START_TOKEN, "a", "x", "c", STOP_TOKEN],
+                      [START_TOKEN, "b", STOP_TOKEN],
+                      ["c", "b", "a"]]:
+            alignment = aligner.align(trace)
+            self.assertFalse(alignment.approximate)
+
+            # The beam search is optimal as long as the beam contains all nodes.
+            with patch("worker.tasks.alignments.ALIGNMENT_MAX_EXPANDED_STATES", 1):
+                approximate_alignment = build_aligner(dfg, AlignmentEngine.NATIVE)(trace)
+            self.assertTrue(approximate_alignment.approximate)
+            self.assertEqual(self.count_deviations(alignment), self.count_deviations(approximate_alignment))
+            self.assertEqual(trace, [move.activity for move in approximate_alignment.log_alignment
+                                     if move.activity != SKIP_MOVE])
+
+            with patch("worker.tasks.alignments.ALIGNMENT_MAX_SECONDS", 0):
+                self.assertTrue(build_aligner(dfg, AlignmentEngine.PM4PY)(trace * 5).approximate)
+
+    def test_align_perfectly_fitting_trace(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with patch("worker.tasks.dfm.DFM_FAN_OUT_MIN_OBJECT_TYPES", 100):
+            process_dfm = FrontendFriendlyDFM(**dfm(ocel_filename))
+
+        number_of_fitting_traces = 0
+        for threshold in process_dfm.thresholds:
+            for object_type in process_dfm.subgraphs:
+                dfg = filter_threshold_of_graph_notation(process_dfm, object_type, threshold)
+                aligner = build_aligner(dfg, AlignmentEngine.PM4PY)
+                for trace in process_dfm.traces:
+                    if object_type not in trace.thresholds:
+                        continue
+                    labels = [process_dfm.nodes[node_id].label for node_id in trace.actions]
+                    alignment = align_perfectly_fitting_trace(labels, get_dfg_steps(dfg))
+
+                    # Traces of the DFM fit perfectly as soon as the threshold includes them.
+                    if threshold >= trace.thresholds[object_type].threshold:
+                        self.assertIsNotNone(alignment)
+                    if alignment is not None:
+                        number_of_fitting_traces += 1
+                        self.assertEqual(aligner(labels), alignment)
+
+        self.assertGreater(number_of_fitting_traces, 0)
+        self.assertIsNone(align_perfectly_fitting_trace([], set()))
+
+    def count_deviations(self, alignment: TraceAlignment) -> int:
+        return sum(SKIP_MOVE in (log_move.activity, model_move.activity)
+                   for (log_move, model_move) in zip(alignment.log_alignment, alignment.model_alignment))
+
+    def get_resources_folder(self) -> str:
+        tests_dir = os.path.split(os.path.abspath(__file__))[0]
+        return os.path.join(tests_dir, "resources")
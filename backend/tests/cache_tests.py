@@ -0,0 +1,121 @@
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from cache import SizeBoundedLRUCache, FileBasedLongTermCache, LongTermCacheEntryType, MemoizedLongTermCache, \
+    estimate_json_size
+from worker.utils import get_ocel
+
+
+class CacheTests(TestCase):
+
+    def test_size_bounded_lru_cache(self):
+        cache = SizeBoundedLRUCache(budget_bytes=10)
+        cache.set("a", "value a", 4)
+        cache.set("b", "value b", 4)
+        self.assertEqual("value a", cache.get("a"))
+
+        # "b" is the least recently used entry now.
+        cache.set("c", "value c", 4)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("value a", cache.get("a"))
+        self.assertEqual("value c", cache.get("c"))
+
+        # Entries exceeding the budget are not cached.
+        cache.set("d", "value d", 11)
+        self.assertIsNone(cache.get("d"))
+
+        self.assertEqual(8, cache.used_bytes)
+        self.assertEqual({"hits": 3, "misses": 2, "evictions": 1, "entries": 2, "used_bytes": 8}, cache.stats())
+
+    def test_long_term_cache_has_many(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set("ocel.jsonocel", "a", {"result": 1})
+            cache.set("ocel.jsonocel", "b", {"result": 2})
+            cache.set("other.jsonocel", "c", {"result": 3})
+
+            keys = ["a", "b", "c", "d"]
+            self.assertEqual([True, True, False, False], cache.has_many("ocel.jsonocel", keys))
+            self.assertEqual([cache.has("ocel.jsonocel", key) for key in keys], cache.has_many("ocel.jsonocel", keys))
+            self.assertEqual([False, False, False, False],
+                             cache.has_many("ocel.jsonocel", keys, LongTermCacheEntryType.COLUMNAR_EVENT_LOG))
+
+    def test_long_term_cache_set_replaces_entries(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set("ocel.jsonocel", "a", {"result": 1})
+            cache.set("ocel.jsonocel", "a", {"result": 2})
+            self.assertEqual({"result": 2}, cache.get("ocel.jsonocel", "a"))
+
+            # A failing write leaves the previous entry intact.
+            with self.assertRaises(TypeError):
+                cache.set("ocel.jsonocel", "a", {"result": object()})
+            self.assertEqual({"result": 2}, cache.get("ocel.jsonocel", "a"))
+            self.assertEqual(["a.json"], os.listdir(cache.get_folder("ocel.jsonocel")))
+
+            self.assertTrue(cache.delete("ocel.jsonocel", "a"))
+            self.assertFalse(cache.delete("ocel.jsonocel", "a"))
+            self.assertIsNone(cache.get("ocel.jsonocel", "a"))
+
+    def test_memoized_long_term_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            file_cache = FileBasedLongTermCache(folder)
+            cache = MemoizedLongTermCache(file_cache, budget_bytes=1024 ** 2)
+            file_cache.set("ocel.jsonocel", "a", {"result": [1, 2]})
+
+            entry = cache.get("ocel.jsonocel", "a")
+            self.assertEqual({"result": [1, 2]}, entry)
+            self.assertIs(entry, cache.get("ocel.jsonocel", "a"))
+            self.assertIsNone(cache.get("ocel.jsonocel", "b"))
+
+            parsed = cache.get_parsed("ocel.jsonocel", "a", sum_result)
+            self.assertEqual(3, parsed)
+            self.assertEqual(3, cache.get_parsed("ocel.jsonocel", "a", sum_result))
+
+            # Changing the entry, e.g. by a worker, invalidates the memoized values.
+            file_cache.set("ocel.jsonocel", "a", {"result": [1, 2, 3]})
+            file_stat = file_cache.stat("ocel.jsonocel", "a")
+            os.utime(os.path.join(file_cache.get_folder("ocel.jsonocel"), "a.json"),
+                     ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+            self.assertEqual({"result": [1, 2, 3]}, cache.get("ocel.jsonocel", "a"))
+            self.assertEqual(6, cache.get_parsed("ocel.jsonocel", "a", sum_result))
+
+            self.assertEqual({"hits": 4, "misses": 4, "evictions": 0}, {
+                name: value for (name, value) in cache.stats().items() if name in ["hits", "misses", "evictions"]
+            })
+            # Entries and the values parsed from them are budgeted by the estimated size of the parsed entry.
+            # The outdated values remain until they are evicted.
+            changed_entry = cache.get("ocel.jsonocel", "a")
+            self.assertGreater(estimate_json_size(changed_entry),
+                               sys.getsizeof(changed_entry) + sys.getsizeof(changed_entry["result"]))
+            self.assertEqual(2 * estimate_json_size(entry) + 2 * estimate_json_size(changed_entry),
+                             cache.stats()["used_bytes"])
+
+            # Deleted entries aren't read from memory anymore.
+            self.assertTrue(cache.delete("ocel.jsonocel", "a"))
+            self.assertIsNone(cache.get("ocel.jsonocel", "a"))
+
+    def test_get_ocel_reuses_parsed_ocel(self):
+        with tempfile.TemporaryDirectory() as folder:
+            ocel_filename = os.path.join(folder, "p2p-normal.jsonocel")
+            shutil.copyfile(os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel"),
+                            ocel_filename)
+
+            ocel = get_ocel(ocel_filename)
+            self.assertIs(ocel, get_ocel(ocel_filename))
+
+            # Changing the file invalidates the parsed OCEL.
+            file_stat = os.stat(ocel_filename)
+            os.utime(ocel_filename, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 1_000_000_000))
+            self.assertIsNot(ocel, get_ocel(ocel_filename))
+
+    def get_resources_folder(self) -> str:
+        tests_dir = os.path.split(os.path.abspath(__file__))[0]
+        return os.path.join(tests_dir, "resources")
+
+
+def sum_result(entry):
+    return sum(entry["result"])
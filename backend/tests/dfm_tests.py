@@ -6,7 +6,10 @@ from unittest import TestCase
 from shared_types import FrontendFriendlyDFM, FrontendFriendlyEdge
 from worker.tasks.dfm import prepare_dfg_computation, \
     calculate_threshold_counts_on_dfg, START_TOKEN, STOP_TOKEN, CountSeperator, ObjectType, Edge, Node, \
-    convert_to_frontend_friendly_graph_notation, calculate_ocel_node_counts
+    convert_to_frontend_friendly_graph_notation, calculate_ocel_node_counts, calculate_threshold_counts_on_dfg_indexed, \
+    encode_projected_traces, prepare_encoded_dfg_computation, START_CODE, STOP_CODE, build_object_type_dfg, \
+    serialize_object_type_dfg, deserialize_object_type_dfg
+from server.endpoints.pm import filter_dfm_at_threshold, get_count_at_threshold
 
 
 class DfmTests(TestCase):
@@ -128,6 +131,86 @@ class DfmTests(TestCase):
         test_all_object_types(DfmTests.get_simple_looping_traces())
         # test_all_object_types(DfmTests.load_traces_from_resources("github-pm4py-traces.json"))
 
+    def test_indexed_threshold_counts_match_reference(self):
+        def test(traces):
+            # The reference implementation modifies the edge traces, hence both implementations get their own copy.
+            reference = calculate_threshold_counts_on_dfg(*prepare_dfg_computation(traces))
+            indexed = calculate_threshold_counts_on_dfg_indexed(*prepare_dfg_computation(traces))
+
+            for (reference_result, indexed_result) in zip(reference, indexed):
+                self.assertEqual(reference_result, indexed_result)
+                self.assertEqual(list(reference_result.keys()), list(indexed_result.keys()))
+
+        def test_all_object_types(projected_traces):
+            for traces in projected_traces.values():
+                test(traces)
+
+        test_all_object_types(DfmTests.get_simple_traces())
+        test_all_object_types(DfmTests.get_simple_looping_traces())
+        test_all_object_types(DfmTests.load_traces_with_event_ids_from_resources("github-pm4py-traces.json"))
+
+    def test_encoded_dfg_computation_matches_labels(self):
+        def test(projected_traces):
+            vocabulary, encoded_traces = encode_projected_traces(projected_traces)
+            self.assertEqual(START_TOKEN, vocabulary[START_CODE])
+            self.assertEqual(STOP_TOKEN, vocabulary[STOP_CODE])
+
+            def decode_edge(edge):
+                return Edge(vocabulary[edge.source], vocabulary[edge.target])
+
+            def decode_trace(actions):
+                return tuple(vocabulary[action] for action in actions)
+
+            for object_type in projected_traces:
+                edge_totals, node_totals, edge_traces, total_objects = prepare_dfg_computation(
+                    projected_traces[object_type])
+                encoded_edge_totals, encoded_node_totals, encoded_edge_traces, encoded_total_objects = \
+                    prepare_encoded_dfg_computation(encoded_traces[object_type], len(vocabulary))
+
+                self.assertEqual(total_objects, encoded_total_objects)
+                self.assertEqual(list(edge_totals.items()),
+                                 [(decode_edge(edge), count) for (edge, count) in encoded_edge_totals.items()])
+                self.assertEqual(list(node_totals.items()),
+                                 [(vocabulary[node], count) for (node, count) in encoded_node_totals.items()])
+                self.assertEqual({edge: [tuple(trace.actions) for trace in traces]
+                                  for (edge, traces) in edge_traces.items()},
+                                 {decode_edge(edge): [decode_trace(trace.actions) for trace in traces]
+                                  for (edge, traces) in encoded_edge_traces.items()})
+
+                edge_counts, node_counts, trace_thresholds = calculate_threshold_counts_on_dfg_indexed(
+                    edge_totals, node_totals, edge_traces, total_objects)
+                encoded_edge_counts, encoded_node_counts, encoded_trace_thresholds = \
+                    calculate_threshold_counts_on_dfg_indexed(encoded_edge_totals, encoded_node_totals,
+                                                              encoded_edge_traces, encoded_total_objects)
+
+                self.assertEqual(list(edge_counts.items()),
+                                 [(decode_edge(edge), counts) for (edge, counts) in encoded_edge_counts.items()])
+                self.assertEqual(node_counts,
+                                 {vocabulary[node]: counts for (node, counts) in encoded_node_counts.items()})
+                self.assertEqual(list(trace_thresholds.items()),
+                                 [(decode_trace(trace), threshold)
+                                  for (trace, threshold) in encoded_trace_thresholds.items()])
+
+        test(DfmTests.get_simple_traces())
+        test(DfmTests.get_simple_looping_traces())
+        test(DfmTests.load_traces_with_event_ids_from_resources("github-pm4py-traces.json"))
+
+    def test_object_type_dfg_serialization(self):
+        projected_traces = DfmTests.load_traces_with_event_ids_from_resources("github-pm4py-traces.json")
+        vocabulary, encoded_traces = encode_projected_traces(projected_traces)
+
+        for (object_type, traces) in encoded_traces.items():
+            # Traces of a single object type must be encoded consistently with the vocabulary of the whole OCEL.
+            _, type_traces = encode_projected_traces({object_type: projected_traces[object_type]}, vocabulary)
+            type_dfg = build_object_type_dfg(type_traces[object_type], len(vocabulary))
+            self.assertEqual(build_object_type_dfg(traces, len(vocabulary)), type_dfg)
+
+            # The serialized DFG is sent through the Celery result backend as JSON.
+            serialized_dfg = json.loads(json.dumps(serialize_object_type_dfg(type_dfg)))
+            deserialized_dfg = deserialize_object_type_dfg(serialized_dfg)
+            self.assertEqual(type_dfg, deserialized_dfg)
+            self.assertEqual(list(type_dfg.edge_counts.keys()), list(deserialized_dfg.edge_counts.keys()))
+
     def test_ocel_node_counts(self):
         projected_traces = {
             "one": [
@@ -262,6 +345,43 @@ class DfmTests(TestCase):
                 if node.label in node_counts[object_type]:
                     self.assertEqual(node_counts[object_type][node.label], node.counts[object_type])
 
+    def test_filter_dfm_at_threshold(self):
+        projected_traces = DfmTests.get_simple_traces()
+        trace_thresholds = {}
+        edge_counts = {}
+        node_counts = {}
+        for object_type in projected_traces:
+            edge_counts[object_type], node_counts[object_type], trace_thresholds[object_type] = \
+                calculate_threshold_counts_on_dfg(*prepare_dfg_computation(projected_traces[object_type]))
+
+        ocel_node_counts = calculate_ocel_node_counts(projected_traces, trace_thresholds)
+        dfm = FrontendFriendlyDFM(**convert_to_frontend_friendly_graph_notation(edge_counts, node_counts,
+                                                                               ocel_node_counts, trace_thresholds))
+
+        for threshold in dfm.thresholds:
+            for object_types in [["type_a"], ["type_a", "type_b"]]:
+                filtered = filter_dfm_at_threshold(dfm, threshold, object_types)
+                self.assertEqual(set(object_types), set(filtered.subgraphs.keys()))
+                self.assertEqual(START_TOKEN, filtered.nodes[0].label)
+                self.assertEqual(STOP_TOKEN, filtered.nodes[1].label)
+
+                for object_type in object_types:
+                    expected_edges = {
+                        (source, target): get_count_at_threshold(counts, threshold)
+                        for ((source, target), counts) in edge_counts[object_type].items()
+                        if get_count_at_threshold(counts, threshold) > 0
+                    }
+                    real_edges = {
+                        (filtered.nodes[edge.source].label, filtered.nodes[edge.target].label): edge.count
+                        for edge in filtered.subgraphs[object_type]
+                    }
+                    self.assertEqual(expected_edges, real_edges)
+
+                for node in filtered.nodes:
+                    self.assertEqual(get_count_at_threshold(ocel_node_counts[node.label], threshold), node.ocel_count)
+                    for (object_type, count) in node.counts.items():
+                        self.assertEqual(get_count_at_threshold(node_counts[object_type][node.label], threshold), count)
+
     @staticmethod
     def get_simple_traces():
         def range_list(start: int, count: int):
@@ -297,6 +417,22 @@ class DfmTests(TestCase):
         with open(filename, 'r') as f:
             return json.load(f)
 
+    @staticmethod
+    def load_traces_with_event_ids_from_resources(name):
+        """The traces stored in the resources do not contain event ids, hence unique artificial ones are added."""
+        projected_traces = DfmTests.load_traces_from_resources(name)
+        next_event_id = 0
+        result = {}
+        for (object_type, traces) in projected_traces.items():
+            result[object_type] = []
+            for (actions, count) in traces:
+                event_ids = []
+                for _ in actions:
+                    event_ids.append(list(range(next_event_id, next_event_id + count)))
+                    next_event_id += count
+                result[object_type].append((actions, count, event_ids))
+        return result
+
     @staticmethod
     def wrap_traces_with_start_stop_tokens(traces):
         return [([START_TOKEN] + actions + [STOP_TOKEN], count, [[]] + event_ids + [[]]) for (actions, count, event_ids) in traces]
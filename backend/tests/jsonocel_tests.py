@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from ocpa.objects.log.importer.ocel import factory as ocel_import_factory
+
+from worker.jsonocel import build_ocel_snapshot, has_integer_event_ids, rewrite_event_ids, JsonStreamReader
+
+
+class JsonOcelTests(TestCase):
+
+    def test_build_ocel_snapshot(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        ocel = ocel_import_factory.apply(ocel_filename)
+        log = ocel.log.log
+
+        with tempfile.TemporaryDirectory() as folder:
+            # Small chunks make sure that values spanning multiple chunks are decoded correctly.
+            with patch("worker.jsonocel.READ_CHUNK_SIZE", 100):
+                snapshot = build_ocel_snapshot(ocel_filename, os.path.join(folder, "snapshot"), [1, 2])
+            streamed_log = snapshot.log()
+
+            self.assertEqual(list(ocel.object_types), snapshot.object_types)
+            self.assertEqual(list(log.columns), list(streamed_log.columns))
+            self.assertTrue(log.index.equals(streamed_log.index))
+            self.assertTrue(log.dtypes.equals(streamed_log.dtypes))
+            for column in log.columns:
+                if column in ocel.object_types:
+                    # ocpa collects the related objects in a set, so their order is arbitrary.
+                    self.assertEqual([set(objects) for objects in log[column]],
+                                     [set(objects) for objects in streamed_log[column]])
+                else:
+                    self.assertTrue(log[column].equals(streamed_log[column]))
+
+    def test_build_ocel_snapshot_with_objects_before_global_log(self):
+        ocel_filename = os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel")
+        with open(ocel_filename, 'r') as f:
+            ocel = json.load(f)
+
+        with tempfile.TemporaryDirectory() as folder:
+            expected_snapshot = build_ocel_snapshot(ocel_filename, os.path.join(folder, "expected"), [1, 2])
+            # JSON objects are unordered, so the object types might only be known after the objects have been read.
+            reordered_filename = os.path.join(folder, "reordered.jsonocel")
+            with open(reordered_filename, 'w') as f:
+                json.dump({key: ocel[key] for key in ["ocel:objects", "ocel:events", "ocel:global-log"]}, f)
+            snapshot = build_ocel_snapshot(reordered_filename, os.path.join(folder, "snapshot"), [1, 2])
+
+            self.assertEqual(expected_snapshot.object_types, snapshot.object_types)
+            self.assertTrue(expected_snapshot.log().equals(snapshot.log()))
+            for object_type in snapshot.object_types:
+                projected_log = snapshot.project(object_type)
+                self.assertGreater(len(projected_log), 0)
+                self.assertTrue(expected_snapshot.project(object_type).equals(projected_log))
+
+    def test_json_stream_reader(self):
+        document = {"skipped": {"a": [1, {"b": "x" * 1000}], "c": None}, "values": [12345, "y" * 1000, [], {}],
+                    "last": 1.5}
+
+        with patch("worker.jsonocel.READ_CHUNK_SIZE", 7):
+            reader = JsonStreamReader(io.StringIO(json.dumps(document, indent=2)))
+            keys = []
+            values = []
+            for key in reader.object_keys():
+                keys.append(key)
+                if key == "skipped":
+                    reader.skip()
+                elif key == "values":
+                    for _ in reader.array_values():
+                        values.append(reader.value())
+                else:
+                    values.append(reader.value())
+
+        self.assertEqual(["skipped", "values", "last"], keys)
+        self.assertEqual(document["values"] + [1.5], values)
+
+    def test_rewrite_event_ids(self):
+        ocel = {
+            "ocel:global-log": {"ocel:attribute-names": [], "ocel:object-types": ["ORDER"]},
+            "ocel:events": {
+                f"event-{i}": {"ocel:activity": "Create Order", "ocel:timestamp": f"2021-03-0{i + 1}T09:00:00",
+                               "ocel:omap": [f"order-{i}"], "ocel:vmap": {"price": 1.5 * i}}
+                for i in range(3)
+            },
+            "ocel:objects": {f"order-{i}": {"ocel:type": "ORDER", "ocel:ovmap": {}} for i in range(3)}
+        }
+
+        with tempfile.TemporaryDirectory() as folder:
+            ocel_filename = os.path.join(folder, "ocel.jsonocel")
+            with open(ocel_filename, 'w') as f:
+                json.dump(ocel, f)
+
+            self.assertFalse(has_integer_event_ids(ocel_filename))
+            with patch("worker.jsonocel.READ_CHUNK_SIZE", 10):
+                rewrite_event_ids(ocel_filename)
+            self.assertTrue(has_integer_event_ids(ocel_filename))
+
+            with open(ocel_filename, 'r') as f:
+                rewritten_ocel = json.load(f)
+
+        self.assertEqual(["0", "1", "2"], list(rewritten_ocel["ocel:events"].keys()))
+        self.assertEqual(list(ocel["ocel:events"].values()), list(rewritten_ocel["ocel:events"].values()))
+        self.assertEqual(ocel["ocel:objects"], rewritten_ocel["ocel:objects"])
+
+    def get_resources_folder(self) -> str:
+        tests_dir = os.path.split(os.path.abspath(__file__))[0]
+        return os.path.join(tests_dir, "resources")
@@ -1,14 +1,22 @@
 import datetime
 import json
 import os.path
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 
+import numpy as np
 from pandas import DataFrame, Timestamp
 
 from worker.tasks.alignments import TraceAlignment, AlignElement, SKIP_MOVE
 from worker.tasks.dfm import START_TOKEN, STOP_TOKEN
 from worker.tasks.performance import align_log, align_projected_log_times_task, align_case, ProjectedEventTime, \
-    AlignedEdgeTimes, ocel_performance_metrics_task, collect_times
+    AlignedEdgeTimes, ocel_performance_metrics_task, collect_times, collect_times_vectorized, accumulate_times, \
+    aggregate_times_to_frontend_friendly, AccumulatedTimes, align_projected_log_times, preprocess_alignments, \
+    performance_metrics_chunk, merge_performance_metrics_chunks, TimeAggregationMode, TimeAccumulator, \
+    group_into_lists, group_into_accumulators
+from cache import FileBasedLongTermCache, MemoizedLongTermCache, DictionaryBasedCache, reference, is_reference
+from worker.utils import get_ocel_log, get_projected_event_dataframe
 
 
 class PerformanceTests(TestCase):
@@ -129,6 +137,25 @@ class PerformanceTests(TestCase):
     # endregion
 
     # region Performance metric tests
+    def test_align_projected_log_times(self):
+        base_folder = os.path.join(self.get_resources_folder(), "p2p-normal")
+        ocel = os.path.join(base_folder, 'p2p-normal.jsonocel')
+        with open(os.path.join(base_folder, "alignments-MATERIAL.json"), 'r') as f:
+            alignments = preprocess_alignments(json.load(f))
+        event_log = get_projected_event_dataframe(ocel, 'MATERIAL')
+
+        expected_aligned_times = {}
+        for object_id, case in event_log.groupby('case:concept:name'):
+            for (ocel_event_id, time) in align_case(case, alignments).items():
+                expected_aligned_times.setdefault(int(ocel_event_id), {})[object_id] = time
+
+        aligned_times = align_projected_log_times(event_log, alignments)
+        self.assertEqual(expected_aligned_times, aligned_times)
+        # The times are also inserted in the same order.
+        self.assertEqual([(event_id, list(times)) for (event_id, times) in expected_aligned_times.items()],
+                         [(event_id, list(times)) for (event_id, times) in aligned_times.items()])
+        self.assertEqual({}, align_projected_log_times(event_log.iloc[:0], alignments))
+
     def test_run_ocel_performance_metrics_task(self):
         base_folder = os.path.join(self.get_resources_folder(), "demo-ocel")
         ocel = os.path.join(base_folder, 'demo-ocel.jsonocel')
@@ -140,6 +167,29 @@ class PerformanceTests(TestCase):
 
         print(ocel_performance_metrics_task(ocel, loaded_aligned_times))
 
+    def test_ocel_performance_metrics_task_with_references(self):
+        base_folder = os.path.join(self.get_resources_folder(), "p2p-normal")
+        ocel = os.path.join(base_folder, 'p2p-normal.jsonocel')
+        object_types = ['MATERIAL', 'PURCHORD', 'PURCHREQ', 'INVOICE', 'GDSRCPT']
+        loaded_aligned_times = {}
+        for ot in object_types:
+            with open(os.path.join(base_folder, f"aligned_times-{ot}.json"), 'r') as f:
+                loaded_aligned_times[ot] = json.load(f)['result']
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            references = {}
+            for (ot, times) in loaded_aligned_times.items():
+                cache.set(ocel, f"aligned-times-{ot}", {'result': times, 'version': "1"})
+                references[ot] = reference(ocel, f"aligned-times-{ot}")
+
+            with patch("cache.get_long_term_cache", return_value=cache):
+                self.assertEqual(ocel_performance_metrics_task(ocel, loaded_aligned_times),
+                                 ocel_performance_metrics_task(ocel, references))
+
+                with self.assertRaises(ValueError):
+                    ocel_performance_metrics_task(ocel, {'MATERIAL': reference(ocel, "missing")})
+
     def test_collect_times_with_sync_moves(self):
         ocel = DataFrame.from_records(data=[
             {
@@ -450,6 +500,120 @@ class PerformanceTests(TestCase):
         collected_times = collect_times(ocel, aligned_times)
         self.assertEqual(collected_times.waiting_times, {})
         self.assertEqual(collected_times.edge_waiting_times, {})
+
+    def test_chunked_performance_metrics(self):
+        base_folder = os.path.join(self.get_resources_folder(), "p2p-normal")
+        ocel = os.path.join(base_folder, 'p2p-normal.jsonocel')
+        object_types = ['MATERIAL', 'PURCHORD', 'PURCHREQ', 'INVOICE', 'GDSRCPT']
+        loaded_aligned_times = {}
+        for ot in object_types:
+            with open(os.path.join(base_folder, f"aligned_times-{ot}.json"), 'r') as f:
+                loaded_aligned_times[ot] = json.load(f)['result']
+        number_of_events = len(get_ocel_log(ocel))
+        # The chunks only restore their own events.
+        self.assertTrue(get_ocel_log(ocel).iloc[250:500].equals(get_ocel_log(ocel, 250, 500)))
+
+        for mode in TimeAggregationMode:
+            with patch("worker.tasks.performance.TIME_AGGREGATION_MODE", mode):
+                expected_metrics = ocel_performance_metrics_task(ocel, loaded_aligned_times)
+
+            with tempfile.TemporaryDirectory() as folder:
+                cache = FileBasedLongTermCache(folder)
+                with patch("worker.tasks.performance.TIME_AGGREGATION_MODE", mode), \
+                        patch("worker.tasks.performance.PERFORMANCE_METRICS_CHUNK_EVENTS", 250), \
+                        patch("worker.tasks.performance.get_long_term_cache", return_value=cache), \
+                        patch("worker.tasks.performance.get_memoized_long_term_cache",
+                              return_value=MemoizedLongTermCache(cache, 1024 ** 3)), \
+                        patch("worker.tasks.performance.chord") as chord, \
+                        patch.object(ocel_performance_metrics_task, "replace"), \
+                        patch("task_events.get_short_term_cache", return_value=DictionaryBasedCache()):
+                    ocel_performance_metrics_task.apply([ocel, loaded_aligned_times], task_id="task-id").get()
+                    chunk_signatures = chord.call_args.args[0]
+                    self.assertEqual([(start, start + 250) for start in range(0, number_of_events, 250)],
+                                     [tuple(signature.args[2:4]) for signature in chunk_signatures])
+                    # The aligned times are stored in the long term cache instead of being sent to each chunk.
+                    self.assertTrue(all(is_reference(ot_times) for signature in chunk_signatures
+                                        for ot_times in signature.args[1].values()))
+
+                    # The chunks are serialized as results of Celery tasks.
+                    chunks = [json.loads(json.dumps(performance_metrics_chunk(*json.loads(json.dumps(signature.args)))))
+                              for signature in chunk_signatures]
+                    self.assertGreater(len(chunks), 1)
+                    merge_signature = chord.call_args.args[1]
+                    chunked_keys = merge_signature.args[2]
+                    self.assertEqual(len(object_types), len(chunked_keys))
+                    self.assertTrue(all(cache.has_many(ocel, chunked_keys)))
+                    metrics = merge_performance_metrics_chunks(chunks, *json.loads(json.dumps(merge_signature.args)))
+                    # The aligned times stored for the chunks are deleted once they have been merged.
+                    self.assertFalse(any(cache.has_many(ocel, chunked_keys)))
+
+            if mode == TimeAggregationMode.EXACT:
+                self.assertEqual(expected_metrics, metrics)
+            else:
+                # The quantile sketches of the chunks are only exact on their own.
+                self.assertEqual(expected_metrics.keys(), metrics.keys())
+                for (node, node_metrics) in expected_metrics['nodes'].items():
+                    for field in ['min', 'max', 'sum', 'mean']:
+                        self.assertEqual(node_metrics['service_time'][field],
+                                         metrics['nodes'][node]['service_time'][field])
+
+    def test_collect_times_vectorized(self):
+        base_folder = os.path.join(self.get_resources_folder(), "p2p-normal")
+        ocel = get_ocel_log(os.path.join(base_folder, 'p2p-normal.jsonocel'))
+        object_types = ['MATERIAL', 'PURCHORD', 'PURCHREQ', 'INVOICE', 'GDSRCPT']
+        loaded_aligned_times = {}
+        for ot in object_types:
+            with open(os.path.join(base_folder, f"aligned_times-{ot}.json"), 'r') as f:
+                loaded_aligned_times[ot] = json.load(f)['result']
+
+        self.assertEqual(collect_times(ocel, loaded_aligned_times).dict(),
+                         collect_times_vectorized(ocel, loaded_aligned_times).dict())
+        self.assertEqual(collect_times(ocel, {}).dict(), collect_times_vectorized(ocel, {}).dict())
+
+    def test_accumulate_times(self):
+        base_folder = os.path.join(self.get_resources_folder(), "p2p-normal")
+        ocel = get_ocel_log(os.path.join(base_folder, 'p2p-normal.jsonocel'))
+        object_types = ['MATERIAL', 'PURCHORD', 'PURCHREQ', 'INVOICE', 'GDSRCPT']
+        loaded_aligned_times = {}
+        for ot in object_types:
+            with open(os.path.join(base_folder, f"aligned_times-{ot}.json"), 'r') as f:
+                loaded_aligned_times[ot] = json.load(f)['result']
+
+        # Times of parts of the OCEL are merged, also after serializing them.
+        accumulated_times = accumulate_times(ocel.iloc[:300], loaded_aligned_times)
+        accumulated_times.merge(AccumulatedTimes(**json.loads(accumulate_times(ocel.iloc[300:],
+                                                                               loaded_aligned_times).json())))
+
+        expected_metrics = aggregate_times_to_frontend_friendly(collect_times_vectorized(ocel, loaded_aligned_times))
+        metrics = aggregate_times_to_frontend_friendly(accumulated_times)
+
+        def assert_metrics_equal(expected, actual):
+            if isinstance(expected, dict):
+                self.assertEqual(expected.keys(), actual.keys())
+                for key in expected:
+                    assert_metrics_equal(expected[key], actual[key])
+            elif isinstance(expected, float):
+                # Only the standard deviation is computed differently.
+                self.assertAlmostEqual(expected, actual, places=6)
+            else:
+                self.assertEqual(expected, actual)
+
+        assert_metrics_equal(expected_metrics.dict(), metrics.dict())
+        self.assertIsNotNone(metrics.nodes['Create Purchase Order'].service_time.p99)
+
+    def test_group_into_accumulators(self):
+        keys = [np.array(["b", "a", "b", "a", "b"], dtype=object), np.array(["x", "x", "y", "x", "x"], dtype=object)]
+        values = np.array([5, 1, 7, 3, 2])
+
+        def to_accumulator(times):
+            accumulator = TimeAccumulator()
+            accumulator.update(times)
+            return accumulator
+
+        expected = {key: {inner_key: to_accumulator(times) for (inner_key, times) in inner.items()}
+                    for (key, inner) in group_into_lists(keys, values).items()}
+        self.assertEqual(expected, group_into_accumulators(keys, values))
+        self.assertEqual({}, group_into_accumulators(keys, values[:0]))
     # endregion
 
     # region Legacy tests
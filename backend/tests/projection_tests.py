@@ -0,0 +1,107 @@
+import os
+import tempfile
+from typing import Dict
+from unittest import TestCase
+
+import pandas as pd
+import pm4py
+from ocpa.algo.util.util import project_log
+from ocpa.objects.log.importer.csv.util import succint_mdl_to_exploded_mdl
+from ocpa.objects.log.ocel import OCEL
+from pandas import DataFrame
+
+from cache import FileBasedLongTermCache, LongTermCacheEntryType
+from worker.ocel_snapshot import write_ocel_snapshot, read_ocel_snapshot
+from worker.utils import get_ocel, extract_variants
+
+
+class ProjectionTests(TestCase):
+
+    def test_projection_matches_ocpa(self):
+        ocel = get_ocel(os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel"))
+        exploded_log = succint_mdl_to_exploded_mdl(ocel.log.log)
+        projected_logs = self.project(ocel)
+
+        self.assertEqual(set(ocel.object_types), set(projected_logs.keys()))
+        for object_type in ocel.object_types:
+            expected_log = pm4py.convert_to_dataframe(project_log(exploded_log, object_type))
+            expected_cases = {
+                case_id: case.drop(columns=["case:concept:name"]).reset_index(drop=True)
+                for (case_id, case) in expected_log.groupby("case:concept:name")
+            }
+            real_cases = {
+                case_id: case[expected_cases[case_id].columns].reset_index(drop=True)
+                for (case_id, case) in projected_logs[object_type].groupby("case:concept:name")
+            }
+
+            self.assertEqual(expected_cases.keys(), real_cases.keys())
+            for case_id in expected_cases:
+                self.assertTrue(expected_cases[case_id].equals(real_cases[case_id]))
+
+    def test_columnar_event_log_cache_entry(self):
+        ocel = get_ocel(os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel"))
+        projected_log = self.project(ocel)["MATERIAL"]
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set("ocel", "projection", projected_log, LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
+            self.assertTrue(cache.has("ocel", "projection", LongTermCacheEntryType.COLUMNAR_EVENT_LOG))
+            restored_log = cache.get("ocel", "projection", LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
+
+        self.assertTrue(projected_log.equals(restored_log))
+        self.assertEqual(projected_log.dtypes.to_dict(), restored_log.dtypes.to_dict())
+
+    def test_columnar_event_log_cache_entry_with_python_objects(self):
+        event_log = pd.DataFrame({
+            "event_id": [1, 2, 3],
+            "items": [["a", "b"], [], ["c"]],
+            "mixed": [1, "two", None],
+        })
+
+        with tempfile.TemporaryDirectory() as folder:
+            cache = FileBasedLongTermCache(folder)
+            cache.set("ocel", "event-log", event_log, LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
+            restored_log = cache.get("ocel", "event-log", LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
+
+            self.assertTrue(event_log.equals(restored_log))
+            with self.assertRaises(TypeError):
+                cache.set("ocel", "unserializable", pd.DataFrame({"objects": [object()]}),
+                          LongTermCacheEntryType.COLUMNAR_EVENT_LOG)
+
+    def test_extract_variants(self):
+        def extract_variants_by_iteration(event_log):
+            trace_event_ids = {}
+            for (_, case) in event_log.groupby("case:concept:name"):
+                trace = tuple(case['concept:name'].values)
+                trace_event_ids.setdefault(trace, [[] for _ in range(len(trace))])
+                for (i, (_, event)) in enumerate(case.iterrows()):
+                    trace_event_ids[trace][i].append(event['event_id'])
+            return [(trace, len(event_ids[0]), event_ids) for (trace, event_ids) in trace_event_ids.items()]
+
+        ocel = get_ocel(os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel"))
+        for (object_type, projected_log) in self.project(ocel).items():
+            self.assertEqual(extract_variants_by_iteration(projected_log), extract_variants(projected_log))
+
+        self.assertEqual([], extract_variants(projected_log.iloc[:0]))
+
+    def test_ocel_snapshot(self):
+        ocel = get_ocel(os.path.join(self.get_resources_folder(), "p2p-normal", "p2p-normal.jsonocel"))
+
+        with tempfile.TemporaryDirectory() as folder:
+            snapshot_folder = os.path.join(folder, "snapshot")
+            write_ocel_snapshot(snapshot_folder, ocel, [1, 2])
+            self.assertIsNone(read_ocel_snapshot(snapshot_folder, [1, 3]))
+
+            snapshot = read_ocel_snapshot(snapshot_folder, [1, 2])
+            self.assertEqual(list(ocel.object_types), snapshot.object_types)
+            self.assertTrue(ocel.log.log.equals(snapshot.log()))
+            self.assertTrue(ocel.log.log.index.equals(snapshot.log().index))
+
+    def project(self, ocel: OCEL) -> Dict[str, DataFrame]:
+        with tempfile.TemporaryDirectory() as folder:
+            snapshot = write_ocel_snapshot(os.path.join(folder, "snapshot"), ocel, [])
+            return {object_type: snapshot.project(object_type) for object_type in snapshot.object_types}
+
+    def get_resources_folder(self) -> str:
+        tests_dir = os.path.split(os.path.abspath(__file__))[0]
+        return os.path.join(tests_dir, "resources")
@@ -0,0 +1,38 @@
+import random
+from bisect import bisect_left, bisect_right
+from unittest import TestCase
+
+from worker.quantile_sketch import KLLSketch
+
+
+class QuantileSketchTests(TestCase):
+
+    def test_kll_sketch(self):
+        values = [random.randint(0, 10 ** 6) for _ in range(100000)]
+        sorted_values = sorted(values)
+
+        # Small sketches are exact.
+        sketch = KLLSketch()
+        sketch.update(values[:150])
+        self.assertEqual(sorted(values[:150]), [sketch.value_at_rank(rank) for rank in range(150)])
+
+        streamed_sketch = KLLSketch()
+        for i in range(0, len(values), 1000):
+            streamed_sketch.update(values[i:i + 1000])
+        merged_sketch = KLLSketch()
+        for i in range(0, len(values), 10000):
+            part = KLLSketch()
+            part.update(values[i:i + 10000])
+            merged_sketch.merge(KLLSketch(**part.dict()))
+
+        for sketch in [streamed_sketch, merged_sketch]:
+            self.assertEqual(len(values), sketch.count())
+            self.assertLess(sum(map(len, sketch.compactors)), 1000)
+            for rank in [0, 1000, 50000, 90000, 99000, 99999]:
+                value = sketch.value_at_rank(rank)
+                # The rank of the value lies within the range of equal values, up to the error of the sketch.
+                lower, upper = bisect_left(sorted_values, value), bisect_right(sorted_values, value)
+                self.assertLess(max(0, lower - rank, rank - upper), 0.02 * len(values))
+
+        with self.assertRaises(ValueError):
+            KLLSketch().value_at_rank(0)
@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from celery import states
+
+from cache import DictionaryBasedCache, task_event_metadata
+from task_events import publish_task_event, format_server_sent_event, TASK_EVENTS_CHANNEL, register_task_events, \
+    is_matching_task_event
+from worker.main import publish_finished_task
+
+
+class TaskEventsTests(TestCase):
+
+    def test_publish_task_event(self):
+        connection = MagicMock()
+        short_term_cache = DictionaryBasedCache()
+        register_task_events(short_term_cache, {"id": ("ocel.jsonocel", "dfm"), "other id": ("ocel.jsonocel", "dfm")})
+        with patch("task_events.get_task_events_connection", return_value=connection), \
+                patch("task_events.get_short_term_cache", return_value=short_term_cache):
+            publish_finished_task(task_id="id", task=SimpleNamespace(name="worker.tasks.dfm.dfm"),
+                                  state=states.SUCCESS)
+            # Replaced tasks continue as part of a chord, hence they haven't finished yet.
+            publish_task_event("other id", "worker.tasks.dfm.dfm", states.IGNORED)
+            # Tasks that haven't been started by the task manager, e.g. the chunks of a chord, are internal.
+            publish_task_event("chunk id", "worker.tasks.performance.performance_metrics_chunk", states.SUCCESS)
+            # Each task is only published once.
+            publish_task_event("id", "worker.tasks.dfm.dfm", states.SUCCESS)
+
+        connection.publish.assert_called_once()
+        channel, message = connection.publish.call_args.args
+        self.assertEqual(TASK_EVENTS_CHANNEL, channel)
+        self.assertEqual({"task_id": "id", "task": "worker.tasks.dfm.dfm", "state": states.SUCCESS,
+                          "ocel": "ocel.jsonocel", "long_term_cache_key": "dfm"},
+                         json.loads(message))
+        self.assertIsNotNone(short_term_cache.get(task_event_metadata("other id")))
+
+    def test_is_matching_task_event(self):
+        event = {"task_id": "id", "task": "worker.tasks.dfm.dfm", "state": states.SUCCESS, "ocel": "ocel.jsonocel",
+                 "long_term_cache_key": "dfm"}
+        self.assertTrue(is_matching_task_event(event, None, None))
+        self.assertTrue(is_matching_task_event(event, "ocel.jsonocel", "dfm"))
+        self.assertFalse(is_matching_task_event(event, "other.jsonocel", None))
+        self.assertFalse(is_matching_task_event(event, None, "other"))
+
+    def test_format_server_sent_event(self):
+        event = {"task_id": "id", "task": "worker.tasks.dfm.dfm", "state": states.FAILURE, "ocel": "ocel.jsonocel",
+                 "long_term_cache_key": "dfm"}
+        self.assertEqual(f"event: task-finished\ndata: {json.dumps(event)}\n\n", format_server_sent_event(event))
+        self.assertEqual(": keep-alive\n\n", format_server_sent_event(None))
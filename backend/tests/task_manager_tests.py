@@ -0,0 +1,61 @@
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from celery import states
+
+from cache import DictionaryBasedCache, FileBasedLongTermCache, task as task_key, task_event_metadata
+from server.task_manager import TaskManager, TaskDefinition
+
+
+class TaskManagerTests(TestCase):
+
+    def test_cached_tasks(self):
+        short_term_cache = DictionaryBasedCache()
+        with tempfile.TemporaryDirectory() as folder:
+            long_term_cache = FileBasedLongTermCache(folder)
+            task_manager = TaskManager(short_term_cache, long_term_cache)
+            celery_task = MagicMock()
+            tasks = {name: TaskDefinition("ocel.jsonocel", f"task-{name}", celery_task, [name], f"result-{name}",
+                                          result_version="1")
+                     for name in ["cached", "outdated", "running", "succeeded", "failed", "missing"]}
+
+            long_term_cache.set("ocel.jsonocel", "result-cached", {"result": "cached result", "version": "1"})
+            long_term_cache.set("ocel.jsonocel", "result-outdated", {"result": "old result", "version": "0"})
+            for name in ["outdated", "running", "succeeded", "failed"]:
+                short_term_cache.set(task_key("ocel.jsonocel", f"task-{name}"), f"id-{name}")
+            task_states = {"id-succeeded": {"status": states.SUCCESS, "result": "new result"},
+                           "id-failed": {"status": states.FAILURE, "result": None}}
+
+            group_result = SimpleNamespace(results=[SimpleNamespace(id="id-missing")])
+            with patch("server.task_manager.read_task_states", side_effect=lambda ids: {
+                task_id: task_states[task_id] for task_id in ids if task_id in task_states
+            }) as read_task_states, \
+                    patch("server.task_manager.group") as group, \
+                    patch("server.task_manager.AsyncResult"):
+                group.return_value.apply_async.return_value = group_result
+                task_statuses = task_manager.cached_tasks(tasks)
+
+            self.assertEqual(list(tasks.keys()), list(task_statuses.keys()))
+            self.assertEqual({"cached": "done", "outdated": "running", "running": "running", "succeeded": "done",
+                              "failed": "failed", "missing": "running"},
+                             {name: status.status for (name, status) in task_statuses.items()})
+            self.assertEqual("cached result", task_statuses["cached"].result)
+            self.assertEqual("new result", task_statuses["succeeded"].result)
+
+            # The states of all running tasks are read at once and the missing task is started as a group.
+            read_task_states.assert_called_once()
+            self.assertEqual({"id-outdated", "id-running", "id-succeeded", "id-failed"},
+                             set(read_task_states.call_args.args[0]))
+            celery_task.s.assert_called_once_with("missing")
+            # Started tasks are registered, so their task events contain the ocel and the long term cache key.
+            started_task_id = celery_task.s.return_value.set.call_args.kwargs["task_id"]
+            self.assertEqual({"ocel": "ocel.jsonocel", "long_term_cache_key": "result-missing"},
+                             short_term_cache.get(task_event_metadata(started_task_id)))
+
+            self.assertEqual({"result": "new result", "version": "1"},
+                             long_term_cache.get("ocel.jsonocel", "result-succeeded"))
+            self.assertEqual([None, None, "id-running", "id-missing"],
+                             short_term_cache.get_many([task_key("ocel.jsonocel", f"task-{name}")
+                                                        for name in ["succeeded", "failed", "running", "missing"]]))
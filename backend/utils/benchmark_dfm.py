@@ -0,0 +1,133 @@
+import random
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from worker.tasks.dfm import calculate_ocel_node_counts, calculate_threshold_counts_on_dfg_indexed, \
+    prepare_dfg_computation, convert_to_frontend_friendly_graph_notation
+from worker.utils import extract_variants
+
+# Run from the backend folder with `PYTHONPATH="src/" python utils/benchmark_dfm.py`.
+
+ACTIVITIES = [f"Activity {i}" for i in range(20)]
+
+
+def generate_projected_traces(number_of_events: int, number_of_object_types: int = 3, number_of_variants: int = 500,
+                              seed: int = 0) -> Dict[str, List[Tuple[List[str], int, List[List[int]]]]]:
+    """
+    Generates random projected traces in which every OCEL event is shared by all object types.
+    :param number_of_events: Number of distinct OCEL events
+    :param number_of_object_types: Number of object types
+    :param number_of_variants: Number of variants per object type
+    :param seed: Seed of the random number generator
+    :return: Projected traces of each object type
+    """
+    rng = random.Random(seed)
+    variants = [[rng.choice(ACTIVITIES) for _ in range(rng.randint(2, 10))] for _ in range(number_of_variants)]
+    events_per_variant = number_of_events // number_of_variants
+
+    projected_traces = {}
+    for object_type in range(number_of_object_types):
+        traces = []
+        next_event_id = 0
+        for variant in variants:
+            count = max(1, events_per_variant // len(variant))
+            event_ids = []
+            for _ in variant:
+                event_ids.append(list(range(next_event_id, next_event_id + count)))
+                next_event_id += count
+            traces.append((variant, count, event_ids))
+        projected_traces[f"type_{object_type}"] = traces
+    return projected_traces
+
+
+def benchmark_ocel_node_counts(number_of_events: int):
+    projected_traces = generate_projected_traces(number_of_events)
+    trace_thresholds = {
+        object_type: calculate_threshold_counts_on_dfg_indexed(*prepare_dfg_computation(traces))[2]
+        for (object_type, traces) in projected_traces.items()
+    }
+    total_event_ids = sum(len(event_ids) for traces in projected_traces.values()
+                          for (_, _, trace_event_ids) in traces for event_ids in trace_event_ids)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    calculate_ocel_node_counts(projected_traces, trace_thresholds)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # For comparison: the memory a set of all event ids per node would take, as kept by the previous implementation.
+    tracemalloc.start()
+    node_event_ids = {}
+    for traces in projected_traces.values():
+        for (activities, _, trace_event_ids) in traces:
+            for (activity, event_ids) in zip(activities, trace_event_ids):
+                node_event_ids.setdefault(activity, set()).update(event_ids)
+    _, set_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del node_event_ids
+
+    print(f"{total_event_ids:>10} event ids: {duration:7.3f}s, "
+          f"peak {peak / total_event_ids:6.1f} bytes per event id "
+          f"(sets of event ids alone: {set_peak / total_event_ids:6.1f} bytes per event id)")
+
+
+def benchmark_frontend_friendly_conversion(number_of_variants: int, number_of_object_types: int = 10):
+    projected_traces = generate_projected_traces(number_of_variants * 20, number_of_object_types, number_of_variants)
+    edge_counts, node_counts, trace_thresholds = {}, {}, {}
+    for (object_type, traces) in projected_traces.items():
+        edge_counts[object_type], node_counts[object_type], trace_thresholds[object_type] = \
+            calculate_threshold_counts_on_dfg_indexed(*prepare_dfg_computation(traces))
+    ocel_node_counts = calculate_ocel_node_counts(projected_traces, trace_thresholds)
+
+    start = time.perf_counter()
+    convert_to_frontend_friendly_graph_notation(edge_counts, node_counts, ocel_node_counts, trace_thresholds)
+    duration = time.perf_counter() - start
+
+    print(f"{number_of_variants:>10} variants: {duration:7.3f}s, "
+          f"{duration / number_of_variants * 1_000_000:6.1f}µs per variant")
+
+
+def benchmark_variant_extraction(number_of_events: int, number_of_variants: int = 2000, seed: int = 0):
+    rng = random.Random(seed)
+    variants = [[rng.choice(ACTIVITIES) for _ in range(rng.randint(2, 10))] for _ in range(number_of_variants)]
+
+    activities, case_ids = [], []
+    while len(activities) < number_of_events:
+        variant = rng.choice(variants)
+        activities.extend(variant)
+        case_ids.extend([f"object {len(case_ids)}"] * len(variant))
+
+    event_log = pd.DataFrame({
+        "concept:name": activities,
+        "event_id": np.arange(len(activities)),
+        "case:concept:name": case_ids
+    })
+
+    start = time.perf_counter()
+    extract_variants(event_log)
+    duration = time.perf_counter() - start
+    print(f"{len(event_log):>10} events: {duration:7.3f}s")
+
+
+def run():
+    print("calculate_ocel_node_counts")
+    for number_of_events in [10_000, 100_000, 1_000_000]:
+        benchmark_ocel_node_counts(number_of_events)
+
+    # The time per variant should stay roughly constant if the conversion scales linearly.
+    print("convert_to_frontend_friendly_graph_notation")
+    for number_of_variants in [1_000, 10_000, 100_000]:
+        benchmark_frontend_friendly_conversion(number_of_variants)
+
+    print("extract_variants")
+    for number_of_events in [10_000, 100_000, 1_000_000]:
+        benchmark_variant_extraction(number_of_events)
+
+
+if __name__ == '__main__':
+    run()
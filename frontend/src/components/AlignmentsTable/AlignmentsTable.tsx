@@ -28,7 +28,7 @@ export function AlignmentTable(props: {objectType: string, traces: TraceAlignmen
             const trace = traces[traceIdx];
             let row: any = {
                 uniqueId: uniqueId++,
-                0: "Trace " + traceIdx,
+                0: "Trace " + traceIdx + (trace.approximate ? " (approximate)" : ""),
                 1: "[Log Alignment]",
             };
             for(let i = 0; i < trace.log_alignment.length; i++) {
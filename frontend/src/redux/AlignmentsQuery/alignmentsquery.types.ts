@@ -5,6 +5,7 @@ export type AlignElement = {
 export type TraceAlignment = {
     log_alignment: AlignElement[],
     model_alignment: AlignElement[],
+    approximate?: boolean,
 }
 
 export type TraceAlignments = {[key: string]: TraceAlignment | null}[]
\ No newline at end of file
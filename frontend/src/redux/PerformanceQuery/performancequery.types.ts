@@ -4,7 +4,10 @@ export type AggregatedMetric = {
     max: number,
     min: number,
     sum: number,
-    stdev: number
+    stdev: number,
+    p90?: number | null,
+    p95?: number | null,
+    p99?: number | null
 }
 
 export type NodePerformanceMetrics = {